@@ -6,6 +6,7 @@ from .assumption_detector import AssumptionDetectorAgent
 from .second_order_thinking import SecondOrderThinkingAgent
 from .bias_detection import BiasDetectionAgent
 from .decision_summary import DecisionSummaryAgent
+from .context import ContextBuilder
 from .orchestrator import ClearThinkOrchestrator
 
 __all__ = [
@@ -16,5 +17,6 @@ __all__ = [
     "SecondOrderThinkingAgent",
     "BiasDetectionAgent",
     "DecisionSummaryAgent",
+    "ContextBuilder",
     "ClearThinkOrchestrator",
 ]
@@ -1,11 +1,26 @@
 """Assumption Detector Agent - Finds hidden assumptions and categorizes them."""
 
+from typing import List
+
 from .base import BaseAgent
 
 
 class AssumptionDetectorAgent(BaseAgent):
     """Detects hidden assumptions and labels them as Facts, Beliefs, or Fears."""
     
+    output_schema = {
+        "assumptions": [{
+            "assumption": "str",
+            "kind": "fact|belief|fear",
+            "challenge": "str",
+            "influence": "low|medium|high",
+        }],
+    }
+    context_fields = {
+        "Problem Framing": ["problem_statement", "constraints", "what_matters"],
+        "Option Generator": ["options.name", "options.description"],
+    }
+    
     @property
     def name(self) -> str:
         return "Assumption Detector"
@@ -14,6 +29,10 @@ class AssumptionDetectorAgent(BaseAgent):
     def emoji(self) -> str:
         return "🔍"
     
+    @property
+    def depends_on(self) -> List[str]:
+        return ["Problem Framing", "Option Generator"]
+    
     @property
     def system_prompt(self) -> str:
         return """You are the Assumption Detector Agent in the CLEARTHINK decision-making system.
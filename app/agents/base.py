@@ -1,24 +1,95 @@
 """Base agent class for all CLEARTHINK agents."""
 
+import logging
+import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
+from typing import Any, Callable, ClassVar, Dict, List, Optional, Tuple
 
+from app.cache import make_cache_key, response_cache
 from app.config import settings
+from app.llm import get_agent_model, route_outcome
+from app.metrics import (
+    AGENT_CACHE_HITS,
+    AGENT_COMPLETION_TOKENS,
+    AGENT_ERRORS,
+    AGENT_LLM_LATENCY,
+    AGENT_PROMPT_TOKENS,
+    AGENT_QUEUE_WAIT,
+    AGENT_RUNS,
+    AGENT_STRUCTURED_PARSE_FAILURES,
+    AGENT_TIME_TO_FIRST_TOKEN,
+)
+from app.scheduler import current_client, scheduler
+from app.serialization import dumps, loads
+from app.tenants import usage_ledger
+from app.tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+# Appended to the system prompt of agents with an output schema in structured mode.
+STRUCTURED_INSTRUCTIONS = (
+    "Ignore the formatting instructions above. Respond with one JSON object and nothing else, "
+    'in this shape ("str" is brief free text, "a|b" means one of those values, lists may hold '
+    "several items):"
+)
+
+
+def _label(key: str) -> str:
+    return key.replace("_", " ").capitalize()
+
+
+def _render_value(value: Any) -> str:
+    if isinstance(value, list):
+        return "; ".join(_render_value(item) for item in value)
+    if isinstance(value, dict):
+        return "; ".join(f"{_label(k)}: {_render_value(v)}" for k, v in value.items())
+    return str(value)
+
+
+def render_markdown(data: Dict[str, Any]) -> str:
+    """
+    Render structured output as markdown: a bold label per field, list
+    items as bullets, and each object in a list as a bullet titled by its
+    first field with the remaining fields nested below.
+    """
+    lines: List[str] = []
+    for key, value in data.items():
+        if not isinstance(value, list):
+            lines.append(f"**{_label(key)}**: {_render_value(value)}")
+            continue
+        lines.append(f"**{_label(key)}**:")
+        for item in value:
+            if isinstance(item, dict) and item:
+                (_, title), *rest = item.items()
+                lines.append(f"- **{_render_value(title)}**")
+                lines.extend(f"  - {_label(k)}: {_render_value(v)}" for k, v in rest)
+            else:
+                lines.append(f"- {_render_value(item)}")
+    return "\n".join(lines)
 
 
 class BaseAgent(ABC):
     """Abstract base class for all CLEARTHINK agents."""
     
+    # Compiled prompt | llm | parser chains, shared by every instance of an agent class
+    _chains: ClassVar[Dict[Tuple[type, int], Tuple[Any, Any]]] = {}
+    
+    # Compact JSON shape of the output in structured mode; None keeps free-form markdown
+    output_schema: ClassVar[Optional[Dict[str, Any]]] = None
+    # Fields of each upstream agent's structured output to pass as context, by agent name.
+    # "field.sub" keeps only ``sub`` of each object in a list; unlisted agents pass everything.
+    context_fields: ClassVar[Dict[str, List[str]]] = {}
+    
     def __init__(self):
-        self.llm = ChatGroq(
-            api_key=settings.GROQ_API_KEY,
-            model_name=settings.MODEL_NAME,
-            temperature=0.7,
-        )
-        self.output_parser = StrOutputParser()
+        primary = settings.model_routes(self.name)[0]
+        self.model_name = primary["model"]
+        self.temperature = primary["temperature"]
+    
+    @property
+    def llm(self):
+        """This agent's chat model, created on first use and shared through the client registry."""
+        return get_agent_model(self.name)
     
     @property
     @abstractmethod
@@ -37,34 +108,219 @@ class BaseAgent(ABC):
         """Emoji icon for the agent."""
         return "🤖"
     
-    def create_chain(self, user_input: str, context: Dict[str, Any] = None):
-        """Create the LangChain chain for this agent."""
-        context = context or {}
+    @property
+    def depends_on(self) -> List[str]:
+        """Names of the upstream agents whose output this agent needs."""
+        return []
+    
+    @property
+    def structured(self) -> bool:
+        """Whether this agent answers in JSON (``STRUCTURED_OUTPUTS`` and an output schema)."""
+        return settings.STRUCTURED_OUTPUTS and self.output_schema is not None
+    
+    @property
+    def instructions(self) -> str:
+        """The system prompt as sent, with the output schema appended in structured mode."""
+        if not self.structured:
+            return self.system_prompt
+        return f"{self.system_prompt}\n\n{STRUCTURED_INSTRUCTIONS}\n{dumps(self.output_schema)}"
+    
+    def create_chain(self, user_input: str = None, context: Dict[str, Any] = None):
+        """
+        Return the LangChain chain for this agent.
+        
+        The prompt template and pipeline are compiled once per agent class and
+        chat model, then reused across requests.
+        """
+        llm = self.llm
+        key = (type(self), id(llm))
+        cached = BaseAgent._chains.get(key)
+        if cached is not None and cached[0] is llm:
+            return cached[1]
+        
+        # LangChain is imported on first use to keep application startup fast.
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
         
         prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
+            ("system", self.instructions.replace("{", "{{").replace("}", "}}")),
             ("human", "{input}\n\nContext from previous agents:\n{context}")
         ])
         
-        chain = prompt | self.llm | self.output_parser
+        chain = prompt | llm | StrOutputParser()
+        BaseAgent._chains[key] = (llm, chain)
         return chain
     
-    async def run(self, user_input: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        """Execute the agent's analysis."""
-        context = context or {}
-        chain = self.create_chain(user_input, context)
-        
-        context_str = "\n".join([
+    def format_context(self, context: Dict[str, Any] = None) -> str:
+        """Render upstream agent results into the prompt's context block."""
+        return "\n".join([
             f"**{k}**: {v}" for k, v in context.items()
         ]) if context else "No previous context."
+    
+    def parse_output(self, text: str) -> Optional[Dict[str, Any]]:
+        """The JSON object in structured output (code fences and stray prose are skipped), if any."""
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end < start:
+            return None
+        try:
+            data = loads(text[start:end + 1])
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    
+    def render(self, data: Dict[str, Any]) -> str:
+        """Display text for structured output."""
+        return render_markdown(data)
+    
+    def structure(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Turn a structured-mode result's raw JSON into ``data`` plus rendered
+        ``result`` text. Output without a valid JSON object is kept as text.
+        """
+        if not self.structured or "data" in result:
+            return result
+        data = self.parse_output(result["result"])
+        if data is None:
+            AGENT_STRUCTURED_PARSE_FAILURES.inc(agent=self.name)
+            logger.warning("%s returned no valid JSON object; keeping it as text", self.name)
+            return result
+        return {**result, "result": self.render(data), "data": data}
+    
+    def cache_key(self, user_input: str, context: Dict[str, Any] = None) -> str:
+        """Content-addressed key identifying this agent's output for the given inputs."""
+        return make_cache_key(
+            model=self.model_name,
+            temperature=self.temperature,
+            system_prompt=self.instructions,
+            input=user_input,
+            context=context or {},
+        )
+    
+    async def run(
+        self,
+        user_input: str,
+        context: Dict[str, Any] = None,
+        on_token: Optional[Callable[[str], None]] = None,
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        Execute the agent's analysis.
+        
+        When ``on_token`` is given the chain is streamed and the callback is
+        invoked with every chunk as it arrives; the full result is still
+        returned once the stream ends.
+        
+        Results are served from the response cache when the same model,
+        prompt, input and context have been seen before, unless
+        ``use_cache`` is off. The result's ``input_hash`` identifies those
+        inputs. Answers from a fallback route are not cached, since the key
+        names the primary route's model.
+        
+        In structured mode the result also carries the parsed ``data``, and
+        ``result`` is its rendered text.
+        
+        The returned dict includes a ``timings`` breakdown (queue wait, time
+        to first token, LLM latency, token counts, cache hit), which is also
+        recorded in the Prometheus metrics and the current client's usage.
+        """
+        AGENT_RUNS.inc(agent=self.name)
+        started = time.perf_counter()
+        try:
+            result = await self._run(user_input, context or {}, on_token, use_cache)
+        except Exception:
+            AGENT_ERRORS.inc(agent=self.name)
+            raise
+        result["timings"]["total"] = time.perf_counter() - started
+        usage_ledger.record_agent(current_client.get(), self.name, result["timings"])
+        return result
+    
+    async def _run(
+        self,
+        user_input: str,
+        context: Dict[str, Any],
+        on_token: Optional[Callable[[str], None]],
+        use_cache: bool = True,
+    ) -> Dict[str, Any]:
+        timings: Dict[str, Any] = {
+            "cached": False,
+            "queue_wait": 0.0,
+            "time_to_first_token": None,
+            "llm_latency": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+        }
+        
+        cache_key = self.cache_key(user_input, context)
+        cached = await response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
+            AGENT_CACHE_HITS.inc(agent=self.name)
+            timings["cached"] = True
+            if on_token is not None:
+                on_token(cached)
+            return self.structure({
+                "agent": self.name,
+                "emoji": self.emoji,
+                "result": cached,
+                "input_hash": cache_key,
+                "timings": timings
+            })
         
-        result = await chain.ainvoke({
+        chain = self.create_chain(user_input, context)
+        
+        inputs = {
             "input": user_input,
-            "context": context_str
-        })
+            "context": self.format_context(context)
+        }
+        
+        prompt_tokens = (
+            estimate_tokens(self.instructions)
+            + estimate_tokens(inputs["input"])
+            + estimate_tokens(inputs["context"])
+        )
+        logger.info(
+            "Prompt for %s: ~%d tokens (context ~%d)",
+            self.name, prompt_tokens, estimate_tokens(inputs["context"]),
+        )
+        estimated_tokens = prompt_tokens + settings.LLM_COMPLETION_TOKEN_ESTIMATE
+        
+        outcome: Dict[str, Any] = {}
+        outcome_token = route_outcome.set(outcome)
+        try:
+            async with scheduler.slot(estimated_tokens) as ticket:
+                timings["queue_wait"] = ticket["queue_wait"]
+                call_started = time.perf_counter()
+                if on_token is None:
+                    result = await chain.ainvoke(inputs)
+                else:
+                    chunks = []
+                    async for chunk in chain.astream(inputs):
+                        if chunk:
+                            if not chunks:
+                                timings["time_to_first_token"] = time.perf_counter() - call_started
+                            chunks.append(chunk)
+                            on_token(chunk)
+                    result = "".join(chunks)
+                timings["llm_latency"] = time.perf_counter() - call_started
+                timings["prompt_tokens"] = prompt_tokens
+                timings["completion_tokens"] = estimate_tokens(result)
+                ticket["actual_tokens"] = prompt_tokens + timings["completion_tokens"]
+        finally:
+            route_outcome.reset(outcome_token)
+        
+        AGENT_QUEUE_WAIT.observe(timings["queue_wait"], agent=self.name)
+        AGENT_TIME_TO_FIRST_TOKEN.observe(timings["time_to_first_token"], agent=self.name)
+        AGENT_LLM_LATENCY.observe(timings["llm_latency"], agent=self.name)
+        AGENT_PROMPT_TOKENS.inc(timings["prompt_tokens"], agent=self.name)
+        AGENT_COMPLETION_TOKENS.inc(timings["completion_tokens"], agent=self.name)
         
-        return {
+        # The cache key names the primary model; a fallback's answer is not its.
+        if not outcome.get("fallback"):
+            await response_cache.set(cache_key, result)
+        
+        return self.structure({
             "agent": self.name,
             "emoji": self.emoji,
-            "result": result
-        }
+            "result": result,
+            "input_hash": cache_key,
+            "timings": timings
+        })
@@ -1,11 +1,27 @@
 """Bias Detection Agent - Identifies cognitive biases gently and constructively."""
 
+from typing import List
+
 from .base import BaseAgent
 
 
 class BiasDetectionAgent(BaseAgent):
     """Detects cognitive biases affecting the decision-making process."""
     
+    output_schema = {
+        "biases": [{
+            "bias": "str",
+            "how_it_shows": "str",
+            "question": "str",
+            "if_removed": "str",
+        }],
+        "encouragement": "str",
+    }
+    context_fields = {
+        "Problem Framing": ["problem_statement", "what_matters"],
+        "Option Generator": ["options.name", "options.description"],
+    }
+    
     @property
     def name(self) -> str:
         return "Bias Detection"
@@ -14,6 +30,10 @@ class BiasDetectionAgent(BaseAgent):
     def emoji(self) -> str:
         return "🧠"
     
+    @property
+    def depends_on(self) -> List[str]:
+        return ["Problem Framing", "Option Generator"]
+    
     @property
     def system_prompt(self) -> str:
         return """You are the Bias Detection Agent in the CLEARTHINK decision-making system.
@@ -0,0 +1,231 @@
+"""Context builder - selects and compacts upstream output for each agent."""
+
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.serialization import dumps
+from app.tokens import estimate_tokens
+
+from .base import BaseAgent
+
+
+logger = logging.getLogger(__name__)
+
+# Lines that start a section in agent output: markdown headings or
+# bold labels such as "1. **Clear Problem Statement**:".
+_SECTION_START = re.compile(r"^\s*(#{1,6}\s+|(\d+\.\s*)?\*\*[^*]+\*\*)")
+_HEADING_LEVEL = re.compile(r"^\s*(#{1,6})\s+")
+
+
+def split_sections(text: str) -> List[Tuple[str, str]]:
+    """Split markdown into ``(heading line, body)`` pairs; the preamble has an empty heading."""
+    sections: List[Tuple[str, List[str]]] = [("", [])]
+    for line in text.splitlines():
+        if _SECTION_START.match(line):
+            sections.append((line.strip(), [line]))
+        else:
+            sections[-1][1].append(line)
+    return [(heading, "\n".join(lines).strip()) for heading, lines in sections if "".join(lines).strip()]
+
+
+def extract_section(text: str, name: str) -> Optional[str]:
+    """
+    Return the section of ``text`` whose heading contains ``name``.
+
+    For markdown headings, nested sub-headings are included up to the next
+    heading of the same or a higher level.
+    """
+    needle = name.lower()
+    lines = text.splitlines()
+    for i, line in enumerate(lines):
+        if not _SECTION_START.match(line) or needle not in line.lower():
+            continue
+        level = _HEADING_LEVEL.match(line)
+        collected = [line]
+        for following in lines[i + 1:]:
+            if _SECTION_START.match(following):
+                following_level = _HEADING_LEVEL.match(following)
+                if not level or not following_level:
+                    break
+                if len(following_level.group(1)) <= len(level.group(1)):
+                    break
+            collected.append(following)
+        return "\n".join(collected).strip()
+    return None
+
+
+def truncate_to_budget(text: str, budget: int) -> str:
+    """Keep whole lines from the start of ``text`` until ``budget`` tokens are used."""
+    if estimate_tokens(text) <= budget:
+        return text
+    kept: List[str] = []
+    used = 0
+    for line in text.splitlines():
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(kept).rstrip() + "\n…"
+
+
+def _line_priority(line: str) -> int:
+    stripped = line.strip()
+    if _SECTION_START.match(line):
+        return 0
+    if re.match(r"^([-*•]|\d+\.)\s+\*\*", stripped):
+        return 1
+    if re.match(r"^([-*•]|\d+\.)\s+", stripped):
+        return 2
+    return 3
+
+
+def extract_to_budget(text: str, budget: int) -> str:
+    """
+    Extractive compaction: keep the most informative lines within ``budget``.
+
+    Headings are kept first, then labelled bullets, plain bullets and finally
+    prose, earlier lines winning ties. Kept lines stay in their original order.
+    """
+    if estimate_tokens(text) <= budget:
+        return text
+    lines = [line for line in text.splitlines() if line.strip()]
+    ranked = sorted(range(len(lines)), key=lambda i: (_line_priority(lines[i]), i))
+    keep = set()
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(lines[i])
+        if used + cost > budget:
+            continue
+        keep.add(i)
+        used += cost
+    return "\n".join(lines[i] for i in sorted(keep))
+
+
+def select_fields(data: Dict[str, Any], fields: List[str]) -> Dict[str, Any]:
+    """
+    The given fields of structured output. ``"field.sub"`` keeps only
+    ``sub`` of each object in the list (or the object) at ``field``.
+    """
+    selected: Dict[str, Any] = {}
+    for field in fields:
+        key, _, sub = field.partition(".")
+        if key not in data:
+            continue
+        value = data[key]
+        if sub and isinstance(value, list):
+            kept = selected.get(key) or [{} for _ in value]
+            value = [
+                {**k, sub: item.get(sub)} if isinstance(item, dict) else item
+                for k, item in zip(kept, value)
+            ]
+        elif sub and isinstance(value, dict):
+            value = {**selected.get(key, {}), sub: value.get(sub)}
+        selected[key] = value
+    return selected
+
+
+class ContextBuilder:
+    """
+    Builds the upstream context each agent sees.
+
+    ``selection`` maps an agent name to the upstream entries it needs. An
+    entry is either an agent name (the whole output) or ``"Agent#Heading"``
+    (only that section of the output). Agents without a selection get the
+    full output of everything they depend on.
+
+    Structured results (with ``data``) are passed as compact JSON of the
+    fields the agent lists in ``context_fields``; an ``"Agent#field"``
+    entry selects that field instead.
+
+    ``compaction`` is ``"none"``, ``"truncate"`` or ``"extractive"``; with a
+    positive ``token_budget`` the selected context is compacted to fit,
+    split evenly between the selected entries.
+    """
+
+    def __init__(
+        self,
+        selection: Dict[str, List[str]] = None,
+        compaction: str = "none",
+        token_budget: int = 0,
+    ):
+        if compaction not in ("none", "truncate", "extractive"):
+            raise ValueError(f"Unknown CONTEXT_COMPACTION: {compaction}")
+        self.selection = selection or {}
+        self.compaction = compaction
+        self.token_budget = token_budget
+
+    def _entries(self, agent: BaseAgent) -> List[Tuple[str, Optional[str]]]:
+        entries = []
+        for entry in self.selection.get(agent.name) or agent.depends_on:
+            source, _, section = entry.partition("#")
+            if source not in agent.depends_on:
+                logger.warning(
+                    "Context selection for %s references %s, which it does not depend on",
+                    agent.name, source,
+                )
+                continue
+            entries.append((source, section or None))
+        return entries
+
+    def _compact(self, text: str, budget: int) -> str:
+        if self.compaction == "truncate":
+            return truncate_to_budget(text, budget)
+        if self.compaction == "extractive":
+            return extract_to_budget(text, budget)
+        return text
+
+    def build(self, agent: BaseAgent, results: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+        """Return the ``{label: text}`` context for ``agent`` from upstream ``results``."""
+        selected: Dict[str, str] = {}
+        for source, section in self._entries(agent):
+            result = results.get(source)
+            if result is None or result.get("error"):
+                continue
+            label = source
+            data = result.get("data")
+            if data is not None:
+                fields = agent.context_fields.get(source)
+                if section in data:
+                    fields, label = [section], f"{source} - {section}"
+                text = dumps(select_fields(data, fields) if fields else data)
+            else:
+                text = result["result"]
+                if section:
+                    text = extract_section(text, section) or text
+                    label = f"{source} - {section}"
+            selected[label] = text
+
+        raw_tokens = sum(estimate_tokens(text) for text in selected.values())
+        if self.compaction != "none" and self.token_budget > 0 and raw_tokens > self.token_budget:
+            remaining_budget = self.token_budget
+            compacted: Dict[str, str] = {}
+            # Smallest entries first, so budget they leave unused goes to the larger ones.
+            for position, label in enumerate(sorted(selected, key=lambda k: estimate_tokens(selected[k]))):
+                share = remaining_budget // (len(selected) - position)
+                compacted[label] = self._compact(selected[label], share)
+                remaining_budget -= estimate_tokens(compacted[label])
+            selected = {label: compacted[label] for label in selected}
+
+        logger.info(
+            "Context for %s: %d tokens (%d before selection/compaction)",
+            agent.name,
+            sum(estimate_tokens(text) for text in selected.values()),
+            sum(
+                estimate_tokens(results[dep]["result"])
+                for dep in agent.depends_on
+                if dep in results and not results[dep].get("error")
+            ),
+        )
+        return selected
+
+
+def default_context_builder() -> ContextBuilder:
+    """Context builder configured from settings."""
+    return ContextBuilder(
+        selection=settings.CONTEXT_SELECTION,
+        compaction=settings.CONTEXT_COMPACTION,
+        token_budget=settings.CONTEXT_TOKEN_BUDGET,
+    )
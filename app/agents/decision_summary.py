@@ -1,11 +1,29 @@
 """Decision Summary Agent - Synthesizes everything into actionable guidance."""
 
+from typing import List
+
 from .base import BaseAgent
 
 
 class DecisionSummaryAgent(BaseAgent):
     """Synthesizes all analysis into a clear, actionable recommendation."""
     
+    output_schema = {
+        "recommended_option": "str",
+        "confidence": "high|medium|low",
+        "key_reasoning": "str",
+        "watch_out_for": ["str"],
+        "first_small_action": "str",
+        "decision_summary": "str",
+        "encouragement": "str",
+    }
+    context_fields = {
+        "Problem Framing": ["core_question", "what_matters"],
+        "Option Generator": ["options.name", "options.effort"],
+        "Assumption Detector": ["assumptions.assumption", "assumptions.kind"],
+        "Bias Detection": ["biases.bias", "biases.question"],
+    }
+    
     @property
     def name(self) -> str:
         return "Decision Summary"
@@ -14,6 +32,16 @@ class DecisionSummaryAgent(BaseAgent):
     def emoji(self) -> str:
         return "✅"
     
+    @property
+    def depends_on(self) -> List[str]:
+        return [
+            "Problem Framing",
+            "Option Generator",
+            "Assumption Detector",
+            "Second-Order Thinking",
+            "Bias Detection",
+        ]
+    
     @property
     def system_prompt(self) -> str:
         return """You are the Decision Summary Agent in the CLEARTHINK decision-making system.
@@ -1,11 +1,24 @@
 """Option Generator Agent - Generates realistic options with trade-offs."""
 
+from typing import List
+
 from .base import BaseAgent
 
 
 class OptionGeneratorAgent(BaseAgent):
     """Generates realistic options with honest trade-offs."""
     
+    output_schema = {
+        "options": [{
+            "name": "str",
+            "description": "str",
+            "pros": ["str"],
+            "cons": ["str"],
+            "best_for": "str",
+            "effort": "low|medium|high",
+        }],
+    }
+    
     @property
     def name(self) -> str:
         return "Option Generator"
@@ -14,6 +27,10 @@ class OptionGeneratorAgent(BaseAgent):
     def emoji(self) -> str:
         return "💡"
     
+    @property
+    def depends_on(self) -> List[str]:
+        return ["Problem Framing"]
+    
     @property
     def system_prompt(self) -> str:
         return """You are the Option Generator Agent in the CLEARTHINK decision-making system.
@@ -1,8 +1,19 @@
-"""Orchestrator - Coordinates all CLEARTHINK agents sequentially."""
+"""Orchestrator - Coordinates all CLEARTHINK agents as a dependency graph."""
 
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, AsyncIterator, Tuple
 import asyncio
+import os
+import time
 
+from app.cache import make_cache_key, response_cache
+from app.config import settings
+from app.metrics import ANALYSIS_DURATION, SPECULATIVE_RUNS, SPECULATIVE_WASTED_TOKENS
+from app.scheduler import current_client
+from app.tokens import estimate_tokens
+
+from .base import BaseAgent
+from .context import ContextBuilder, default_context_builder
+from .policy import UPSTREAM_FAILED, UPSTREAM_FAILURE_POLICIES, AgentError, classify, run_with_policy
 from .problem_framing import ProblemFramingAgent
 from .option_generator import OptionGeneratorAgent
 from .assumption_detector import AssumptionDetectorAgent
@@ -12,9 +23,24 @@ from .decision_summary import DecisionSummaryAgent
 
 
 class ClearThinkOrchestrator:
-    """Orchestrates all 6 CLEARTHINK agents in sequence."""
-    
-    def __init__(self):
+    """
+    Orchestrates all 6 CLEARTHINK agents.
+
+    Each agent declares its upstream dependencies via ``depends_on``; the
+    orchestrator starts every agent as soon as those have completed, so
+    independent agents run concurrently.
+
+    With a ``store``, every completed run is recorded there and the result
+    carries the stored analysis ``id``; successful runs are also added to
+    the ``similarity`` index when one is given.
+    """
+
+    def __init__(self, context_builder: ContextBuilder = None, store=None, similarity=None):
+        if settings.UPSTREAM_FAILURE_POLICY not in UPSTREAM_FAILURE_POLICIES:
+            raise ValueError(f"Unknown UPSTREAM_FAILURE_POLICY: {settings.UPSTREAM_FAILURE_POLICY}")
+        self.context_builder = context_builder or default_context_builder()
+        self.store = store
+        self.similarity = similarity
         self.agents = [
             ProblemFramingAgent(),
             OptionGeneratorAgent(),
@@ -23,78 +49,726 @@ class ClearThinkOrchestrator:
             BiasDetectionAgent(),
             DecisionSummaryAgent(),
         ]
-    
-    async def analyze(self, decision_input: str) -> Dict[str, Any]:
+        self._agents_by_name = {agent.name: agent for agent in self.agents}
+        self._validate_graph()
+
+    def _validate_graph(self) -> None:
+        """Ensure every dependency exists and the graph has no cycles."""
+        names = {agent.name for agent in self.agents}
+        for agent in self.agents:
+            unknown = [dep for dep in agent.depends_on if dep not in names]
+            if unknown:
+                raise ValueError(
+                    f"Agent '{agent.name}' depends on unknown agents: {', '.join(unknown)}"
+                )
+
+        resolved: set = set()
+        remaining = list(self.agents)
+        while remaining:
+            ready = [a for a in remaining if all(d in resolved for d in a.depends_on)]
+            if not ready:
+                cycle = ", ".join(a.name for a in remaining)
+                raise ValueError(f"Agent dependency cycle detected between: {cycle}")
+            for agent in ready:
+                resolved.add(agent.name)
+                remaining.remove(agent)
+
+    def warm_up(self) -> None:
+        """Compile every agent's chain ahead of the first request."""
+        for agent in self.agents:
+            agent.create_chain()
+
+    def model_config(self) -> Dict[str, Any]:
+        """Model and sampling settings per agent."""
+        return {
+            agent.name: {"model": agent.model_name, "temperature": agent.temperature}
+            for agent in self.agents
+        }
+
+    def config_fingerprint(self) -> str:
+        """Hash of everything besides the input that shapes a result: models, prompts, context."""
+        return make_cache_key(
+            models=self.model_config(),
+            prompts={agent.name: agent.instructions for agent in self.agents},
+            context={
+                "selection": self.context_builder.selection,
+                "compaction": self.context_builder.compaction,
+                "token_budget": self.context_builder.token_budget,
+            },
+        )
+
+    def fingerprint(self, decision_input: str) -> str:
+        """
+        Content hash of a decision under the current configuration.
+
+        Input is compared case- and whitespace-insensitively; the
+        configuration is part of the hash, so changing models or prompts
+        never matches results produced under the old configuration.
+        """
+        return make_cache_key(
+            input=" ".join(decision_input.lower().split()),
+            config=self.config_fingerprint(),
+        )
+
+    def token_estimate(self, decision_input: str, agents: Iterable[BaseAgent] = None) -> int:
+        """
+        Rough prompt and completion tokens of running ``agents`` (default all)
+        on ``decision_input``, for rate limiting before anything runs; each
+        upstream agent is assumed to pass one completion's worth of context.
+        """
+        completion = settings.LLM_COMPLETION_TOKEN_ESTIMATE
+        return sum(
+            estimate_tokens(agent.instructions) + estimate_tokens(decision_input)
+            + completion * (len(agent.depends_on) + 1)
+            for agent in (self.agents if agents is None else agents)
+        )
+
+    def _record(self, analysis: Dict[str, Any]) -> Any:
+        if self.store is None:
+            return None
+        client_id = current_client.get()
+        analysis_id = self.store.record(
+            analysis,
+            self.fingerprint(analysis["input"]),
+            self.config_fingerprint(),
+            self.model_config(),
+            client_id,
+        )
+        # Analyses holding user-supplied output must not stand in for a model's answer.
+        overridden = any(agent.get("overridden") for agent in analysis["agents"])
+        if self.similarity is not None and analysis["success"] and not overridden:
+            self.similarity.add(analysis_id, analysis["input"], client_id)
+        return analysis_id
+
+    async def refine(
+        self,
+        previous: Dict[str, Any],
+        decision_input: str = None,
+        overrides: Dict[str, str] = None,
+        refresh: Iterable[str] = (),
+    ) -> Dict[str, Any]:
+        """
+        Re-run only the part of a previous analysis affected by a change.
+
+        The change is an edited ``decision_input``, ``overrides`` replacing
+        some agents' output with the given text, and/or agents to
+        ``refresh``. Every other agent whose input and context are unchanged
+        keeps its previous result; the returned analysis lists the agents
+        that actually called the LLM in ``recomputed``.
+        """
+        by_name = {agent["agent"]: agent for agent in previous["agents"]}
+        # Earlier overrides stick until refreshed or overridden again.
+        overrides = {
+            **{name: agent["result"] for name, agent in by_name.items()
+               if agent.get("overridden") and name not in refresh},
+            **(overrides or {}),
+        }
+        precomputed = {
+            name: {
+                "agent": name,
+                "emoji": self._agents_by_name[name].emoji,
+                "result": text,
+                "overridden": True,
+            }
+            for name, text in overrides.items()
+        }
+        memo = {
+            name: {**agent, "timings": {"reused_from": previous["id"]}}
+            for name, agent in by_name.items()
+            if not agent.get("error") and name not in overrides
+        }
+        analysis = await self.analyze(
+            decision_input or previous["input"], precomputed, memo, refresh
+        )
+        analysis["recomputed"] = [
+            agent["agent"] for agent in analysis["agents"]
+            if not agent.get("overridden")
+            and not (agent.get("timings") or {}).get("cached")
+            and "reused_from" not in (agent.get("timings") or {})
+        ]
+        return analysis
+
+    def refine_agents(
+        self,
+        previous: Dict[str, Any],
+        decision_input: str = None,
+        overrides: Dict[str, str] = None,
+        refresh: Iterable[str] = (),
+    ) -> List[BaseAgent]:
+        """
+        Agents a ``refine`` with these changes may run, for estimating its
+        cost: every agent if the decision or configuration changed, else
+        those refreshed, without a usable earlier result, or downstream of
+        one of those or of an override. Overridden agents never run.
+        """
+        by_name = {agent["agent"]: agent for agent in previous["agents"]}
+        overridden = set(overrides or {}) | {
+            name for name, agent in by_name.items() if agent.get("overridden") and name not in refresh
+        }
+        if self.fingerprint(decision_input or previous["input"]) != previous.get("fingerprint"):
+            affected = {agent.name for agent in self.agents}
+        else:
+            changed = set(overrides or {}) | set(refresh) | {
+                agent.name for agent in self.agents
+                if agent.name not in by_name or by_name[agent.name].get("error")
+            }
+            affected = set(changed)
+            for name in changed:
+                affected.update(agent.name for agent in self._downstream_of(name))
+        return [agent for agent in self.agents if agent.name in affected and agent.name not in overridden]
+
+    def _error_result(self, agent: BaseAgent, error: Exception) -> Dict[str, Any]:
+        return {
+            "agent": agent.name,
+            "emoji": agent.emoji,
+            "result": f"Error during analysis: {str(error)}",
+            "error": True,
+            "error_code": classify(error)[0],
+        }
+
+    async def _cached_result(
+        self, agent: BaseAgent, decision_input: str, context: Dict[str, Any]
+    ) -> Any:
+        """
+        A previous successful result to stand in for a failed agent run:
+        the response cache entry for the same call, else the agent's output
+        in the latest stored analysis of the same decision, however old.
+        """
+        cached = await response_cache.get(agent.cache_key(decision_input, context))
+        if cached is not None:
+            return agent.structure({"agent": agent.name, "emoji": agent.emoji, "result": cached})
+        if self.store is None:
+            return None
+        stored = await self.store.find(
+            self.fingerprint(decision_input), float("inf"), current_client.get()
+        )
+        for result in (stored or {}).get("agents", []):
+            if result["agent"] == agent.name and not result.get("error"):
+                return {key: result[key] for key in ("agent", "emoji", "result", "data") if key in result}
+        return None
+
+    def _downstream_of(self, name: str) -> List[BaseAgent]:
+        """Agents that depend on ``name``, directly or transitively."""
+        affected = {name}
+        changed = True
+        while changed:
+            changed = False
+            for agent in self.agents:
+                if agent.name not in affected and any(d in affected for d in agent.depends_on):
+                    affected.add(agent.name)
+                    changed = True
+        return [agent for agent in self.agents if agent.name in affected and agent.name != name]
+
+    @staticmethod
+    def _coverage(speculative: Dict[str, Any], final: Dict[str, Any]) -> float:
+        """
+        Fraction of the context a speculative run started from that is
+        unchanged, as a prefix, in the final context. The run only used what
+        it saw, so upstream text streamed after it started does not count
+        against it; an upstream entry it never saw at all rejects it.
+        """
+        if set(speculative) != set(final):
+            return 0.0
+        total = sum(len(str(v)) for v in speculative.values())
+        if not total:
+            return 1.0
+        kept = sum(
+            len(os.path.commonprefix([str(v), str(final[k])]))
+            for k, v in speculative.items()
+        )
+        return kept / total
+
+    async def _run_graph(
+        self,
+        decision_input: str,
+        stream: bool = False,
+        precomputed: Dict[str, Dict[str, Any]] = None,
+        memo: Dict[str, Dict[str, Any]] = None,
+        refresh: Iterable[str] = (),
+    ) -> AsyncIterator[Tuple[str, BaseAgent, Any]]:
+        """
+        Run the agent graph, yielding ``("start", agent, None)`` when an agent
+        is scheduled and ``("done", agent, result)`` when it finishes.
+
+        With ``stream`` enabled, agents stream their output and
+        ``("delta", agent, text)`` events are yielded as well. Chunks are
+        coalesced per agent and flushed every ``STREAM_FLUSH_INTERVAL``
+        seconds; an agent's buffered text is always flushed before its
+        ``done`` event.
+
+        Agents only see the results of the upstream agents they depend on,
+        selected and compacted by the context builder; failed upstream
+        results are left out of the context.
+
+        Agents with an entry in ``precomputed`` are not run: their given
+        result is reported as soon as the graph starts. An agent with a
+        ``memo`` result whose ``input_hash`` matches its current input and
+        context reuses that result instead of running; agents in ``refresh``
+        always run and bypass the response cache.
+
+        With ``SPECULATIVE_ENABLED``, an agent is started early on the
+        partial output of upstream agents that are still streaming, once
+        they have produced ``SPECULATIVE_MIN_TOKENS`` tokens or
+        ``SPECULATIVE_SECTION_MARKER``. Its output is held back until the
+        upstream agents finish: the run is kept if at least
+        ``SPECULATIVE_TOLERANCE`` of the context it started from is unchanged
+        in the final context (as a prefix), otherwise it is cancelled and
+        restarted on the final context. Agents with structured output are
+        never built on early. Each verdict is yielded as ``("speculation", agent, info)``.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        waiting: List[BaseAgent] = list(self.agents)
+        for agent in self.agents:
+            if precomputed and agent.name in precomputed:
+                waiting.remove(agent)
+                results[agent.name] = precomputed[agent.name]
+                yield "start", agent, None
+                yield "done", agent, results[agent.name]
+        running: Dict[str, asyncio.Future] = {}
+        events: asyncio.Queue = asyncio.Queue()
+        buffered: Dict[str, List[str]] = {}
+        flush_interval = settings.STREAM_FLUSH_INTERVAL
+        loop = asyncio.get_running_loop()
+        last_flush = loop.time()
+        deadline = loop.time() + settings.ANALYSIS_DEADLINE if settings.ANALYSIS_DEADLINE > 0 else None
+        policy = settings.UPSTREAM_FAILURE_POLICY
+        # Context each agent was (last) launched with
+        contexts: Dict[str, Dict[str, Any]] = {}
+
+        speculate = settings.SPECULATIVE_ENABLED
+        marker = settings.SPECULATIVE_SECTION_MARKER
+        # Streamed text and its token count for running agents, in speculative mode
+        partial: Dict[str, List[str]] = {}
+        partial_tokens: Dict[str, int] = {}
+        # Unverified speculative runs: starting context, held-back deltas, held-back completion
+        speculative: Dict[str, Dict[str, Any]] = {}
+        # Final contexts of accepted speculative runs, for their input_hash
+        accepted: Dict[str, Dict[str, Any]] = {}
+
+        def launch(agent: BaseAgent, context: Dict[str, Any] = None) -> asyncio.Future:
+            if context is None:
+                context = self.context_builder.build(agent, results)
+            contexts[agent.name] = context
+            memoized = (memo or {}).get(agent.name)
+            if (memoized is not None and agent.name not in refresh
+                    and memoized.get("input_hash") == agent.cache_key(decision_input, context)):
+                task = loop.create_future()
+                task.set_result(memoized)
+            else:
+                on_token = None
+                if stream or speculate:
+                    # Deltas carry their task so those of a cancelled attempt can be dropped.
+                    attempt: List[asyncio.Future] = []
+                    on_token = lambda chunk: events.put_nowait(("delta", agent, (attempt[0], chunk)))
+                    partial[agent.name], partial_tokens[agent.name] = [], 0
+                task = asyncio.create_task(run_with_policy(
+                    agent, decision_input, context, on_token=on_token,
+                    use_cache=agent.name not in refresh, deadline=deadline,
+                ))
+                if on_token is not None:
+                    attempt.append(task)
+            task.add_done_callback(lambda t: events.put_nowait(("done", agent, t)))
+            return task
+
+        def speculation_ready(name: str) -> bool:
+            """Whether a running, non-speculative agent has streamed enough to build on."""
+            if name not in running or name in speculative or name not in partial:
+                return False
+            if self._agents_by_name[name].structured:
+                # Partial JSON is not the field selection downstream agents will get.
+                return False
+            if partial_tokens[name] >= settings.SPECULATIVE_MIN_TOKENS:
+                return True
+            return bool(marker) and marker in "".join(partial[name])
+
+        def flush(names: List[str]):
+            for name in names:
+                chunks = buffered.pop(name, None)
+                if chunks:
+                    yield "delta", self._agents_by_name[name], "".join(chunks)
+
+        try:
+            while waiting or running:
+                ready = [a for a in waiting if all(d in results for d in a.depends_on)]
+                for agent in ready:
+                    waiting.remove(agent)
+                    running[agent.name] = launch(agent)
+                    yield "start", agent, None
+
+                timeout = None
+                if buffered:
+                    timeout = max(0.0, last_flush + flush_interval - loop.time())
+                try:
+                    kind, agent, payload = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    for event in flush(list(buffered)):
+                        yield event
+                    last_flush = loop.time()
+                    continue
+
+                if kind == "delta":
+                    source, chunk = payload
+                    if running.get(agent.name) is not source:
+                        continue
+                    if speculate:
+                        partial[agent.name].append(chunk)
+                        partial_tokens[agent.name] += estimate_tokens(chunk)
+                    if agent.name in speculative:
+                        speculative[agent.name]["held"].append(chunk)
+                    elif stream:
+                        buffered.setdefault(agent.name, []).append(chunk)
+                        if loop.time() - last_flush >= flush_interval:
+                            for event in flush(list(buffered)):
+                                yield event
+                            last_flush = loop.time()
+                    if not speculate:
+                        continue
+
+                    for downstream in list(waiting):
+                        pending = [d for d in downstream.depends_on if d not in results]
+                        if agent.name not in pending or not all(speculation_ready(d) for d in pending):
+                            continue
+                        context = self.context_builder.build(downstream, {
+                            **results,
+                            **{d: {"agent": d, "result": "".join(partial[d])} for d in pending},
+                        })
+                        waiting.remove(downstream)
+                        speculative[downstream.name] = {"context": context, "held": [], "done": None}
+                        running[downstream.name] = launch(downstream, context)
+                        SPECULATIVE_RUNS.inc(agent=downstream.name, outcome="started")
+                        yield "start", downstream, None
+                    continue
+
+                if running.get(agent.name) is not payload:
+                    continue
+                if agent.name in speculative:
+                    speculative[agent.name]["done"] = payload
+                    continue
+
+                for event in flush([agent.name]):
+                    yield event
+                running.pop(agent.name)
+                partial.pop(agent.name, None)
+                try:
+                    result = payload.result()
+                except Exception as e:
+                    result = self._error_result(agent, e)
+                if agent.name in accepted and not result.get("error"):
+                    result = {**result, "input_hash": agent.cache_key(decision_input, accepted.pop(agent.name))}
+                if result.get("error") and policy == "cached":
+                    substitute = await self._cached_result(agent, decision_input, contexts[agent.name])
+                    if substitute is not None:
+                        result = {**substitute, "stale": True, "error_code": result["error_code"]}
+                results[agent.name] = result
+                yield "done", agent, result
+
+                if result.get("error") and policy == "short_circuit":
+                    for downstream in self._downstream_of(agent.name):
+                        if downstream.name in results:
+                            continue
+                        if downstream.name in running:
+                            running.pop(downstream.name).cancel()
+                            speculative.pop(downstream.name, None)
+                        elif downstream in waiting:
+                            waiting.remove(downstream)
+                            yield "start", downstream, None
+                        else:
+                            continue
+                        results[downstream.name] = self._error_result(
+                            downstream, AgentError(f"Skipped because {agent.name} failed", UPSTREAM_FAILED)
+                        )
+                        yield "done", downstream, results[downstream.name]
+
+                for name, spec in list(speculative.items()):
+                    downstream = self._agents_by_name[name]
+                    if not all(d in results for d in downstream.depends_on):
+                        continue
+                    del speculative[name]
+                    final_context = self.context_builder.build(downstream, results)
+                    coverage = self._coverage(spec["context"], final_context)
+                    if coverage >= settings.SPECULATIVE_TOLERANCE:
+                        SPECULATIVE_RUNS.inc(agent=name, outcome="accepted")
+                        accepted[name] = final_context
+                        if spec["held"]:
+                            buffered.setdefault(name, []).extend(spec["held"])
+                        if spec["done"] is not None:
+                            events.put_nowait(("done", downstream, spec["done"]))
+                        yield "speculation", downstream, {
+                            "accepted": True, "coverage": round(coverage, 4), "wasted_tokens": 0,
+                        }
+                        continue
+
+                    running[name].cancel()
+                    wasted = (
+                        estimate_tokens(downstream.instructions)
+                        + estimate_tokens(decision_input)
+                        + estimate_tokens(downstream.format_context(spec["context"]))
+                        + estimate_tokens("".join(partial.get(name, [])))
+                    )
+                    SPECULATIVE_RUNS.inc(agent=name, outcome="restarted")
+                    SPECULATIVE_WASTED_TOKENS.inc(wasted, agent=name)
+                    running[name] = launch(downstream, final_context)
+                    yield "speculation", downstream, {
+                        "accepted": False, "coverage": round(coverage, 4), "wasted_tokens": wasted,
+                    }
+        finally:
+            for task in running.values():
+                task.cancel()
+
+    def _timing_breakdown(
+        self,
+        started: float,
+        spans: Dict[str, List[float]],
+        results: Dict[str, Dict[str, Any]],
+        speculation: Dict[str, Dict[str, Any]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Per-request timing: each agent's start/end offset plus its own
+        timings, and the verdict on each speculative start.
+        """
+        agents: Dict[str, Any] = {}
+        for agent in self.agents:
+            if agent.name not in spans:
+                continue
+            timing = dict(results.get(agent.name, {}).get("timings") or {})
+            timing["start"], timing["end"] = (t - started for t in spans[agent.name])
+            agents[agent.name] = {
+                k: round(v, 4) if isinstance(v, float) else v for k, v in timing.items()
+            }
+            if speculation and agent.name in speculation:
+                agents[agent.name]["speculation"] = speculation[agent.name]
+        breakdown = {"total": round(time.perf_counter() - started, 4), "agents": agents}
+        if speculation:
+            breakdown["speculation"] = {
+                "started": len(speculation),
+                "accepted": sum(1 for s in speculation.values() if s["accepted"]),
+                "wasted_tokens": sum(s["wasted_tokens"] for s in speculation.values()),
+            }
+        return breakdown
+
+    async def analyze(
+        self,
+        decision_input: str,
+        precomputed: Dict[str, Dict[str, Any]] = None,
+        memo: Dict[str, Dict[str, Any]] = None,
+        refresh: Iterable[str] = (),
+    ) -> Dict[str, Any]:
         """
         Run the full CLEARTHINK analysis pipeline.
-        
+
         Args:
             decision_input: The user's decision/problem description
-            
+            precomputed: Results to use as-is for some agents, by agent name
+            memo: Earlier results, by agent name, reused while their inputs are unchanged
+            refresh: Agents to re-run even when a memoized result applies
+
         Returns:
-            Complete analysis results from all agents
+            Complete analysis results from all agents, in pipeline order
         """
-        results: List[Dict[str, Any]] = []
-        context: Dict[str, str] = {}
-        
-        for agent in self.agents:
-            try:
-                # Run the agent with accumulated context
-                result = await agent.run(decision_input, context)
-                results.append(result)
-                
-                # Add this agent's result to context for next agents
-                context[agent.name] = result["result"]
-                
-            except Exception as e:
-                results.append({
-                    "agent": agent.name,
-                    "emoji": agent.emoji,
-                    "result": f"Error during analysis: {str(e)}",
-                    "error": True
-                })
-        
-        return {
+        started = time.perf_counter()
+        by_name: Dict[str, Dict[str, Any]] = {}
+        spans: Dict[str, List[float]] = {}
+        speculation: Dict[str, Dict[str, Any]] = {}
+
+        async for event, agent, result in self._run_graph(
+            decision_input, precomputed=precomputed, memo=memo, refresh=set(refresh)
+        ):
+            if event == "start":
+                spans[agent.name] = [time.perf_counter(), time.perf_counter()]
+            elif event == "speculation":
+                speculation[agent.name] = result
+            elif event == "done":
+                spans[agent.name][1] = time.perf_counter()
+                by_name[agent.name] = result
+
+        results = [by_name[agent.name] for agent in self.agents]
+        timings = self._timing_breakdown(started, spans, by_name, speculation)
+        ANALYSIS_DURATION.observe(timings["total"], mode="analyze")
+
+        analysis = {
             "input": decision_input,
             "agents": results,
             "agent_count": len(results),
-            "success": all(not r.get("error", False) for r in results)
+            "success": all(not r.get("error", False) for r in results),
+            "timings": timings
         }
-    
-    async def analyze_streaming(self, decision_input: str):
+        analysis["id"] = self._record(analysis)
+        return analysis
+
+    async def analyze_streaming(
+        self, decision_input: str, precomputed: Dict[str, Dict[str, Any]] = None
+    ):
         """
         Generator that yields results as each agent completes.
-        Useful for real-time UI updates.
-        """
-        context: Dict[str, str] = {}
-        
-        for i, agent in enumerate(self.agents):
-            yield {
-                "status": "processing",
-                "current_agent": agent.name,
-                "current_emoji": agent.emoji,
-                "progress": i / len(self.agents)
-            }
-            
-            try:
-                result = await agent.run(decision_input, context)
-                context[agent.name] = result["result"]
-                
+        Events are emitted in completion order, with ``agent_delta`` events
+        carrying token chunks while agents are still running (except for
+        structured-mode agents, whose raw JSON is not worth showing; their
+        ``agent_complete`` event carries the parsed ``data``). Useful for
+        real-time UI updates. ``precomputed`` results are reported first.
+        """
+        total = len(self.agents)
+        completed = 0
+        started = time.perf_counter()
+        by_name: Dict[str, Dict[str, Any]] = {}
+        spans: Dict[str, List[float]] = {}
+        speculation: Dict[str, Dict[str, Any]] = {}
+
+        async for event, agent, result in self._run_graph(
+            decision_input, stream=True, precomputed=precomputed
+        ):
+            if event == "speculation":
+                speculation[agent.name] = result
+                continue
+
+            if event == "delta":
+                if agent.structured:
+                    continue
                 yield {
-                    "status": "agent_complete",
+                    "status": "agent_delta",
                     "agent": agent.name,
                     "emoji": agent.emoji,
-                    "result": result["result"],
-                    "progress": (i + 1) / len(self.agents)
+                    "delta": result,
+                    "progress": completed / total
                 }
-                
-            except Exception as e:
+                continue
+
+            if event == "start":
+                spans[agent.name] = [time.perf_counter(), time.perf_counter()]
+                yield {
+                    "status": "processing",
+                    "current_agent": agent.name,
+                    "current_emoji": agent.emoji,
+                    "progress": completed / total
+                }
+                continue
+
+            completed += 1
+            spans[agent.name][1] = time.perf_counter()
+            by_name[agent.name] = result
+            if result.get("error"):
                 yield {
                     "status": "agent_error",
                     "agent": agent.name,
                     "emoji": agent.emoji,
-                    "error": str(e),
-                    "progress": (i + 1) / len(self.agents)
+                    "error": result["result"],
+                    "error_code": result.get("error_code"),
+                    "progress": completed / total
                 }
-        
-        yield {"status": "complete", "progress": 1.0}
+            else:
+                update = {
+                    "status": "agent_complete",
+                    "agent": agent.name,
+                    "emoji": agent.emoji,
+                    "result": result["result"],
+                    "progress": completed / total
+                }
+                if "data" in result:
+                    update["data"] = result["data"]
+                if result.get("stale"):
+                    update["stale"] = True
+                    update["error_code"] = result["error_code"]
+                yield update
+
+        timings = self._timing_breakdown(started, spans, by_name, speculation)
+        ANALYSIS_DURATION.observe(timings["total"], mode="stream")
+        results = [by_name[agent.name] for agent in self.agents]
+        analysis_id = self._record({
+            "input": decision_input,
+            "agents": results,
+            "success": all(not r.get("error", False) for r in results),
+            "timings": timings,
+        })
+        yield {"status": "complete", "progress": 1.0, "id": analysis_id, "timings": timings}
+
+    @staticmethod
+    def comparison_inputs(decision_input: str, variants: List[str]) -> List[str]:
+        """The decision text of each option: the base decision, then base plus each variant."""
+        return [decision_input] + [f"{decision_input}\n\n{variant}" for variant in variants]
+
+    async def compare_streaming(self, decision_input: str, variants: List[str]):
+        """
+        Analyze a base decision and variants of it side by side, as one stream.
+
+        Option 0 is the base decision; option ``i`` is the base with
+        ``variants[i - 1]`` appended. The ``COMPARE_SHARED_STAGES`` (and
+        only together with everything they depend on) run once, on the
+        base decision, and every variant starts from their results as soon
+        as they finish; the remaining stages run concurrently per option.
+        Options with equivalent input (as for ``fingerprint``) run once.
+
+        Yields the events of ``analyze_streaming`` tagged with their
+        ``option``, each option's ``complete`` event renamed to
+        ``option_complete``, and finally a ``complete`` event listing the
+        stages that were shared.
+        """
+        started = time.perf_counter()
+        inputs = self.comparison_inputs(decision_input, variants)
+        # First option with each distinct input -> every option with that input
+        runs: Dict[int, List[int]] = {}
+        first: Dict[str, int] = {}
+        for option, text in enumerate(inputs):
+            runs.setdefault(first.setdefault(self.fingerprint(text), option), []).append(option)
+
+        updates: asyncio.Queue = asyncio.Queue()
+        tasks: List[asyncio.Task] = []
+        pending_shared = {name for name in self._agents_by_name if name in settings.COMPARE_SHARED_STAGES}
+        shared: Dict[str, Dict[str, Any]] = {}
+        precomputed: Dict[str, Dict[str, Any]] = {}
+
+        async def run(option: int, precomputed: Dict[str, Dict[str, Any]] = None) -> None:
+            try:
+                async for update in self.analyze_streaming(inputs[option], precomputed):
+                    updates.put_nowait((option, update))
+            except Exception as e:
+                updates.put_nowait((option, e))
+            else:
+                updates.put_nowait((option, None))
+
+        def start_variants() -> None:
+            for agent in self.agents:
+                if agent.name in shared and all(d in precomputed for d in agent.depends_on):
+                    precomputed[agent.name] = {**shared[agent.name], "timings": {"shared": True}}
+            for option in runs:
+                if option != 0:
+                    tasks.append(asyncio.create_task(run(option, precomputed or None)))
+
+        tasks.append(asyncio.create_task(run(0)))
+        if not pending_shared:
+            start_variants()
+        active = len(runs)
+        try:
+            while active:
+                option, update = await updates.get()
+                if isinstance(update, Exception):
+                    raise update
+                if update is None:
+                    active -= 1
+                    if option == 0 and pending_shared:
+                        pending_shared.clear()
+                        start_variants()
+                    continue
+
+                status = update["status"]
+                if (option == 0 and update.get("agent") in pending_shared
+                        and status in ("agent_complete", "agent_error")):
+                    pending_shared.discard(update["agent"])
+                    if status == "agent_complete" and not update.get("stale"):
+                        shared[update["agent"]] = {
+                            key: update[key] for key in ("agent", "emoji", "result", "data") if key in update
+                        }
+                    if not pending_shared:
+                        start_variants()
+                if status == "complete":
+                    status = "option_complete"
+                for tagged in runs[option]:
+                    yield {**update, "status": status, "option": tagged}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "status": "complete",
+            "progress": 1.0,
+            "shared": list(precomputed),
+            "timings": {"total": round(time.perf_counter() - started, 4)},
+        }
@@ -0,0 +1,132 @@
+"""Failure policy - timeouts, retries and error classification for agent runs."""
+
+import asyncio
+import logging
+import random
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+from app.metrics import AGENT_RETRIES
+
+from .base import BaseAgent
+
+
+logger = logging.getLogger(__name__)
+
+# Error codes reported in agent results and SSE events
+TIMEOUT = "timeout"
+DEADLINE_EXCEEDED = "deadline_exceeded"
+RATE_LIMITED = "rate_limited"
+PROVIDER_UNAVAILABLE = "provider_unavailable"
+PROVIDER_ERROR = "provider_error"
+CONNECTION_ERROR = "connection_error"
+UPSTREAM_FAILED = "upstream_failed"
+INTERNAL_ERROR = "internal_error"
+
+UPSTREAM_FAILURE_POLICIES = ("skip", "cached", "short_circuit")
+
+
+class AgentError(Exception):
+    """An agent run that failed with a known error code."""
+
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+def classify(error: BaseException) -> Tuple[str, bool]:
+    """Map an exception to ``(error code, whether it is worth retrying)``."""
+    if isinstance(error, AgentError):
+        return error.code, False
+    if isinstance(error, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return TIMEOUT, True
+    status = getattr(error, "status_code", None)
+    if isinstance(status, int):
+        if status == 429:
+            return RATE_LIMITED, True
+        if status >= 500:
+            return PROVIDER_UNAVAILABLE, True
+        return PROVIDER_ERROR, False
+    if isinstance(error, httpx.TransportError):
+        return CONNECTION_ERROR, True
+    try:
+        import groq
+    except ImportError:
+        pass
+    else:
+        if isinstance(error, groq.APITimeoutError):
+            return TIMEOUT, True
+        if isinstance(error, groq.APIConnectionError):
+            return CONNECTION_ERROR, True
+    return INTERNAL_ERROR, False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number ``attempt`` (1-based)."""
+    ceiling = min(settings.AGENT_RETRY_BACKOFF_MAX, settings.AGENT_RETRY_BACKOFF_BASE * 2 ** (attempt - 1))
+    return random.uniform(0, ceiling)
+
+
+def agent_timeout(agent: BaseAgent) -> float:
+    """Per-attempt timeout for an agent in seconds (0 = none)."""
+    return float(settings.AGENT_TIMEOUTS.get(agent.name, settings.AGENT_TIMEOUT))
+
+
+async def run_with_policy(
+    agent: BaseAgent,
+    user_input: str,
+    context: Dict[str, Any],
+    on_token: Optional[Callable[[str], None]] = None,
+    use_cache: bool = True,
+    deadline: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Run an agent with its timeout, retrying transient failures.
+
+    Each attempt is bounded by the agent's timeout and by ``deadline`` (an
+    event loop time). Rate limits, provider 5xx responses, connection
+    errors and timeouts are retried up to ``AGENT_RETRIES`` times with
+    jittered exponential backoff - but only while nothing has been streamed
+    yet, since streamed chunks cannot be taken back. Failures are raised as
+    ``AgentError`` with their error code.
+    """
+    loop = asyncio.get_running_loop()
+    streamed = False
+
+    def relay(chunk: str) -> None:
+        nonlocal streamed
+        streamed = True
+        on_token(chunk)
+
+    attempt = 0
+    while True:
+        timeout = agent_timeout(agent) or None
+        if deadline is not None:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise AgentError("Analysis deadline exceeded before the agent could finish", DEADLINE_EXCEEDED)
+            timeout = min(timeout, remaining) if timeout else remaining
+        try:
+            return await asyncio.wait_for(
+                agent.run(user_input, context, on_token=relay if on_token else None, use_cache=use_cache),
+                timeout,
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            code, transient = classify(e)
+            if code == TIMEOUT and deadline is not None and loop.time() >= deadline:
+                code = DEADLINE_EXCEEDED
+            attempt += 1
+            delay = backoff_delay(attempt)
+            if (not transient or streamed or attempt > settings.AGENT_RETRIES
+                    or (deadline is not None and loop.time() + delay >= deadline)):
+                message = "Timed out" if code in (TIMEOUT, DEADLINE_EXCEEDED) and not str(e) else str(e)
+                raise AgentError(message, code) from e
+            AGENT_RETRIES.inc(agent=agent.name, error_code=code)
+            logger.warning(
+                "%s failed (%s), retry %d/%d in %.2fs", agent.name, code, attempt, settings.AGENT_RETRIES, delay
+            )
+            await asyncio.sleep(delay)
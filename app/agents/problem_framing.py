@@ -6,6 +6,15 @@ from .base import BaseAgent
 class ProblemFramingAgent(BaseAgent):
     """Transforms messy, unclear inputs into structured problem statements."""
     
+    output_schema = {
+        "problem_statement": "str",
+        "core_question": "str",
+        "constraints": ["str"],
+        "what_matters": ["str"],
+        "stakeholders": ["str"],
+        "timeline": "str",
+    }
+    
     @property
     def name(self) -> str:
         return "Problem Framing"
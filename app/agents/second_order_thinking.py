@@ -1,11 +1,27 @@
 """Second-Order Thinking Agent - Explores consequences of consequences."""
 
+from typing import List
+
 from .base import BaseAgent
 
 
 class SecondOrderThinkingAgent(BaseAgent):
     """Analyzes what happens next - success and failure scenarios."""
     
+    output_schema = {
+        "options": [{
+            "option": "str",
+            "if_it_works": ["str"],
+            "if_it_fails": ["str"],
+            "recovery_path": "str",
+            "unexpected": ["str"],
+        }],
+    }
+    context_fields = {
+        "Problem Framing": ["core_question", "what_matters", "timeline"],
+        "Option Generator": ["options.name", "options.pros", "options.cons"],
+    }
+    
     @property
     def name(self) -> str:
         return "Second-Order Thinking"
@@ -14,6 +30,10 @@ class SecondOrderThinkingAgent(BaseAgent):
     def emoji(self) -> str:
         return "🔮"
     
+    @property
+    def depends_on(self) -> List[str]:
+        return ["Problem Framing", "Option Generator"]
+    
     @property
     def system_prompt(self) -> str:
         return """You are the Second-Order Thinking Agent in the CLEARTHINK decision-making system.
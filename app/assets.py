@@ -0,0 +1,262 @@
+"""Static assets - fingerprinted, precompressed and served from memory.
+
+``python -m app.assets`` (run in the Docker build) writes every file in
+``STATIC_DIR`` to ``ASSETS_DIR`` under a content-hashed name such as
+``styles.3f2a9c1e04b7.css``, rewrites ``/static/...`` references in
+HTML, CSS and JS to the hashed names, and adds ``.gz`` and (with the
+brotli package) ``.br`` variants wherever they are smaller. Workers load
+that build at startup, or build it themselves when it is missing or out
+of date, and serve it from memory: the best variant the client accepts,
+an ETag with 304s for revalidation, and immutable caching for hashed
+names, so browsers fetch each version of a file only once.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from typing import Dict, List
+
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.compression import accepted_encodings
+from app.config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = "manifest.json"
+
+# Files whose /static/... references are rewritten to hashed names
+_REWRITABLE = (".html", ".css", ".js")
+_COMPRESSIBLE = (".html", ".css", ".js", ".json", ".map", ".svg", ".txt")
+_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+_REFERENCE = re.compile(r"/static/([\w./-]+)")
+
+
+def fingerprint(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()[:12]
+
+
+def hashed_name(name: str, digest: str) -> str:
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest}{ext}"
+
+
+def source_digest(source: str) -> str:
+    """Hash of every file name and content in ``source``, to tell whether a build is current."""
+    digest = hashlib.sha256()
+    for name in _source_files(source):
+        with open(os.path.join(source, name), "rb") as f:
+            digest.update(name.encode("utf-8") + b"\0" + f.read() + b"\0")
+    return digest.hexdigest()
+
+
+def _source_files(source: str) -> List[str]:
+    return sorted(
+        name for name in os.listdir(source)
+        if os.path.isfile(os.path.join(source, name)) and not name.startswith(".")
+    )
+
+
+class Asset:
+    """One static file: its encoded variants and cache validator."""
+
+    def __init__(self, file: str, digest: str, variants: Dict[str, bytes], immutable: bool):
+        self.file = file
+        self.digest = digest
+        self.variants = variants
+        self.immutable = immutable
+        self.media_type = mimetypes.guess_type(file)[0] or "application/octet-stream"
+
+
+def _variants(name: str, content: bytes) -> Dict[str, bytes]:
+    variants = {"identity": content}
+    if name.endswith(_COMPRESSIBLE):
+        compressed = {"gzip": gzip.compress(content, 9, mtime=0)}
+        if brotli is not None:
+            compressed["br"] = brotli.compress(content, quality=11)
+        variants.update((k, v) for k, v in compressed.items() if len(v) < len(content))
+    return variants
+
+
+def build_assets(source: str) -> Dict[str, Asset]:
+    """
+    Fingerprint and precompress the files in ``source``, by URL name.
+
+    Hashed names are immutable. Original names stay available but are
+    revalidated on every use; HTML pages, the entry points that link to
+    the hashed names, are not renamed at all.
+    """
+    names: Dict[str, str] = {}
+    assets: Dict[str, Asset] = {}
+    # Plain files first, then CSS/JS that may reference them, then HTML that references everything.
+    order = sorted(_source_files(source), key=lambda n: (n.endswith(".html"), n.endswith(_REWRITABLE)))
+    for name in order:
+        with open(os.path.join(source, name), "rb") as f:
+            content = f.read()
+        if name.endswith(_REWRITABLE):
+            content = _REFERENCE.sub(
+                lambda m: "/static/" + names.get(m.group(1), m.group(1)), content.decode("utf-8")
+            ).encode("utf-8")
+        digest = fingerprint(content)
+        variants = _variants(name, content)
+        if name.endswith(".html"):
+            assets[name] = Asset(name, digest, variants, immutable=False)
+            continue
+        names[name] = hashed_name(name, digest)
+        assets[names[name]] = Asset(names[name], digest, variants, immutable=True)
+        assets[name] = Asset(names[name], digest, variants, immutable=False)
+    return assets
+
+
+def _write(path: str, data: bytes) -> None:
+    # Write-then-rename, so workers building at the same time never read a partial file.
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def write_build(assets: Dict[str, Asset], output: str, source: str) -> None:
+    """Write ``assets`` and their manifest to ``output``; ``source`` is the ``source_digest``."""
+    os.makedirs(output, exist_ok=True)
+    for asset in {asset.file: asset for asset in assets.values()}.values():
+        for encoding, data in asset.variants.items():
+            path = os.path.join(output, asset.file + _SUFFIXES.get(encoding, ""))
+            # A hashed name always holds the same content; pages are rewritten every build.
+            if asset.digest not in asset.file or not os.path.exists(path):
+                _write(path, data)
+    manifest = {
+        "source": source,
+        "assets": {
+            name: {
+                "file": asset.file,
+                "digest": asset.digest,
+                "immutable": asset.immutable,
+                "encodings": list(asset.variants),
+            }
+            for name, asset in assets.items()
+        },
+    }
+    _write(os.path.join(output, MANIFEST), json.dumps(manifest, indent=2).encode("utf-8"))
+
+
+def read_build(output: str, manifest: Dict) -> Dict[str, Asset]:
+    """Load a build written by ``write_build``."""
+    files: Dict[str, bytes] = {}
+
+    def read(path: str) -> bytes:
+        if path not in files:
+            with open(os.path.join(output, path), "rb") as f:
+                files[path] = f.read()
+        return files[path]
+
+    return {
+        name: Asset(
+            entry["file"],
+            entry["digest"],
+            {encoding: read(entry["file"] + _SUFFIXES.get(encoding, "")) for encoding in entry["encodings"]},
+            entry["immutable"],
+        )
+        for name, entry in manifest["assets"].items()
+    }
+
+
+def load_assets(source: str, output: str) -> Dict[str, Asset]:
+    """The build in ``output`` if it matches ``source``, else a fresh build (saved when possible)."""
+    digest = source_digest(source)
+    try:
+        with open(os.path.join(output, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("source") == digest:
+            return read_build(output, manifest)
+    except (OSError, ValueError, KeyError):
+        pass
+    logger.info("Building static assets from %s", source)
+    assets = build_assets(source)
+    try:
+        write_build(assets, output, digest)
+    except OSError as e:
+        logger.warning("Could not save static assets to %s: %s", output, e)
+    return assets
+
+
+class StaticAssets:
+    """ASGI app serving the built assets from memory."""
+
+    def __init__(self, source: str = None, output: str = None, max_age: int = None):
+        self.source = source or settings.STATIC_DIR
+        self.output = output or settings.ASSETS_DIR
+        self.max_age = settings.ASSETS_MAX_AGE if max_age is None else max_age
+        self.assets: Dict[str, Asset] = {}
+
+    def load(self) -> None:
+        self.assets = load_assets(self.source, self.output)
+        logger.info("Loaded %d static assets", len(self.assets))
+
+    def response(self, name: str, headers: Headers) -> Response:
+        """The response for asset ``name``, given the request ``headers``."""
+        asset = self.assets.get(name)
+        if asset is None:
+            return PlainTextResponse("Not Found", status_code=404)
+
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = next(
+            (coding for coding in ("br", "gzip")
+             if coding in asset.variants and accepted.get(coding, accepted.get("*", 0.0)) > 0),
+            "identity",
+        )
+        etag = f'"{asset.digest}"' if encoding == "identity" else f'"{asset.digest}-{encoding}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": f"public, max-age={self.max_age}, immutable" if asset.immutable else "no-cache",
+        }
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if_none_match = headers.get("if-none-match", "")
+        if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")) or if_none_match == "*":
+            return Response(status_code=304, headers=response_headers)
+        return Response(asset.variants[encoding], media_type=asset.media_type, headers=response_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["method"] not in ("GET", "HEAD"):
+            response: Response = PlainTextResponse("Method Not Allowed", status_code=405)
+        else:
+            path, root_path = scope["path"], scope.get("root_path", "")
+            if root_path and path.startswith(root_path):
+                path = path[len(root_path):]
+            response = self.response(path.lstrip("/"), Headers(scope=scope))
+        await response(scope, receive, send)
+
+
+def main() -> None:
+    """Build the fingerprinted, precompressed static assets."""
+    parser = argparse.ArgumentParser(description="Build CLEARTHINK static assets")
+    parser.add_argument("--source", default=settings.STATIC_DIR)
+    parser.add_argument("--output", default=settings.ASSETS_DIR)
+    args = parser.parse_args()
+    assets = build_assets(args.source)
+    write_build(assets, args.output, source_digest(args.source))
+    for name, asset in sorted(assets.items()):
+        if asset.file == name:
+            sizes = ", ".join(f"{encoding} {len(data)}" for encoding, data in asset.variants.items())
+            print(f"📦 {name}: {sizes} bytes")
+
+
+if __name__ == "__main__":
+    main()
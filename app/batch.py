@@ -0,0 +1,98 @@
+"""Batch analysis - run many decisions with bounded parallelism and rate limits."""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Iterable, List, Set
+
+from app.scheduler import TokenBucket
+
+
+def parse_decisions(lines: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Parse JSONL decision records.
+
+    Each line is an object with a ``decision`` and an optional ``id``;
+    records without an id get one derived from the decision text, so
+    re-running the same file yields the same ids.
+    """
+    items = []
+    for number, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e.msg})")
+        if not isinstance(record, dict) or not str(record.get("decision", "")).strip():
+            raise ValueError(f"Line {number}: expected an object with a non-empty 'decision'")
+        decision = str(record["decision"])
+        item_id = record.get("id")
+        if item_id is None:
+            item_id = hashlib.sha1(decision.encode("utf-8")).hexdigest()[:12]
+        items.append({"id": str(item_id), "decision": decision})
+    return items
+
+
+def completed_ids(path: str) -> Set[str]:
+    """Ids already analyzed successfully in an existing JSONL output file."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A partially written last line from an interrupted run.
+                continue
+            if "id" in record and record.get("success"):
+                done.add(str(record["id"]))
+    return done
+
+
+async def run_batch(
+    orchestrator,
+    items: List[Dict[str, Any]],
+    parallelism: int = 4,
+    requests_per_minute: float = 0,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Analyze ``items`` with at most ``parallelism`` running at once, starting
+    no more than ``requests_per_minute`` (0 = unlimited). Yields one record
+    per item in completion order.
+    """
+    bucket = None
+    if requests_per_minute > 0:
+        bucket = TokenBucket(requests_per_minute / 60.0, max(1.0, min(parallelism, requests_per_minute)))
+    pending = iter(items)
+    finished: asyncio.Queue = asyncio.Queue()
+
+    async def analyze(item: Dict[str, Any]) -> None:
+        started = time.monotonic()
+        try:
+            analysis = await orchestrator.analyze(item["decision"])
+            record = {"id": item["id"], "analysis": analysis, "success": analysis["success"]}
+        except Exception as e:
+            record = {"id": item["id"], "error": str(e), "success": False}
+        record["elapsed"] = round(time.monotonic() - started, 3)
+        finished.put_nowait(record)
+
+    async def feeder(worker_count: int) -> None:
+        async def worker():
+            for item in pending:
+                if bucket is not None:
+                    await bucket.take(1)
+                await analyze(item)
+        await asyncio.gather(*(worker() for _ in range(worker_count)))
+
+    feeding = asyncio.create_task(feeder(max(1, parallelism)))
+    try:
+        for _ in range(len(items)):
+            yield await finished.get()
+        await feeding
+    finally:
+        feeding.cancel()
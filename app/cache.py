@@ -0,0 +1,218 @@
+"""Response cache for agent runs.
+
+Agent results are content-addressed: the key is a hash of everything that
+determines the LLM output (model, temperature, system prompt, user input and
+upstream context). Two backends are provided: an in-process LRU with a TTL
+and a SQLite file that several uvicorn workers can share.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from app.config import settings
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Hash the given parts into a stable cache key."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(ABC):
+    """Base class for response cache backends with hit/miss counters."""
+
+    backend = "base"
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached value for ``key``, or None on a miss."""
+        value = await self._get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        """Store ``value`` under ``key``."""
+        await self._set(key, value)
+
+    @abstractmethod
+    async def _get(self, key: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    async def _set(self, key: str, value: str) -> None:
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        """Number of entries currently stored."""
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self.size(),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+class NullCache(ResponseCache):
+    """Cache that never stores anything."""
+
+    backend = "none"
+
+    async def _get(self, key: str) -> Optional[str]:
+        return None
+
+    async def _set(self, key: str, value: str) -> None:
+        return None
+
+    def size(self) -> int:
+        return 0
+
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache with a TTL and a bound on the number of entries."""
+
+    backend = "memory"
+
+    def __init__(self, ttl: float, max_entries: int):
+        super().__init__(ttl, max_entries)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    async def _get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def _set(self, key: str, value: str) -> None:
+        self._entries[key] = (time.time() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache(ResponseCache):
+    """
+    On-disk cache backed by SQLite.
+
+    The database runs in WAL mode so several worker processes can read and
+    write it concurrently. Entries are evicted by TTL and, once the table
+    exceeds ``max_entries``, least recently used first.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str, ttl: float, max_entries: int):
+        super().__init__(ttl, max_entries)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self._conn.commit()
+
+    def _get_sync(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, expires_at = row
+            if expires_at < now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value
+
+    def _set_sync(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now + self.ttl, now),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    async def _get(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def _set(self, key: str, value: str) -> None:
+        await asyncio.to_thread(self._set_sync, key, value)
+
+    def size(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+def create_cache(backend: str) -> ResponseCache:
+    """Build the response cache configured by ``CACHE_BACKEND``."""
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryCache(settings.CACHE_TTL, settings.CACHE_MAX_ENTRIES)
+    if backend == "sqlite":
+        return SQLiteCache(settings.CACHE_PATH, settings.CACHE_TTL, settings.CACHE_MAX_ENTRIES)
+    if backend in ("none", "off", ""):
+        return NullCache(settings.CACHE_TTL, 0)
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+
+response_cache = create_cache(settings.CACHE_BACKEND)
@@ -0,0 +1,157 @@
+"""Response compression negotiated from ``Accept-Encoding``.
+
+Brotli is used when the ``brotli`` package is installed and the client
+accepts it, gzip otherwise. Streamed responses (Server-Sent Events,
+JSONL batches) are compressed chunk by chunk with a sync flush after
+each one, so every event reaches the client as soon as it is sent
+rather than when the compressor's window fills up.
+"""
+
+import zlib
+from typing import Dict, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import RESPONSE_BYTES, RESPONSE_UNCOMPRESSED_BYTES
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+_COMPRESSIBLE = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/x-ndjson",
+    "image/svg+xml",
+)
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """``{coding: q}`` from an ``Accept-Encoding`` header."""
+    accepted: Dict[str, float] = {}
+    for part in header.split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        name, _, value = params.strip().partition("=")
+        if name.strip() == "q":
+            try:
+                q = float(value)
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(header: str) -> Optional[str]:
+    """The best encoding this server can produce for an ``Accept-Encoding`` header, if any."""
+    accepted = accepted_encodings(header)
+    wildcard = accepted.get("*", 0.0)
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if accepted.get(coding, wildcard) > 0:
+            return coding
+    return None
+
+
+class _Compressor:
+    """Incremental gzip or brotli compressor."""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._gzip = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress ``data`` and flush it, so the client can decode it straight away."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gzip.compress(data) + self._gzip.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gzip.compress(data) + self._gzip.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compress compressible responses of at least ``minimum_size`` bytes.
+
+    Responses that already have a ``Content-Encoding``, partial content
+    and other media types pass through unchanged. Streamed responses are
+    always compressed, with a flush after every chunk.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 500,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start: Optional[Message] = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message: Message) -> None:
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                headers = Headers(raw=message["headers"])
+                compressible = headers.get("content-type", "").startswith(_COMPRESSIBLE)
+                if compressible and "accept-encoding" not in headers.get("vary", "").lower():
+                    MutableHeaders(raw=message["headers"]).add_vary_header("Accept-Encoding")
+                passthrough = (
+                    encoding is None
+                    or not compressible
+                    or "content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" and not passthrough and compressor is None:
+                # Anything but a body first (e.g. pathsend): send the response as it is.
+                passthrough = True
+                await send(start)
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = encoding
+                del headers["Content-Length"]
+                await send(start)
+
+            RESPONSE_UNCOMPRESSED_BYTES.inc(len(body), encoding=encoding)
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            RESPONSE_BYTES.inc(len(data), encoding=encoding)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,5 +1,6 @@
 """Configuration settings for CLEARTHINK."""
 
+import json
 import os
 from dotenv import load_dotenv
 
@@ -11,17 +12,220 @@ class Settings:
     
     GROQ_API_KEY: str = os.getenv("GROQ_API_KEY", "")
     MODEL_NAME: str = os.getenv("MODEL_NAME", "llama-3.3-70b-versatile")
+    # "groq", or "fake" for the offline benchmark/test backend
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "groq")
+    
+    # Model routing
+    # JSON map of agent name -> {"provider", "model", "temperature", "fallbacks": [route, ...]};
+    # unset fields default to LLM_PROVIDER, MODEL_NAME and 0.7. Fake routes accept FakeChatModel
+    # parameters, e.g. {"provider": "fake", "model": "flaky", "error_rate": 0.5}
+    AGENT_MODELS: dict = json.loads(os.getenv("AGENT_MODELS", "{}"))
+    # JSON list of fallback routes for agents that don't list their own
+    LLM_FALLBACKS: list = json.loads(os.getenv("LLM_FALLBACKS", "[]"))
+    # Consecutive failures (errors or SLO breaches) that open a route's circuit, and seconds it stays open
+    ROUTER_FAILURE_THRESHOLD: int = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "5"))
+    ROUTER_COOLDOWN: float = float(os.getenv("ROUTER_COOLDOWN", "30"))
+    # Calls slower than this many seconds count as failures (0 = no SLO)
+    ROUTER_LATENCY_SLO: float = float(os.getenv("ROUTER_LATENCY_SLO", "0"))
+    # Send a backup request when a call outlives the route's p95 latency
+    ROUTER_HEDGING: bool = os.getenv("ROUTER_HEDGING", "false").lower() == "true"
+    ROUTER_HEDGE_MIN_SAMPLES: int = int(os.getenv("ROUTER_HEDGE_MIN_SAMPLES", "20"))
+    ROUTER_LATENCY_WINDOW: int = int(os.getenv("ROUTER_LATENCY_WINDOW", "200"))
+    
+    # LLM connection pool settings
+    LLM_MAX_CONNECTIONS: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    LLM_REQUEST_TIMEOUT: float = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+    
+    # Admission control and LLM call scheduling
+    LLM_MAX_IN_FLIGHT: int = int(os.getenv("LLM_MAX_IN_FLIGHT", "16"))
+    # Tokens-per-minute budget across all LLM calls (0 = unlimited)
+    LLM_TOKENS_PER_MINUTE: int = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+    # Completion tokens reserved per call until the real size is known
+    LLM_COMPLETION_TOKEN_ESTIMATE: int = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "800"))
+    # Analyses a single client / all clients may have queued or running
+    SCHEDULER_MAX_QUEUE_PER_CLIENT: int = int(os.getenv("SCHEDULER_MAX_QUEUE_PER_CLIENT", "4"))
+    SCHEDULER_MAX_QUEUE_TOTAL: int = int(os.getenv("SCHEDULER_MAX_QUEUE_TOTAL", "64"))
+    
+    # Tenants - per-caller rate limits, daily quotas and usage accounting
+    # JSON map of API key -> tenant name, or -> {"tenant": name, plus any of the limits below}
+    # (requests_per_minute, tokens_per_minute, daily_requests, daily_tokens) for that tenant
+    TENANT_API_KEYS: dict = json.loads(os.getenv("TENANT_API_KEYS", "{}"))
+    # Reject requests without an API key (otherwise X-Client-ID or the address is the tenant)
+    TENANT_REQUIRE_API_KEY: bool = os.getenv("TENANT_REQUIRE_API_KEY", "false").lower() == "true"
+    # Default per-tenant analysis requests and estimated LLM tokens per minute (0 = unlimited)
+    TENANT_REQUESTS_PER_MINUTE: float = float(os.getenv("TENANT_REQUESTS_PER_MINUTE", "0"))
+    TENANT_TOKENS_PER_MINUTE: float = float(os.getenv("TENANT_TOKENS_PER_MINUTE", "0"))
+    # Default per-tenant analysis requests and LLM tokens per UTC day (0 = unlimited)
+    TENANT_DAILY_REQUESTS: int = int(os.getenv("TENANT_DAILY_REQUESTS", "0"))
+    TENANT_DAILY_TOKENS: int = int(os.getenv("TENANT_DAILY_TOKENS", "0"))
+    # Usage ledger shared by every worker, and the longest usage waits to be written
+    USAGE_DB_PATH: str = os.getenv("USAGE_DB_PATH", "data/usage.sqlite3")
+    USAGE_FLUSH_INTERVAL: float = float(os.getenv("USAGE_FLUSH_INTERVAL", "1"))
+    
+    # Context builder settings
+    # JSON map of agent name -> upstream entries it sees ("Agent" or "Agent#Section")
+    CONTEXT_SELECTION: dict = json.loads(os.getenv("CONTEXT_SELECTION", "") or "{}")
+    # Compaction when context exceeds the budget: "none", "truncate" or "extractive"
+    CONTEXT_COMPACTION: str = os.getenv("CONTEXT_COMPACTION", "none")
+    # Per-agent context token budget (0 = unlimited)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "0"))
+    # Agents with an output schema answer in compact JSON, and pass only the needed fields downstream
+    STRUCTURED_OUTPUTS: bool = os.getenv("STRUCTURED_OUTPUTS", "false").lower() == "true"
+    
+    # Streaming settings
+    # Seconds to coalesce token chunks into a single agent_delta frame (0 = no coalescing)
+    STREAM_FLUSH_INTERVAL: float = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+    # Seconds a finished stream stays available for reconnecting clients, and how many are kept
+    STREAM_REPLAY_TTL: float = float(os.getenv("STREAM_REPLAY_TTL", "300"))
+    STREAM_REPLAY_MAX: int = int(os.getenv("STREAM_REPLAY_MAX", "256"))
+    # Cancel a running stream nobody has followed for this many seconds (0 = never)
+    STREAM_ABANDON_TIMEOUT: float = float(os.getenv("STREAM_ABANDON_TIMEOUT", "30"))
+    
+    # Response compression (gzip, or brotli when the package is installed)
+    COMPRESSION_ENABLED: bool = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+    # Smallest non-streamed response worth compressing, in bytes
+    COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+    COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+    
+    # Static assets: sources, and where `python -m app.assets` writes the fingerprinted build
+    STATIC_DIR: str = os.getenv("STATIC_DIR", "static")
+    ASSETS_DIR: str = os.getenv("ASSETS_DIR", "build/static")
+    # Cache lifetime (seconds) of fingerprinted asset URLs
+    ASSETS_MAX_AGE: int = int(os.getenv("ASSETS_MAX_AGE", "31536000"))
+    
+    # Failure policy
+    # Seconds each agent attempt may take (0 = no limit), with per-agent overrides as a JSON map
+    AGENT_TIMEOUT: float = float(os.getenv("AGENT_TIMEOUT", "60"))
+    AGENT_TIMEOUTS: dict = json.loads(os.getenv("AGENT_TIMEOUTS", "{}"))
+    # Seconds a whole analysis may take (0 = no limit)
+    ANALYSIS_DEADLINE: float = float(os.getenv("ANALYSIS_DEADLINE", "180"))
+    # Retries of transient errors (rate limits, 5xx, timeouts) with jittered exponential backoff
+    AGENT_RETRIES: int = int(os.getenv("AGENT_RETRIES", "2"))
+    AGENT_RETRY_BACKOFF_BASE: float = float(os.getenv("AGENT_RETRY_BACKOFF_BASE", "0.5"))
+    AGENT_RETRY_BACKOFF_MAX: float = float(os.getenv("AGENT_RETRY_BACKOFF_MAX", "8"))
+    # What dependents of a failed agent get: "skip", "cached" or "short_circuit"
+    UPSTREAM_FAILURE_POLICY: str = os.getenv("UPSTREAM_FAILURE_POLICY", "skip")
+    
+    # Speculative execution - start agents on upstream output that is still streaming
+    SPECULATIVE_ENABLED: bool = os.getenv("SPECULATIVE_ENABLED", "false").lower() == "true"
+    # Upstream tokens streamed before downstream agents start early...
+    SPECULATIVE_MIN_TOKENS: int = int(os.getenv("SPECULATIVE_MIN_TOKENS", "300"))
+    # ...or text that, once streamed, marks the upstream output as usable (e.g. a section heading)
+    SPECULATIVE_SECTION_MARKER: str = os.getenv("SPECULATIVE_SECTION_MARKER", "")
+    # Share of the context the early start saw that must be unchanged at the end to keep it
+    SPECULATIVE_TOLERANCE: float = float(os.getenv("SPECULATIVE_TOLERANCE", "0.8"))
+    
+    # Response cache settings
+    # Backend: "memory" (per-process LRU), "sqlite" (shared on-disk) or "none"
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_TTL: float = float(os.getenv("CACHE_TTL", "3600"))
+    CACHE_MAX_ENTRIES: int = int(os.getenv("CACHE_MAX_ENTRIES", "1000"))
+    CACHE_PATH: str = os.getenv("CACHE_PATH", "data/cache.sqlite3")
+    
+    # Analysis store settings
+    STORE_ENABLED: bool = os.getenv("STORE_ENABLED", "true").lower() == "true"
+    STORE_PATH: str = os.getenv("STORE_PATH", "data/analyses.sqlite3")
+    # Records written per batch, and the longest a record waits to be written
+    STORE_BATCH_SIZE: int = int(os.getenv("STORE_BATCH_SIZE", "50"))
+    STORE_FLUSH_INTERVAL: float = float(os.getenv("STORE_FLUSH_INTERVAL", "0.5"))
+    # Serve a stored result for a repeated decision instead of re-running the pipeline
+    STORE_REUSE_RESULTS: bool = os.getenv("STORE_REUSE_RESULTS", "true").lower() == "true"
+    # Oldest stored result (seconds) that may be reused
+    STORE_REUSE_MAX_AGE: float = float(os.getenv("STORE_REUSE_MAX_AGE", "86400"))
+    
+    # Near-duplicate lookup (requires NumPy and the analysis store)
+    SIMILARITY_ENABLED: bool = os.getenv("SIMILARITY_ENABLED", "false").lower() == "true"
+    # Recent analyses kept in the index, and embedding dimensions (memory is capacity x dimensions x 4 bytes)
+    SIMILARITY_CAPACITY: int = int(os.getenv("SIMILARITY_CAPACITY", "5000"))
+    SIMILARITY_DIMENSIONS: int = int(os.getenv("SIMILARITY_DIMENSIONS", "1024"))
+    # Cosine similarity at which the whole prior analysis is returned
+    SIMILARITY_REUSE_THRESHOLD: float = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.95"))
+    # Cosine similarity at which the prior analysis' upstream stages are reused
+    SIMILARITY_STAGE_THRESHOLD: float = float(os.getenv("SIMILARITY_STAGE_THRESHOLD", "0.75"))
+    SIMILARITY_REUSE_STAGES: list = json.loads(
+        os.getenv("SIMILARITY_REUSE_STAGES", '["Problem Framing", "Option Generator"]')
+    )
+    
+    # Background job settings
+    # Queue backend: "memory" (in-process) or "sqlite" (shared with `python -m app.jobs` workers)
+    JOB_QUEUE_BACKEND: str = os.getenv("JOB_QUEUE_BACKEND", "memory")
+    # Workers started inside the web process (0 = leave jobs to separate worker processes)
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "4"))
+    JOB_DB_PATH: str = os.getenv("JOB_DB_PATH", "data/jobs.sqlite3")
+    JOB_MAX_QUEUED: int = int(os.getenv("JOB_MAX_QUEUED", "256"))
+    JOB_RETRY_AFTER: int = int(os.getenv("JOB_RETRY_AFTER", "30"))
+    # Seconds finished jobs stay queryable
+    JOB_RETENTION: float = float(os.getenv("JOB_RETENTION", "3600"))
+    JOB_POLL_INTERVAL: float = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+    
+    # Batch analysis settings
+    BATCH_PARALLELISM: int = int(os.getenv("BATCH_PARALLELISM", "4"))
+    # Analyses started per minute (0 = unlimited)
+    BATCH_RATE_LIMIT: float = float(os.getenv("BATCH_RATE_LIMIT", "0"))
+    # Upper bounds for the /api/batch endpoint
+    BATCH_MAX_PARALLELISM: int = int(os.getenv("BATCH_MAX_PARALLELISM", "16"))
+    BATCH_MAX_ITEMS: int = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+    
+    # Comparison settings
+    # Stages run once on the base decision and shared by every variant (with their dependencies)
+    COMPARE_SHARED_STAGES: list = json.loads(
+        os.getenv("COMPARE_SHARED_STAGES", '["Problem Framing"]')
+    )
+    COMPARE_MAX_VARIANTS: int = int(os.getenv("COMPARE_MAX_VARIANTS", "4"))
+    
+    # Fake LLM backend (LLM_PROVIDER=fake)
+    # Distribution of time to first token: fixed, uniform, normal, lognormal or exponential
+    FAKE_LLM_LATENCY_DISTRIBUTION: str = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "fixed")
+    FAKE_LLM_LATENCY_MEAN: float = float(os.getenv("FAKE_LLM_LATENCY_MEAN", "0.5"))
+    FAKE_LLM_LATENCY_STDDEV: float = float(os.getenv("FAKE_LLM_LATENCY_STDDEV", "0.1"))
+    FAKE_LLM_TOKENS_PER_SECOND: float = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "200"))
+    FAKE_LLM_COMPLETION_TOKENS: int = int(os.getenv("FAKE_LLM_COMPLETION_TOKENS", "300"))
+    FAKE_LLM_ERROR_RATE: float = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+    FAKE_LLM_SEED: int = int(os.getenv("FAKE_LLM_SEED", "0"))
     
     # Server settings
     HOST: str = os.getenv("HOST", "0.0.0.0")
     PORT: int = int(os.getenv("PORT", "8000"))
+    # "development" (one process, auto-reload) or "production" (worker processes, no reload)
+    SERVER_MODE: str = os.getenv("SERVER_MODE", "development")
+    WEB_WORKERS: int = int(os.getenv("WEB_WORKERS", "1"))
+    # Event loop ("auto", "asyncio" or "uvloop") and HTTP parser ("auto", "h11" or "httptools");
+    # auto picks uvloop and httptools when they are installed
+    SERVER_LOOP: str = os.getenv("SERVER_LOOP", "auto")
+    SERVER_HTTP: str = os.getenv("SERVER_HTTP", "auto")
+    # Concurrent connections per worker before new ones get 503 (0 = unlimited)
+    SERVER_LIMIT_CONCURRENCY: int = int(os.getenv("SERVER_LIMIT_CONCURRENCY", "0"))
+    SERVER_BACKLOG: int = int(os.getenv("SERVER_BACKLOG", "2048"))
+    SERVER_KEEPALIVE_TIMEOUT: int = int(os.getenv("SERVER_KEEPALIVE_TIMEOUT", "5"))
+    # Seconds /ready fails before the server stops listening, so load balancers can deregister it
+    SHUTDOWN_DRAIN_DELAY: float = float(os.getenv("SHUTDOWN_DRAIN_DELAY", "0"))
+    # Seconds in-flight requests, streams and jobs then get to finish
+    SHUTDOWN_TIMEOUT: float = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
     
     @classmethod
     def validate(cls) -> bool:
         """Validate required settings are present."""
-        if not cls.GROQ_API_KEY:
+        providers = {cls.LLM_PROVIDER}
+        for agent in cls.AGENT_MODELS:
+            providers.update(route["provider"] for route in cls.model_routes(agent))
+        providers.update(route.get("provider", cls.LLM_PROVIDER) for route in cls.LLM_FALLBACKS)
+        if "groq" in providers and not cls.GROQ_API_KEY:
             raise ValueError("GROQ_API_KEY environment variable is required")
         return True
+    
+    @classmethod
+    def model_routes(cls, agent_name: str) -> list:
+        """Ordered routes (primary first, then fallbacks) for an agent, with defaults filled in."""
+        config = dict(cls.AGENT_MODELS.get(agent_name, {}))
+        fallbacks = config.pop("fallbacks", cls.LLM_FALLBACKS)
+        defaults = {"provider": cls.LLM_PROVIDER, "model": cls.MODEL_NAME, "temperature": 0.7}
+        primary = {**defaults, **config}
+        return [primary] + [
+            {**defaults, "temperature": primary["temperature"], **route} for route in fallbacks
+        ]
 
 
 settings = Settings()
@@ -0,0 +1,187 @@
+"""Deterministic fake chat model for benchmarks and offline testing.
+
+``FakeChatModel`` is a drop-in LangChain chat model that never touches the
+network. Latency to the first token is drawn from a configurable
+distribution, tokens are emitted at a fixed throughput, and calls fail at a
+configurable rate. Randomness is seeded from the model seed, the prompt and
+how many times that prompt has been seen, so a run is reproducible
+regardless of how concurrent calls interleave.
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "normal", "lognormal", "exponential")
+
+_WORDS = (
+    "option risk cost benefit timeline constraint value stakeholder outcome "
+    "assumption evidence trade-off priority goal uncertainty impact"
+).split()
+
+
+class FakeLLMError(Exception):
+    """Simulated provider failure."""
+
+    def __init__(self, message: str, status_code: int = 503):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with simulated latency, throughput and error rate."""
+
+    model_name: str = "fake"
+    temperature: float = 0.7
+    latency_distribution: str = "fixed"
+    latency_mean: float = 0.5
+    latency_stddev: float = 0.1
+    tokens_per_second: float = 200.0
+    completion_tokens: int = 300
+    error_rate: float = 0.0
+    seed: int = 0
+
+    _calls: Counter = PrivateAttr(default_factory=Counter)
+
+    @property
+    def _llm_type(self) -> str:
+        return "clearthink-fake"
+
+    def _rng(self, messages: List[BaseMessage]) -> random.Random:
+        prompt = "\n".join(str(m.content) for m in messages)
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        self._calls[digest] += 1
+        return random.Random(f"{self.seed}:{digest}:{self._calls[digest]}")
+
+    def _first_token_latency(self, rng: random.Random) -> float:
+        mean, stddev = self.latency_mean, self.latency_stddev
+        if self.latency_distribution == "fixed":
+            return mean
+        if self.latency_distribution == "uniform":
+            return rng.uniform(max(0.0, mean - stddev), mean + stddev)
+        if self.latency_distribution == "normal":
+            return max(0.0, rng.gauss(mean, stddev))
+        if self.latency_distribution == "lognormal":
+            # Parameterised so the distribution's mean and stddev match the settings.
+            if mean <= 0:
+                return 0.0
+            sigma2 = math.log(1 + (stddev / mean) ** 2)
+            return rng.lognormvariate(math.log(mean) - sigma2 / 2, math.sqrt(sigma2))
+        if self.latency_distribution == "exponential":
+            return rng.expovariate(1 / mean) if mean > 0 else 0.0
+        raise ValueError(f"Unknown latency distribution: {self.latency_distribution}")
+
+    def _fill(self, shape: Any, rng: random.Random) -> Any:
+        if isinstance(shape, dict):
+            return {key: self._fill(value, rng) for key, value in shape.items()}
+        if isinstance(shape, list):
+            return [self._fill(shape[0], rng) for _ in range(rng.randint(2, 4))] if shape else []
+        if isinstance(shape, str) and "|" in shape:
+            return rng.choice(shape.split("|"))
+        return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(3, 10)))
+
+    def _tokens(self, messages: List[BaseMessage], rng: random.Random) -> List[str]:
+        system = str(messages[0].content) if messages else ""
+        # A system prompt ending in a JSON shape (structured mode) gets a JSON answer of that shape.
+        try:
+            shape = json.loads(system.rsplit("\n", 1)[-1])
+        except ValueError:
+            shape = None
+        if isinstance(shape, dict):
+            return re.findall(r"\s*\S+", json.dumps(self._fill(shape, rng)))
+        role = system.split(" in the CLEARTHINK", 1)[0].replace("You are the ", "")[:60]
+        tokens = [f"## {role or 'Analysis'}\n\n"]
+        while len(tokens) < self.completion_tokens:
+            if len(tokens) % 40 == 1:
+                tokens.append(f"\n- **{rng.choice(_WORDS).title()}**:")
+            tokens.append(" " + rng.choice(_WORDS))
+        return tokens[: max(1, self.completion_tokens)]
+
+    def _plan(self, messages: List[BaseMessage]):
+        rng = self._rng(messages)
+        latency = self._first_token_latency(rng)
+        failed = rng.random() < self.error_rate
+        return rng, latency, failed
+
+    def _fail(self) -> None:
+        raise FakeLLMError("Simulated provider error (503 Service Unavailable)")
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        rng, latency, failed = self._plan(messages)
+        time.sleep(latency)
+        if failed:
+            self._fail()
+        tokens = self._tokens(messages, rng)
+        if self.tokens_per_second > 0:
+            time.sleep(len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        rng, latency, failed = self._plan(messages)
+        await asyncio.sleep(latency)
+        if failed:
+            self._fail()
+        tokens = self._tokens(messages, rng)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(tokens) / self.tokens_per_second)
+        message = AIMessage(content="".join(tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=result.generations[0].message.content))
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        rng, latency, failed = self._plan(messages)
+        await asyncio.sleep(latency)
+        if failed:
+            self._fail()
+        # Sleep per small group of tokens rather than per token to keep the
+        # event loop overhead of the fake itself negligible.
+        group = 8
+        tokens = self._tokens(messages, rng)
+        for start in range(0, len(tokens), group):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(len(tokens[start:start + group]) / self.tokens_per_second)
+            for token in tokens[start:start + group]:
+                chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+                if run_manager:
+                    await run_manager.on_llm_new_token(token, chunk=chunk)
+                yield chunk
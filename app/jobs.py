@@ -0,0 +1,486 @@
+"""Background analysis jobs - decouple submission from execution.
+
+``POST /api/jobs`` enqueues a decision and returns immediately; a pool of
+workers runs queued jobs through the orchestrator and records partial
+results as each agent completes. Two queue backends are provided: an
+in-process queue, and a SQLite queue that lets separate worker processes
+(``python -m app.jobs``) serve jobs submitted by the web tier.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from app.config import settings
+from app.scheduler import QueueFullError, current_client
+from app.streams import EventChannel
+from app.tenants import usage_ledger
+
+
+TERMINAL_STATUSES = ("completed", "failed")
+
+
+class Job:
+    """A queued, running or finished analysis."""
+
+    def __init__(
+        self,
+        id: str,
+        decision: str,
+        client_id: str = "default",
+        status: str = "queued",
+        created_at: float = None,
+        started_at: float = None,
+        finished_at: float = None,
+        agents: List[Dict[str, Any]] = None,
+        result: Dict[str, Any] = None,
+        error: str = None,
+    ):
+        self.id = id
+        self.decision = decision
+        self.client_id = client_id
+        self.status = status
+        self.created_at = created_at or time.time()
+        self.started_at = started_at
+        self.finished_at = finished_at
+        self.agents = agents or []
+        self.result = result
+        self.error = error
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "input": self.decision,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "agents": self.agents,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue(ABC):
+    """Storage and hand-off of jobs between the API and the workers."""
+
+    @abstractmethod
+    async def put(self, job: Job) -> None:
+        """Store a new job and make it available to workers."""
+
+    @abstractmethod
+    async def claim(self) -> Job:
+        """Wait for the next queued job and mark it running."""
+
+    @abstractmethod
+    async def save(self, job: Job) -> None:
+        """Persist a job's progress."""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id."""
+
+    @abstractmethod
+    async def queued_count(self) -> int:
+        """Number of jobs waiting for a worker."""
+
+    @abstractmethod
+    async def release(self, job: Job) -> None:
+        """Give back a running job that this worker could not finish."""
+
+
+class MemoryJobQueue(JobQueue):
+    """In-process queue; finished jobs are kept for ``retention`` seconds."""
+
+    def __init__(self, retention: float):
+        self.retention = retention
+        self._jobs: Dict[str, Job] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def put(self, job: Job) -> None:
+        self._prune()
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+
+    async def claim(self) -> Job:
+        while True:
+            job = self._jobs.get(await self._queue.get())
+            if job is not None and job.status == "queued":
+                job.status = "running"
+                job.started_at = time.time()
+                return job
+
+    async def save(self, job: Job) -> None:
+        self._jobs[job.id] = job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    async def queued_count(self) -> int:
+        return self._queue.qsize()
+
+    async def release(self, job: Job) -> None:
+        # Nothing outlives this process, so an interrupted job cannot be resumed.
+        job.status = "failed"
+        job.error = "Interrupted by server shutdown"
+        job.finished_at = time.time()
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Job queue in a SQLite file shared by web and worker processes.
+
+    Workers claim jobs with an atomic ``UPDATE ... RETURNING`` and poll for
+    new work every ``poll_interval`` seconds.
+    """
+
+    _COLUMNS = (
+        "id, decision, client_id, status, created_at, started_at, "
+        "finished_at, agents, result, error"
+    )
+
+    def __init__(self, path: str, retention: float, poll_interval: float):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    decision TEXT NOT NULL,
+                    client_id TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    agents TEXT NOT NULL DEFAULT '[]',
+                    result TEXT,
+                    error TEXT
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_at)"
+            )
+            self._conn.commit()
+
+    def _row_to_job(self, row) -> Job:
+        return Job(
+            id=row[0],
+            decision=row[1],
+            client_id=row[2],
+            status=row[3],
+            created_at=row[4],
+            started_at=row[5],
+            finished_at=row[6],
+            agents=json.loads(row[7]),
+            result=json.loads(row[8]) if row[8] else None,
+            error=row[9],
+        )
+
+    def _execute(self, sql: str, params: tuple = (), fetch: bool = False):
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            rows = cursor.fetchall() if fetch else None
+            self._conn.commit()
+            return rows
+
+    async def put(self, job: Job) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND finished_at < ?",
+            (time.time() - self.retention,),
+        )
+        await asyncio.to_thread(
+            self._execute,
+            f"INSERT INTO jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job.id, job.decision, job.client_id, job.status, job.created_at,
+             None, None, "[]", None, None),
+        )
+
+    async def claim(self) -> Job:
+        while True:
+            rows = await asyncio.to_thread(
+                self._execute,
+                f"""UPDATE jobs SET status = 'running', started_at = ?
+                    WHERE id = (
+                        SELECT id FROM jobs WHERE status = 'queued'
+                        ORDER BY created_at LIMIT 1
+                    ) AND status = 'queued'
+                    RETURNING {self._COLUMNS}""",
+                (time.time(),),
+                True,
+            )
+            if rows:
+                return self._row_to_job(rows[0])
+            await asyncio.sleep(self.poll_interval)
+
+    async def save(self, job: Job) -> None:
+        await asyncio.to_thread(
+            self._execute,
+            """UPDATE jobs SET status = ?, started_at = ?, finished_at = ?,
+                   agents = ?, result = ?, error = ?
+               WHERE id = ?""",
+            (job.status, job.started_at, job.finished_at, json.dumps(job.agents),
+             json.dumps(job.result) if job.result is not None else None,
+             job.error, job.id),
+        )
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        rows = await asyncio.to_thread(
+            self._execute, f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,), True
+        )
+        return self._row_to_job(rows[0]) if rows else None
+
+    async def queued_count(self) -> int:
+        rows = await asyncio.to_thread(
+            self._execute, "SELECT COUNT(*) FROM jobs WHERE status = 'queued'", (), True
+        )
+        return rows[0][0]
+
+    async def release(self, job: Job) -> None:
+        # Put the job back so another worker can run it from the start.
+        job.status = "queued"
+        job.started_at = None
+        job.agents = []
+        await self.save(job)
+
+
+def create_job_queue(backend: str) -> JobQueue:
+    """Build the job queue configured by ``JOB_QUEUE_BACKEND``."""
+    backend = backend.lower()
+    if backend == "memory":
+        return MemoryJobQueue(settings.JOB_RETENTION)
+    if backend == "sqlite":
+        return SQLiteJobQueue(settings.JOB_DB_PATH, settings.JOB_RETENTION, settings.JOB_POLL_INTERVAL)
+    raise ValueError(f"Unknown JOB_QUEUE_BACKEND: {backend}")
+
+
+class JobManager:
+    """Submits jobs and runs them on a pool of ``workers`` asyncio workers."""
+
+    def __init__(self, orchestrator, queue: JobQueue, workers: int):
+        self.orchestrator = orchestrator
+        self.queue = queue
+        self.workers = workers
+        self._tasks: List[asyncio.Task] = []
+        self._running: Dict[str, Job] = {}
+        self._channels: Dict[str, EventChannel] = {}
+        self._draining = asyncio.Event()
+
+    async def start(self) -> None:
+        """Start the worker pool."""
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    def drain(self) -> None:
+        """Stop claiming and accepting jobs; those already running carry on."""
+        self._draining.set()
+
+    async def stop(self, timeout: float = 0) -> None:
+        """
+        Stop the workers and hand back jobs they had not finished.
+
+        Running jobs are given up to ``timeout`` seconds to finish first.
+        """
+        self.drain()
+        if self._tasks and timeout > 0:
+            await asyncio.wait(self._tasks, timeout=timeout)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        for job in list(self._running.values()):
+            await self.queue.release(job)
+            channel = self._channels.pop(job.id, None)
+            if channel is not None:
+                await channel.close()
+        self._running.clear()
+
+    async def submit(self, decision: str, client_id: str = "default") -> Job:
+        """Queue an analysis, failing fast when the queue is full or the server is draining."""
+        if self._draining.is_set():
+            raise QueueFullError("Server is shutting down", settings.JOB_RETRY_AFTER)
+        if await self.queue.queued_count() >= settings.JOB_MAX_QUEUED:
+            raise QueueFullError("Job queue is full", settings.JOB_RETRY_AFTER)
+        job = Job(id=uuid.uuid4().hex, decision=decision, client_id=client_id)
+        await self.queue.put(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        running = self._running.get(job_id)
+        if running is not None:
+            return running
+        return await self.queue.get(job_id)
+
+    async def _claim(self) -> Optional[Job]:
+        """Next job to run, or None once draining."""
+        claim = asyncio.ensure_future(self.queue.claim())
+        draining = asyncio.ensure_future(self._draining.wait())
+        try:
+            await asyncio.wait((claim, draining), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (claim, draining):
+                task.cancel()
+            await asyncio.gather(claim, draining, return_exceptions=True)
+        # A job claimed just as draining began is still run.
+        return None if claim.cancelled() else claim.result()
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._claim()
+            if job is None:
+                return
+            self._running[job.id] = job
+            try:
+                await self._run(job)
+            finally:
+                self._running.pop(job.id, None)
+
+    async def _run(self, job: Job) -> None:
+        channel = self._channels[job.id] = EventChannel()
+        current_client.set(job.client_id)
+        await self.queue.save(job)
+        analysis_id = None
+        try:
+            async for update in self.orchestrator.analyze_streaming(job.decision):
+                if update["status"] == "complete":
+                    analysis_id = update.get("id")
+                if update["status"] in ("agent_complete", "agent_error"):
+                    job.agents.append({
+                        "agent": update["agent"],
+                        "emoji": update["emoji"],
+                        "result": update.get("result", update.get("error")),
+                        "error": update["status"] == "agent_error",
+                        "error_code": update.get("error_code"),
+                        "stale": update.get("stale", False),
+                        "data": update.get("data"),
+                    })
+                    await self.queue.save(job)
+                await channel.publish(update)
+
+            order = [agent.name for agent in self.orchestrator.agents]
+            agents = sorted(job.agents, key=lambda a: order.index(a["agent"]))
+            job.result = {
+                "id": analysis_id,
+                "input": job.decision,
+                "agents": agents,
+                "agent_count": len(agents),
+                "success": all(not a.get("error", False) for a in agents),
+            }
+            job.status = "completed"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            await channel.publish({"status": "error", "error": str(e)})
+        job.finished_at = time.time()
+        await self.queue.save(job)
+        await channel.close()
+        self._forget_channel_later(job.id)
+
+    def _forget_channel_later(self, job_id: str) -> None:
+        loop = asyncio.get_running_loop()
+        loop.call_later(settings.JOB_RETENTION, self._channels.pop, job_id, None)
+
+    async def events(self, job: Job) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Follow a job's events.
+
+        Jobs run by this process replay their event log, including the
+        token deltas of agents still running. Jobs run by another worker
+        process are followed by polling the queue and emitting each agent
+        result once.
+        """
+        channel = self._channels.get(job.id)
+        if channel is not None:
+            async for event in channel.subscribe():
+                yield event
+            return
+
+        sent = 0
+        total = len(self.orchestrator.agents)
+        while True:
+            job = await self.queue.get(job.id)
+            if job is None:
+                return
+            for agent in job.agents[sent:]:
+                sent += 1
+                yield {
+                    "status": "agent_error" if agent.get("error") else "agent_complete",
+                    "agent": agent["agent"],
+                    "emoji": agent["emoji"],
+                    "result": agent["result"],
+                    "data": agent.get("data"),
+                    "progress": sent / total,
+                }
+            if job.status == "completed":
+                yield {"status": "complete", "progress": 1.0}
+                return
+            if job.status == "failed":
+                yield {"status": "error", "error": job.error}
+                return
+            await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+
+
+async def _serve_workers(workers: int) -> None:
+    from app.agents import ClearThinkOrchestrator
+    from app.store import create_store
+
+    # The API's store, so analyses run here show up in history and are reused.
+    store = create_store()
+    manager = JobManager(ClearThinkOrchestrator(store=store), create_job_queue("sqlite"), workers)
+    await usage_ledger.start()
+    if store is not None:
+        await store.start()
+    await manager.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await manager.stop(settings.SHUTDOWN_TIMEOUT)
+        if store is not None:
+            await store.stop()
+        await usage_ledger.stop()
+
+
+def main() -> None:
+    """Run a standalone worker pool against the SQLite job queue."""
+    parser = argparse.ArgumentParser(description="CLEARTHINK job workers")
+    parser.add_argument("--workers", type=int, default=settings.JOB_WORKERS)
+    args = parser.parse_args()
+    settings.validate()
+    print(f"🛠️  Running {args.workers} CLEARTHINK job workers on {settings.JOB_DB_PATH}")
+    try:
+        asyncio.run(_serve_workers(args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
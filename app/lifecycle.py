@@ -0,0 +1,110 @@
+"""Process lifecycle - readiness and graceful drain on shutdown.
+
+A worker starts out ``starting``, becomes ``ready`` once warm-up has
+finished, and turns ``draining`` as soon as it receives SIGTERM or
+SIGINT. While draining, ``/ready`` fails so load balancers stop routing
+new requests here; after ``SHUTDOWN_DRAIN_DELAY`` seconds the server
+stops listening and in-flight requests, streams and jobs get until
+``SHUTDOWN_TIMEOUT`` to finish.
+"""
+
+import asyncio
+import logging
+import signal
+import threading
+import time
+from typing import Callable, List, Optional
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+class Lifecycle:
+    """Readiness and drain state of this worker process."""
+
+    def __init__(self, drain_delay: float = 0.0, shutdown_timeout: float = 30.0):
+        self.drain_delay = drain_delay
+        self.shutdown_timeout = shutdown_timeout
+        self.state = "starting"
+        self.drain_started: Optional[float] = None
+        self._on_drain: List[Callable[[], None]] = []
+        self._signalled = False
+        self._stopping = False
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def draining(self) -> bool:
+        return self.state == "draining"
+
+    def mark_ready(self) -> None:
+        if self.state == "starting":
+            self.state = "ready"
+
+    def on_drain(self, callback: Callable[[], None]) -> None:
+        """Call ``callback`` when draining begins."""
+        self._on_drain.append(callback)
+
+    def begin_drain(self) -> None:
+        """Stop reporting ready and tell components to stop taking new work."""
+        if self.draining:
+            return
+        self.state = "draining"
+        self.drain_started = time.monotonic()
+        logger.info("Draining: in-flight work has %.0fs to finish", self.drain_delay + self.shutdown_timeout)
+        for callback in self._on_drain:
+            callback()
+
+    def remaining(self) -> float:
+        """Seconds left of the shutdown budget (the full budget if not draining)."""
+        if self.drain_started is None:
+            return self.drain_delay + self.shutdown_timeout
+        elapsed = time.monotonic() - self.drain_started
+        return max(0.0, self.drain_delay + self.shutdown_timeout - elapsed)
+
+    def install_signal_handlers(self) -> None:
+        """
+        Begin draining on the server's shutdown signals.
+
+        The server's own handlers are kept and called once the drain delay
+        has passed (or straight away on a second signal), so it still owns
+        the actual shutdown. Call from the event loop thread after the
+        server has installed its handlers, e.g. in the lifespan startup.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in _SIGNALS:
+            previous = signal.getsignal(sig)
+            if not callable(previous):
+                continue
+            signal.signal(sig, self._signal_handler(loop, previous))
+
+    def _signal_handler(self, loop: asyncio.AbstractEventLoop, previous: Callable):
+        def stop(sig, frame) -> None:
+            if not self._stopping:
+                self._stopping = True
+                previous(sig, frame)
+
+        def handle(sig, frame) -> None:
+            loop.call_soon_threadsafe(self.begin_drain)
+            if self._stopping:
+                # Already shutting down: let the server see the repeat (e.g. to force an exit).
+                previous(sig, frame)
+            elif self._signalled or self.drain_delay <= 0:
+                # A second signal skips the rest of the delay.
+                stop(sig, frame)
+            else:
+                loop.call_soon_threadsafe(loop.call_later, self.drain_delay, stop, sig, frame)
+            self._signalled = True
+
+        return handle
+
+
+lifecycle = Lifecycle(settings.SHUTDOWN_DRAIN_DELAY, settings.SHUTDOWN_TIMEOUT)
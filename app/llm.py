@@ -0,0 +1,187 @@
+"""LLM client registry - shares pooled chat model clients across agents.
+
+Provider SDKs and LangChain are imported when the first model is created,
+not when this module is imported.
+"""
+
+import json
+import logging
+import threading
+from contextvars import ContextVar
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_GROQ_API_BASE = "https://api.groq.com"
+
+_lock = threading.Lock()
+_http_client: Optional[httpx.AsyncClient] = None
+_chat_models: Dict[Tuple[str, float], Any] = {}
+_routes: Dict[str, Any] = {}
+_agent_models: Dict[str, Any] = {}
+# API base URLs of the remote providers in use, for warm-up
+_api_bases: set = set()
+
+# Set by a caller to a dict before invoking a RoutedChatModel, which records in
+# it whether a fallback route answered. A dict rather than a plain value so the
+# answer survives the context copies LangChain makes around each call.
+route_outcome: ContextVar[Optional[Dict[str, Any]]] = ContextVar("route_outcome", default=None)
+
+
+def _connection_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled async HTTP client used for LLM calls."""
+    global _http_client
+    with _lock:
+        if _http_client is None or _http_client.is_closed:
+            _http_client = httpx.AsyncClient(
+                limits=_connection_limits(),
+                timeout=httpx.Timeout(settings.LLM_REQUEST_TIMEOUT),
+            )
+        return _http_client
+
+
+def _build_fake_model(model_name: str, temperature: float, **params: Any):
+    from app.fake_llm import FakeChatModel
+
+    defaults = {
+        "latency_distribution": settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+        "latency_mean": settings.FAKE_LLM_LATENCY_MEAN,
+        "latency_stddev": settings.FAKE_LLM_LATENCY_STDDEV,
+        "tokens_per_second": settings.FAKE_LLM_TOKENS_PER_SECOND,
+        "completion_tokens": settings.FAKE_LLM_COMPLETION_TOKENS,
+        "error_rate": settings.FAKE_LLM_ERROR_RATE,
+        "seed": settings.FAKE_LLM_SEED,
+    }
+    return FakeChatModel(
+        model_name=model_name, temperature=temperature, **{**defaults, **params}
+    )
+
+
+def get_chat_model(model_name: str, temperature: float, provider: str = None, **params: Any):
+    """
+    Return the shared chat model for a provider/model/temperature.
+
+    Every agent configured with the same model shares one client, and all
+    clients share one pooled HTTP connection pool, so concurrent requests
+    reuse keep-alive connections instead of paying a TLS handshake each.
+    ``provider`` defaults to ``LLM_PROVIDER``; the ``fake`` provider returns
+    a local ``FakeChatModel``, configured by ``params`` over the
+    ``FAKE_LLM_*`` settings.
+    """
+    provider = provider or settings.LLM_PROVIDER
+    if provider == "fake":
+        key = ("fake:" + model_name + json.dumps(params, sort_keys=True), temperature)
+        with _lock:
+            if key not in _chat_models:
+                _chat_models[key] = _build_fake_model(model_name, temperature, **params)
+            return _chat_models[key]
+    if provider != "groq":
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    key = (model_name, temperature)
+    model = _chat_models.get(key)
+    if model is not None:
+        return model
+
+    from langchain_groq import ChatGroq
+
+    http_client = get_http_client()
+    with _lock:
+        model = _chat_models.get(key)
+        if model is None:
+            model = ChatGroq(
+                api_key=settings.GROQ_API_KEY,
+                model_name=model_name,
+                temperature=temperature,
+                http_async_client=http_client,
+            )
+            _chat_models[key] = model
+            _api_bases.add(model.groq_api_base or _GROQ_API_BASE)
+        return model
+
+
+def _route_name(spec: Dict[str, Any]) -> str:
+    return f"{spec['provider']}:{spec['model']}"
+
+
+def get_route(spec: Dict[str, Any]):
+    """Return the shared route for a provider/model spec, creating it on first use."""
+    from app.router import Route
+
+    key = json.dumps(spec, sort_keys=True)
+    route = _routes.get(key)
+    if route is None:
+        params = {k: v for k, v in spec.items() if k not in ("provider", "model", "temperature")}
+        model = get_chat_model(spec["model"], spec["temperature"], spec["provider"], **params)
+        route = _routes.setdefault(key, Route(_route_name(spec), model))
+    return route
+
+
+def get_agent_model(agent_name: str):
+    """
+    Return the chat model for an agent, as configured in ``AGENT_MODELS``.
+
+    An agent with a single route and no hedging gets that route's chat
+    model directly; otherwise a ``RoutedChatModel`` that fails over and
+    hedges across its routes.
+    """
+    model = _agent_models.get(agent_name)
+    if model is not None:
+        return model
+
+    specs = settings.model_routes(agent_name)
+    if len(specs) == 1 and not settings.ROUTER_HEDGING:
+        spec = specs[0]
+        params = {k: v for k, v in spec.items() if k not in ("provider", "model", "temperature")}
+        model = get_chat_model(spec["model"], spec["temperature"], spec["provider"], **params)
+    else:
+        from app.router import RoutedChatModel
+
+        model = RoutedChatModel([get_route(spec) for spec in specs])
+    return _agent_models.setdefault(agent_name, model)
+
+
+def router_stats() -> list:
+    """Health and latency of every route in use."""
+    return [route.stats() for route in _routes.values()]
+
+
+async def warm_up_clients(timeout: float = 5.0) -> None:
+    """
+    Open a pooled connection to every remote provider in use, so the first
+    analysis does not pay for DNS and the TLS handshake.
+    """
+    with _lock:
+        bases = set(_api_bases)
+    client = get_http_client()
+    for base in bases:
+        try:
+            await client.head(base, timeout=timeout)
+        except httpx.HTTPError as e:
+            logger.warning("Could not open a connection to %s: %s", base, e)
+
+
+async def aclose_clients() -> None:
+    """Close pooled connections and drop the models using them; call on application shutdown."""
+    global _http_client
+    with _lock:
+        client, _http_client = _http_client, None
+        _chat_models.clear()
+        _routes.clear()
+        _agent_models.clear()
+        _api_bases.clear()
+    if client is not None:
+        await client.aclose()
@@ -1,15 +1,30 @@
 """FastAPI application for CLEARTHINK."""
 
-from fastapi import FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
-import json
+from contextlib import asynccontextmanager
 import asyncio
-from typing import Optional
+import math
+from typing import Any, Optional
 
 from app.agents import ClearThinkOrchestrator
+from app.assets import StaticAssets
+from app.batch import parse_decisions, run_batch
+from app.cache import make_cache_key, response_cache
+from app.compression import CompressionMiddleware
 from app.config import settings
+from app.jobs import JobManager, create_job_queue
+from app.lifecycle import lifecycle
+from app.llm import aclose_clients, router_stats, warm_up_clients
+from app.metrics import ANALYSES_COALESCED, registry
+from app.scheduler import QueueFullError, current_client, scheduler
+from app.serialization import FastJSONResponse, dumps
+from app.similarity import create_similarity_index
+from app.store import create_store
+from app.streams import StreamExpiredError, StreamHub
+from app.tenants import RateLimitError, tenant_limiter, usage_ledger
 
 
 # Request/Response models
@@ -25,12 +40,31 @@ class DecisionRequest(BaseModel):
         }
 
 
+class RefineRequest(BaseModel):
+    """Change to apply to a stored analysis."""
+    decision: Optional[str] = None
+    overrides: dict[str, str] = {}
+    refresh: list[str] = []
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "overrides": {"Option Generator": "1. Stay in engineering\n2. Move to product management"},
+                "refresh": ["Bias Detection"]
+            }
+        }
+
+
 class AgentResult(BaseModel):
     """Result from a single agent."""
     agent: str
     emoji: str
     result: str
     error: Optional[bool] = False
+    error_code: Optional[str] = None
+    stale: Optional[bool] = False
+    overridden: Optional[bool] = False
+    data: Optional[dict[str, Any]] = None
 
 
 class AnalysisResponse(BaseModel):
@@ -39,6 +73,119 @@ class AnalysisResponse(BaseModel):
     agents: list[AgentResult]
     agent_count: int
     success: bool
+    timings: Optional[dict[str, Any]] = None
+    id: Optional[str] = None
+    reused: bool = False
+    similar_to: Optional[str] = None
+    similarity: Optional[float] = None
+    recomputed: Optional[list[str]] = None
+
+
+class CompareRequest(BaseModel):
+    """A base decision and variations of it to analyze side by side."""
+    decision: str
+    variants: list[str]
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "decision": "Should I change my career from engineering to product management?",
+                "variants": [
+                    "I would have to take a 10% pay cut.",
+                    "What if I also consider moving into engineering management?"
+                ]
+            }
+        }
+
+
+class ComparisonResponse(BaseModel):
+    """Side-by-side analyses of a base decision (option 0) and its variants."""
+    input: str
+    variants: list[str]
+    shared: list[str]
+    options: list[AnalysisResponse]
+    timings: Optional[dict[str, Any]] = None
+
+
+class StoredAnalysis(BaseModel):
+    """An analysis recorded in the server-side store."""
+    id: str
+    input: str
+    model: dict[str, Any]
+    created_at: float
+    success: bool
+    agents: list[AgentResult]
+    timings: Optional[dict[str, Any]] = None
+
+
+class HistoryItem(BaseModel):
+    """Summary of a stored analysis."""
+    id: str
+    input: str
+    model: dict[str, Any]
+    created_at: float
+    success: bool
+
+
+class HistoryPage(BaseModel):
+    """A page of stored analyses, newest first."""
+    items: list[HistoryItem]
+    next_before: Optional[float] = None
+    next_before_id: Optional[str] = None
+
+
+class JobSubmitted(BaseModel):
+    """Response for a newly queued analysis job."""
+    id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatus(BaseModel):
+    """Status and partial results of an analysis job."""
+    id: str
+    status: str
+    input: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: float
+    agents: list[AgentResult]
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Application startup/shutdown hooks.
+    
+    The worker reports ready only after warm-up; on shutdown, running jobs
+    and streams get what is left of ``SHUTDOWN_TIMEOUT`` to finish.
+    """
+    lifecycle.install_signal_handlers()
+    lifecycle.on_drain(job_manager.drain)
+    await usage_ledger.start()
+    if store is not None:
+        await store.start()
+        if similarity is not None:
+            config = orchestrator.config_fingerprint()
+            for analysis_id, text, owner in await store.recent(config, similarity.capacity):
+                similarity.add(analysis_id, text, owner)
+    orchestrator.warm_up()
+    await asyncio.to_thread(static_assets.load)
+    await warm_up_clients()
+    await job_manager.start()
+    lifecycle.mark_ready()
+    yield
+    lifecycle.begin_drain()
+    remaining = lifecycle.remaining()
+    await asyncio.gather(stream_hub.stop(remaining), job_manager.stop(remaining))
+    if store is not None:
+        await store.stop()
+    await usage_ledger.stop()
+    await aclose_clients()
 
 
 # Create FastAPI app
@@ -47,11 +194,439 @@ app = FastAPI(
     description="Multi-Agent Decision Making System - Think clearly, decide wisely.",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.COMPRESSION_MIN_SIZE,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
 
 # Initialize orchestrator
-orchestrator = ClearThinkOrchestrator()
+store = create_store()
+similarity = create_similarity_index() if store is not None else None
+orchestrator = ClearThinkOrchestrator(store=store, similarity=similarity)
+job_manager = JobManager(
+    orchestrator, create_job_queue(settings.JOB_QUEUE_BACKEND), settings.JOB_WORKERS
+)
+stream_hub = StreamHub(
+    settings.STREAM_REPLAY_TTL, settings.STREAM_REPLAY_MAX, settings.STREAM_ABANDON_TIMEOUT
+)
+
+
+def client_id_for(request: Request) -> str:
+    """
+    Identify the calling tenant, for fair queueing, rate limits and usage.
+    
+    An API key (``X-API-Key`` or ``Authorization: Bearer``) identifies its
+    tenant, and an unknown key is rejected with 401. Without a key the
+    ``X-Client-ID`` header or the client address does, unless
+    ``TENANT_REQUIRE_API_KEY`` is on. Those ids are prefixed (``client:``,
+    ``ip:``) so an anonymous caller can never claim a key's tenant.
+    """
+    api_key = request.headers.get("x-api-key")
+    scheme, _, credentials = request.headers.get("authorization", "").partition(" ")
+    if not api_key and scheme.lower() == "bearer":
+        api_key = credentials.strip()
+    if api_key:
+        tenant = tenant_limiter.tenant_for_key(api_key)
+        if tenant is None:
+            raise HTTPException(status_code=401, detail="Invalid API key")
+        return tenant
+    if settings.TENANT_REQUIRE_API_KEY:
+        raise HTTPException(status_code=401, detail="API key required", headers={"WWW-Authenticate": "Bearer"})
+    header = request.headers.get("x-client-id")
+    if header:
+        return f"client:{header}"
+    return f"ip:{request.client.host}" if request.client else "anonymous"
+
+
+async def plan_reuse(decision: str, fresh: bool, client_id: str) -> tuple[Optional[dict], Optional[dict]]:
+    """
+    Find ``client_id``'s prior work for ``decision``, unless ``fresh`` is requested.
+    
+    Returns ``(stored, precomputed)``: a stored analysis to return as-is -
+    an exact repeat, or a near-duplicate above ``SIMILARITY_REUSE_THRESHOLD``
+    - or, for a near-duplicate above ``SIMILARITY_STAGE_THRESHOLD``, the
+    upstream stage results to seed a new run with.
+    """
+    if store is None or fresh or not settings.STORE_REUSE_RESULTS:
+        return None, None
+    stored = await store.find(
+        orchestrator.fingerprint(decision), settings.STORE_REUSE_MAX_AGE, client_id
+    )
+    if stored is not None or similarity is None:
+        return stored, None
+    
+    match = similarity.search(decision, settings.SIMILARITY_STAGE_THRESHOLD, client_id)
+    if match is None:
+        return None, None
+    analysis_id, score = match
+    similar = await store.get(analysis_id, client_id)
+    if similar is None or not similar["success"] or similar.get("overridden"):
+        return None, None
+    similar = {**similar, "similar_to": analysis_id, "similarity": round(score, 4)}
+    if score >= settings.SIMILARITY_REUSE_THRESHOLD:
+        return similar, None
+    
+    # Only reuse a stage together with everything it depends on.
+    by_name = {agent["agent"]: agent for agent in similar["agents"]}
+    precomputed: dict[str, Any] = {}
+    for agent in orchestrator.agents:
+        if (agent.name in settings.SIMILARITY_REUSE_STAGES and agent.name in by_name
+                and not by_name[agent.name].get("overridden")
+                and all(dep in precomputed for dep in agent.depends_on)):
+            precomputed[agent.name] = {**by_name[agent.name], "timings": {"reused_from": analysis_id}}
+    return None, precomputed or None
+
+
+def stored_response(record: dict[str, Any]) -> dict[str, Any]:
+    """Shape a stored analysis like a fresh ``/api/analyze`` response."""
+    return {
+        "id": record["id"],
+        "input": record["input"],
+        "agents": record["agents"],
+        "agent_count": len(record["agents"]),
+        "success": record["success"],
+        "timings": record["timings"],
+        "reused": True,
+        "similar_to": record.get("similar_to"),
+        "similarity": record.get("similarity"),
+    }
+
+
+async def replay_stored(record: dict[str, Any]):
+    """Stream a stored analysis as the events of a live run."""
+    total = len(record["agents"])
+    for i, agent in enumerate(record["agents"], start=1):
+        update = {
+            "status": "agent_complete",
+            "agent": agent["agent"],
+            "emoji": agent["emoji"],
+            "result": agent["result"],
+            "progress": i / total,
+        }
+        if "data" in agent:
+            update["data"] = agent["data"]
+        yield update
+    yield {"status": "complete", "progress": 1.0, "id": record["id"], "reused": True,
+           "similarity": record.get("similarity"), "timings": record["timings"]}
+
+
+def sse_response(events, background: BackgroundTask = None) -> StreamingResponse:
+    """
+    Wrap an async iterator of event dicts as a Server-Sent Events response.
+    
+    Items may also be ``(event id, event)`` pairs, sent with an ``id:`` field.
+    """
+    async def generate():
+        async for item in events:
+            if isinstance(item, tuple):
+                event_id, event = item
+                yield f"id: {event_id}\ndata: {dumps(event)}\n\n"
+            else:
+                yield f"data: {dumps(item)}\n\n"
+    
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        background=background,
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
+def field_selection(fields: Optional[str]) -> Optional[tuple[set[str], set[str]]]:
+    """
+    ``(agents, keys)`` chosen by a ``fields=`` parameter: a comma-separated
+    list of agent names to include and/or agent result keys to keep, e.g.
+    ``Decision Summary,result``. None (everything) when not given.
+    """
+    if not fields:
+        return None
+    names = {name.strip() for name in fields.split(",") if name.strip()}
+    agents = names & {agent.name for agent in orchestrator.agents}
+    keys = names - agents
+    unknown = keys - set(AgentResult.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return agents, keys
+
+
+def project_agent(agent: dict[str, Any], selection) -> Optional[dict[str, Any]]:
+    """An agent result or event cut down to ``selection``, or None if that agent is left out."""
+    if selection is None:
+        return agent
+    agents, keys = selection
+    name = agent.get("agent", agent.get("current_agent"))
+    if name is None:
+        return agent
+    if agents and name not in agents:
+        return None
+    if not keys or agent.get("status") == "processing":
+        return agent
+    if agent.get("status") == "agent_delta" and "result" not in keys:
+        return None
+    # Events carry an agent's text as "delta" or "error" rather than "result".
+    kept = keys | {"agent", "status", "progress", "option"}
+    if "result" in keys:
+        kept |= {"delta", "error"}
+    return {k: v for k, v in agent.items() if k in kept}
+
+
+def projected_response(result: dict[str, Any], selection):
+    """An ``/api/analyze`` response with only the agents and fields in ``selection``."""
+    if selection is None:
+        return result
+    data = AnalysisResponse.model_validate(result).model_dump()
+    data["agents"] = [
+        projected for projected in (project_agent(agent, selection) for agent in data["agents"])
+        if projected is not None
+    ]
+    return FastJSONResponse(data)
+
+
+def follow_stream(stream_id: str, after: int = -1, timings: bool = False, selection=None):
+    """
+    A hub stream's events after index ``after``, with event ids, for
+    ``sse_response``; events are cut down to a ``field_selection``. A
+    stream evicted before it is followed ends with an ``error`` event.
+    """
+    async def events():
+        try:
+            async for event_id, update in stream_hub.subscribe(stream_id, after):
+                if not timings and "timings" in update:
+                    update = {k: v for k, v in update.items() if k != "timings"}
+                update = project_agent(update, selection)
+                if update is not None:
+                    yield event_id, update
+        except StreamExpiredError as e:
+            yield {"status": "error", "error": str(e)}
+    
+    return events()
+
+
+async def start_run(key: str, run, client_id: str, endpoint: str, tokens: int) -> str:
+    """
+    Id of the hub stream running ``key``, starting ``run()`` for it if none is.
+    
+    Concurrent identical requests (same input and model config) attach to
+    the run already in flight instead of taking a slot and starting again.
+    Once admitted, the request is charged to the tenant's limits, with
+    ``tokens`` estimated LLM tokens unless it attaches to a run in flight;
+    a request turned away by admission control is not charged.
+    """
+    stream_id = stream_hub.find(key)
+    if stream_id is not None:
+        await tenant_limiter.check(client_id)
+        ANALYSES_COALESCED.inc(endpoint=endpoint)
+        stream_hub.share(stream_id, client_id)
+        return stream_id
+    
+    admission = scheduler.admit(client_id)
+    try:
+        await tenant_limiter.check(client_id, tokens)
+    except BaseException:
+        admission.release()
+        raise
+    
+    async def events():
+        current_client.set(client_id)
+        async for update in run():
+            yield update
+    
+    return stream_hub.start(events(), on_done=admission.release, key=key, owner=client_id)
+
+
+def analysis_key(decision: str, precomputed: Optional[dict], fresh: bool) -> str:
+    """Coalescing key of an analysis: its input and model config, seeded stages and ``fresh``."""
+    return make_cache_key(
+        input=orchestrator.fingerprint(decision), precomputed=precomputed or {}, fresh=fresh
+    )
+
+
+def analysis_tokens(decision: str, precomputed: Optional[dict]) -> int:
+    """Estimated LLM tokens of analyzing ``decision`` with ``precomputed`` stages seeded."""
+    return orchestrator.token_estimate(
+        decision, [agent for agent in orchestrator.agents if agent.name not in (precomputed or {})]
+    )
+
+
+async def start_analysis(
+    decision: str, precomputed: Optional[dict], fresh: bool, client_id: str, endpoint: str
+) -> str:
+    """Id of the hub stream analyzing ``decision``, starting one if none is."""
+    return await start_run(
+        analysis_key(decision, precomputed, fresh),
+        lambda: orchestrator.analyze_streaming(decision, precomputed),
+        client_id,
+        endpoint,
+        analysis_tokens(decision, precomputed),
+    )
+
+
+# Non-streaming analyses in flight, by coalescing key: the run and how many callers await it
+running_analyses: dict[str, dict[str, Any]] = {}
+
+
+async def run_analysis(
+    decision: str, precomputed: Optional[dict], fresh: bool, client_id: str
+) -> dict[str, Any]:
+    """
+    Analyze ``decision`` for a non-streaming caller, with ``orchestrator.analyze``.
+    
+    Identical requests in flight share one run, which is admitted and
+    charged like ``start_run``; nothing is published or kept for replay.
+    Once every caller awaiting a run has gone it is cancelled, unless
+    ``STREAM_ABANDON_TIMEOUT`` is 0.
+    """
+    key = analysis_key(decision, precomputed, fresh)
+    entry = running_analyses.get(key)
+    if entry is not None:
+        await tenant_limiter.check(client_id)
+        ANALYSES_COALESCED.inc(endpoint="analyze")
+    else:
+        admission = scheduler.admit(client_id)
+        try:
+            await tenant_limiter.check(client_id, analysis_tokens(decision, precomputed))
+        except BaseException:
+            admission.release()
+            raise
+        
+        async def run():
+            current_client.set(client_id)
+            return await orchestrator.analyze(decision, precomputed)
+        
+        entry = running_analyses[key] = {"task": asyncio.create_task(run()), "waiters": 0}
+        
+        def finished(task: asyncio.Task) -> None:
+            admission.release()
+            if running_analyses.get(key) is entry:
+                del running_analyses[key]
+        
+        entry["task"].add_done_callback(finished)
+    
+    entry["waiters"] += 1
+    try:
+        return await asyncio.shield(entry["task"])
+    finally:
+        entry["waiters"] -= 1
+        if not entry["waiters"] and settings.STREAM_ABANDON_TIMEOUT > 0:
+            entry["task"].cancel()
+
+
+async def start_comparison(decision: str, variants: list[str], client_id: str, endpoint: str) -> str:
+    """Id of the hub stream comparing ``decision`` with ``variants``, starting one if none is."""
+    inputs = orchestrator.comparison_inputs(decision, variants)
+    key = make_cache_key(compare=[orchestrator.fingerprint(text) for text in inputs])
+    unshared = [agent for agent in orchestrator.agents if agent.name not in settings.COMPARE_SHARED_STAGES]
+    tokens = orchestrator.token_estimate(decision) + sum(
+        orchestrator.token_estimate(text, unshared) for text in set(inputs[1:])
+    )
+    return await start_run(
+        key, lambda: orchestrator.compare_streaming(decision, variants), client_id, endpoint, tokens
+    )
+
+
+def collect_agent(by_name: dict[str, dict[str, Any]], update: dict[str, Any]) -> None:
+    """Record the agent result carried by an ``agent_complete`` or ``agent_error`` event."""
+    if update["status"] == "agent_complete":
+        agent = {"agent": update["agent"], "emoji": update["emoji"], "result": update["result"]}
+        if "data" in update:
+            agent["data"] = update["data"]
+        if update.get("stale"):
+            agent.update(stale=True, error_code=update["error_code"])
+        by_name[update["agent"]] = agent
+    elif update["status"] == "agent_error":
+        by_name[update["agent"]] = {
+            "agent": update["agent"], "emoji": update["emoji"], "result": update["error"],
+            "error": True, "error_code": update.get("error_code"),
+        }
+
+
+def collected_response(
+    decision: str, by_name: dict[str, dict[str, Any]], final: dict[str, Any]
+) -> dict[str, Any]:
+    """Shape collected agent results like an ``/api/analyze`` response, in pipeline order."""
+    agents = [by_name[agent.name] for agent in orchestrator.agents if agent.name in by_name]
+    return {
+        "id": final.get("id"),
+        "input": decision,
+        "agents": agents,
+        "agent_count": len(agents),
+        "success": all(not agent.get("error", False) for agent in agents),
+        "timings": final.get("timings"),
+    }
+
+
+async def collect_comparison(stream_id: str, decision: str, variants: list[str]) -> dict[str, Any]:
+    """Follow a comparison stream to its end and shape it as an ``/api/compare`` response."""
+    inputs = orchestrator.comparison_inputs(decision, variants)
+    by_option: list[dict[str, dict[str, Any]]] = [{} for _ in inputs]
+    finals: list[dict[str, Any]] = [{} for _ in inputs]
+    summary: dict[str, Any] = {}
+    async for _, update in stream_hub.subscribe(stream_id):
+        if update["status"] == "error":
+            raise HTTPException(status_code=500, detail=update["error"])
+        if update["status"] == "complete":
+            summary = update
+        elif update["status"] == "option_complete":
+            finals[update["option"]] = update
+        else:
+            collect_agent(by_option[update["option"]], update)
+    return {
+        "input": decision,
+        "variants": variants,
+        "shared": summary.get("shared", []),
+        "options": [
+            collected_response(text, by_name, final)
+            for text, by_name, final in zip(inputs, by_option, finals)
+        ],
+        "timings": summary.get("timings"),
+    }
+
+
+def resume_point(
+    http_request: Request, last_event_id: Optional[str], client_id: str
+) -> Optional[tuple[str, int]]:
+    """``(stream id, index)`` to resume from, if the client sent the id of a stream it may still follow."""
+    resume = StreamHub.parse_event_id(http_request.headers.get("last-event-id") or last_event_id)
+    if resume is None or stream_hub.get_for(resume[0], client_id) is None:
+        return None
+    return resume
+
+
+@app.exception_handler(QueueFullError)
+async def queue_full_handler(request: Request, exc: QueueFullError):
+    """Fast-fail overloaded requests with 503 + Retry-After."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+
+@app.exception_handler(StreamExpiredError)
+async def stream_expired_handler(request: Request, exc: StreamExpiredError):
+    """Answer 404 when the stream a request was following has been evicted."""
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+@app.exception_handler(RateLimitError)
+async def rate_limit_handler(request: Request, exc: RateLimitError):
+    """Reject tenants over a rate limit or daily quota with 429 + Retry-After."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "limit": exc.limit},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
 
 
 @app.get("/health")
@@ -60,8 +635,65 @@ async def health_check():
     return {"status": "healthy", "service": "CLEARTHINK"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until warm-up has finished and again once draining."""
+    return JSONResponse(
+        status_code=200 if lifecycle.ready else 503,
+        content={
+            "status": lifecycle.state,
+            "analyses_in_progress": scheduler.stats()["admitted_analyses"],
+        },
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-agent latency, tokens, cache hits and errors."""
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Response cache hit/miss counters for this worker."""
+    return response_cache.stats()
+
+
+@app.get("/api/scheduler/stats")
+async def scheduler_stats():
+    """LLM call queue depth, wait times and admission counters for this worker."""
+    return scheduler.stats()
+
+
+@app.get("/api/usage")
+async def usage(http_request: Request, days: int = 1):
+    """
+    The calling tenant's limits, what is left of them, and its usage
+    (requests, and runs, cache hits and tokens per agent) for each of the
+    last ``days`` UTC days.
+    """
+    return await tenant_limiter.usage(client_id_for(http_request), max(1, min(days, 90)))
+
+
+@app.get("/api/models")
+async def model_routes():
+    """Each agent's model routes, and the circuit state and p95 latency of every route in use."""
+    return {
+        "agents": {agent.name: settings.model_routes(agent.name) for agent in orchestrator.agents},
+        "routes": router_stats(),
+    }
+
+
 @app.post("/api/analyze", response_model=AnalysisResponse)
-async def analyze_decision(request: DecisionRequest):
+async def analyze_decision(
+    request: DecisionRequest,
+    http_request: Request,
+    timings: bool = False,
+    fresh: bool = False,
+    fields: Optional[str] = None,
+):
     """
     Analyze a decision using all 6 CLEARTHINK agents.
     
@@ -72,53 +704,365 @@ async def analyze_decision(request: DecisionRequest):
     4. Second-Order Thinking - Explore consequences
     5. Bias Detection - Identify cognitive biases
     6. Decision Summary - Synthesize recommendations
+    
+    Pass ``timings=true`` for a per-agent timing breakdown. A stored result
+    for the same (or, with the similarity index, a near-identical) decision
+    is returned with ``reused: true`` unless ``fresh=true``. Identical
+    requests already in flight share that run rather than starting another.
+    
+    ``fields`` limits the response to some agents and/or agent result
+    keys, e.g. ``fields=Decision Summary,result``.
     """
     if not request.decision.strip():
         raise HTTPException(status_code=400, detail="Decision text cannot be empty")
+    selection = field_selection(fields)
+    client_id = client_id_for(http_request)
     
     try:
         settings.validate()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     
-    result = await orchestrator.analyze(request.decision)
-    return result
+    stored, precomputed = await plan_reuse(request.decision, fresh, client_id)
+    if stored is not None:
+        await tenant_limiter.check(client_id)
+        result = stored_response(stored)
+    else:
+        result = await run_analysis(request.decision, precomputed, fresh, client_id)
+    if not timings:
+        # Coalesced callers share one result, so leave it as it is.
+        result = {**result, "timings": None}
+    return projected_response(result, selection)
 
 
 @app.get("/api/analyze/stream")
-async def analyze_decision_stream(decision: str):
+async def analyze_decision_stream(
+    decision: str,
+    http_request: Request,
+    timings: bool = False,
+    fresh: bool = False,
+    last_event_id: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
     Stream analysis results as each agent completes.
-    Uses Server-Sent Events (SSE) for real-time updates.
+    Uses Server-Sent Events (SSE) for real-time updates: ``agent_delta``
+    events carry token chunks, ``agent_complete`` the full agent result.
+    Pass ``timings=true`` for a timing breakdown in the ``complete`` event,
+    and ``fields`` (as for ``/api/analyze``) to skip other agents' events.
+    A stored result for the same or a near-identical decision is replayed
+    unless ``fresh=true``. If the same decision is already being analyzed,
+    the request follows that run.
+    
+    The analysis runs independently of the connection. Every event has an
+    ``id``; reconnecting with a ``Last-Event-ID`` header (or the
+    ``last_event_id`` parameter) resumes after that event instead of
+    starting a new run, for up to ``STREAM_REPLAY_TTL`` seconds after the
+    analysis has finished.
+    """
+    selection = field_selection(fields)
+    client_id = client_id_for(http_request)
+    resume = resume_point(http_request, last_event_id, client_id)
+    if resume is not None:
+        return sse_response(follow_stream(*resume, timings=timings, selection=selection))
+    
+    if not decision.strip():
+        raise HTTPException(status_code=400, detail="Decision text cannot be empty")
+    
+    try:
+        settings.validate()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    stored, precomputed = await plan_reuse(decision, fresh, client_id)
+    if stored is not None:
+        await tenant_limiter.check(client_id)
+        stream_id = stream_hub.start(replay_stored(stored), owner=client_id)
+    else:
+        stream_id = await start_analysis(decision, precomputed, fresh, client_id, "stream")
+    return sse_response(follow_stream(stream_id, timings=timings, selection=selection))
+
+
+@app.get("/api/analyze/stream/{stream_id}")
+async def follow_analysis_stream(
+    stream_id: str,
+    http_request: Request,
+    timings: bool = False,
+    last_event_id: Optional[str] = None,
+    fields: Optional[str] = None,
+):
     """
+    Follow an analysis stream started by ``/api/analyze/stream``, from its
+    first event or, with ``Last-Event-ID``, after the given event. Any
+    number of clients can follow one analysis; it runs only once. Only the
+    clients that started or joined the analysis may follow it.
+    """
+    selection = field_selection(fields)
+    client_id = client_id_for(http_request)
+    resume = resume_point(http_request, last_event_id, client_id)
+    if resume is not None and resume[0] == stream_id:
+        return sse_response(follow_stream(*resume, timings=timings, selection=selection))
+    if stream_hub.get_for(stream_id, client_id) is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    return sse_response(follow_stream(stream_id, timings=timings, selection=selection))
+
+
+def validate_comparison(decision: str, variants: list[str]) -> None:
+    """Reject an empty or oversized comparison with 400."""
     if not decision.strip():
         raise HTTPException(status_code=400, detail="Decision text cannot be empty")
+    if not variants or not all(variant.strip() for variant in variants):
+        raise HTTPException(status_code=400, detail="Give at least one non-empty variant")
+    if len(variants) > settings.COMPARE_MAX_VARIANTS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.COMPARE_MAX_VARIANTS} variants per comparison"
+        )
+    
+    try:
+        settings.validate()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/api/compare", response_model=ComparisonResponse)
+async def compare_decisions(request: CompareRequest, http_request: Request, timings: bool = False):
+    """
+    Analyze a decision and variations of it side by side.
+    
+    Option 0 is the base decision, option ``i`` the base with variant
+    ``i - 1`` appended; every option's agents are in pipeline order. The
+    ``COMPARE_SHARED_STAGES`` run once, on the base decision, for all
+    options (listed in ``shared``); the other stages run for each option
+    concurrently.
+    """
+    validate_comparison(request.decision, request.variants)
+    stream_id = await start_comparison(
+        request.decision, request.variants, client_id_for(http_request), "compare"
+    )
+    result = await collect_comparison(stream_id, request.decision, request.variants)
+    if not timings:
+        result["timings"] = None
+        for option in result["options"]:
+            option["timings"] = None
+    return result
+
+
+@app.get("/api/compare/stream")
+async def compare_decisions_stream(
+    decision: str,
+    http_request: Request,
+    variant: list[str] = Query(default=[]),
+    timings: bool = False,
+    last_event_id: Optional[str] = None,
+):
+    """
+    Stream a comparison (see ``/api/compare``) as Server-Sent Events.
+    
+    Pass each variant as a ``variant`` parameter. Every option's events are
+    those of ``/api/analyze/stream`` with an ``option`` index, its final
+    event being ``option_complete``; the last event is ``complete``, with
+    the ``shared`` stages. Resuming with ``Last-Event-ID`` works as for
+    ``/api/analyze/stream``.
+    """
+    client_id = client_id_for(http_request)
+    resume = resume_point(http_request, last_event_id, client_id)
+    if resume is not None:
+        return sse_response(follow_stream(*resume, timings=timings))
+    
+    validate_comparison(decision, variant)
+    stream_id = await start_comparison(decision, variant, client_id, "compare_stream")
+    return sse_response(follow_stream(stream_id, timings=timings))
+
+
+@app.get("/api/history", response_model=HistoryPage)
+async def history(
+    http_request: Request, limit: int = 20, before: Optional[float] = None, before_id: str = ""
+):
+    """
+    The calling client's stored analyses, newest first.
+    
+    Pass the returned ``next_before`` and ``next_before_id`` as ``before``
+    and ``before_id`` to fetch the next page.
+    """
+    client_id = client_id_for(http_request)
+    if store is None:
+        raise HTTPException(status_code=404, detail="Analysis store is disabled")
+    return await store.history(max(1, min(limit, 100)), before, client_id, before_id)
+
+
+@app.get("/api/analyses/{analysis_id}", response_model=StoredAnalysis)
+async def get_analysis(analysis_id: str, http_request: Request):
+    """One of the calling client's stored analyses, with every agent's output, timings and models."""
+    client_id = client_id_for(http_request)
+    record = await store.get(analysis_id, client_id) if store is not None else None
+    if record is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    return record
+
+
+@app.post("/api/analyses/{analysis_id}/refine", response_model=AnalysisResponse)
+async def refine_analysis(
+    analysis_id: str, request: RefineRequest, http_request: Request, timings: bool = False
+):
+    """
+    Re-run only the agents affected by a change to a stored analysis.
+    
+    The change can be an edited ``decision``, ``overrides`` replacing agents'
+    output with your own text, and/or agents to ``refresh``. Agents whose
+    input and upstream context are unchanged keep their stored result; the
+    new analysis is stored under a new id and ``recomputed`` lists the
+    agents that ran.
+    """
+    client_id = client_id_for(http_request)
+    previous = await store.get(analysis_id, client_id) if store is not None else None
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+    if request.decision is not None and not request.decision.strip():
+        raise HTTPException(status_code=400, detail="Decision text cannot be empty")
+    names = {agent.name for agent in orchestrator.agents}
+    unknown = (set(request.overrides) | set(request.refresh)) - names
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown agents: {', '.join(sorted(unknown))}")
     
     try:
         settings.validate()
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+    rerun = orchestrator.refine_agents(previous, request.decision, request.overrides, request.refresh)
+    with scheduler.admit(client_id):
+        await tenant_limiter.check(
+            client_id, orchestrator.token_estimate(request.decision or previous["input"], rerun)
+        )
+        current_client.set(client_id)
+        result = await orchestrator.refine(
+            previous, request.decision, request.overrides, request.refresh
+        )
+    if not timings:
+        result["timings"] = None
+    return result
+
+
+@app.post("/api/jobs", response_model=JobSubmitted, status_code=202)
+async def submit_job(request: DecisionRequest, http_request: Request):
+    """
+    Queue a decision for analysis and return immediately.
+    
+    Poll ``GET /api/jobs/{id}`` for status and partial results, or follow
+    ``GET /api/jobs/{id}/events`` for Server-Sent Events.
+    """
+    if not request.decision.strip():
+        raise HTTPException(status_code=400, detail="Decision text cannot be empty")
+    
+    try:
+        settings.validate()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    client_id = client_id_for(http_request)
+    tokens = orchestrator.token_estimate(request.decision)
+    await tenant_limiter.check(client_id, tokens)
+    try:
+        job = await job_manager.submit(request.decision, client_id)
+    except QueueFullError:
+        tenant_limiter.refund(client_id, tokens)
+        raise
+    return {
+        "id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+        "events_url": f"/api/jobs/{job.id}/events",
+    }
+
+
+async def owned_job(job_id: str, http_request: Request):
+    """The calling client's job ``job_id``, or 404."""
+    client_id = client_id_for(http_request)
+    job = await job_manager.get(job_id)
+    if job is None or job.client_id != client_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/api/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str, http_request: Request):
+    """Status and partial results of one of the calling client's analysis jobs."""
+    job = await owned_job(job_id, http_request)
+    data: dict[str, Any] = job.to_dict()
+    data["progress"] = len(job.agents) / len(orchestrator.agents)
+    return data
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str, http_request: Request):
+    """Stream a job's events (Server-Sent Events), replaying those already sent."""
+    job = await owned_job(job_id, http_request)
+    return sse_response(job_manager.events(job))
+
+
+@app.post("/api/batch")
+async def analyze_batch(
+    http_request: Request,
+    parallelism: int = settings.BATCH_PARALLELISM,
+    rate: float = settings.BATCH_RATE_LIMIT,
+):
+    """
+    Analyze a JSONL body of ``{"id", "decision"}`` records.
+    
+    Up to ``parallelism`` analyses run at once and at most ``rate`` start per
+    minute. Results stream back as JSONL, one line per decision in
+    completion order; resend only the ids you have not received to resume.
+    """
+    try:
+        items = parse_decisions((await http_request.body()).decode("utf-8").splitlines())
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not items:
+        raise HTTPException(status_code=400, detail="No decisions to analyze")
+    if len(items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.BATCH_MAX_ITEMS} decisions per batch",
+        )
+    
+    try:
+        settings.validate()
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    client_id = client_id_for(http_request)
+    admission = scheduler.admit(client_id)
+    try:
+        await tenant_limiter.check(
+            client_id,
+            sum(orchestrator.token_estimate(item["decision"]) for item in items),
+            requests=len(items),
+        )
+    except BaseException:
+        admission.release()
+        raise
+    parallelism = max(1, min(parallelism, settings.BATCH_MAX_PARALLELISM))
+    
     async def generate():
-        async for update in orchestrator.analyze_streaming(decision):
-            yield f"data: {json.dumps(update)}\n\n"
-            await asyncio.sleep(0.1)  # Small delay for client processing
+        current_client.set(client_id)
+        try:
+            async for record in run_batch(orchestrator, items, parallelism, rate):
+                yield dumps(record) + "\n"
+        finally:
+            admission.release()
     
     return StreamingResponse(
         generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-        }
+        media_type="application/x-ndjson",
     )
 
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Static files, fingerprinted and precompressed at startup (see app.assets)
+static_assets = StaticAssets()
+app.mount("/static", static_assets, name="static")
 
 
 @app.get("/")
-async def serve_ui():
+async def serve_ui(request: Request):
     """Serve the main UI."""
-    return FileResponse("static/index.html")
+    return static_assets.response("index.html", request.headers)
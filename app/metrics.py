@@ -0,0 +1,230 @@
+"""Prometheus-format performance metrics.
+
+A small self-contained registry of counters, gauges and histograms,
+rendered in the Prometheus text exposition format by ``GET /metrics``.
+"""
+
+import math
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets (seconds) sized for LLM calls: sub-second cache hits up to
+# multi-minute pathological responses.
+LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0, 160.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        # Unlabelled counters are exported as 0 before their first increment.
+        self._values: Dict[LabelValues, float] = {} if self.labelnames else {(): 0}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in sorted(self._values.items())
+        ]
+
+
+class Gauge(_Metric):
+    """Current value read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.callback = callback
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_value(self.callback())}"]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: Optional[float], **labels: str) -> None:
+        if value is None:
+            return
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for key, counts in sorted(self._counts.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered together."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], float]) -> Gauge:
+        return self.register(Gauge(name, documentation, callback))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Per-agent metrics
+AGENT_RUNS = registry.counter(
+    "clearthink_agent_runs_total", "Agent runs started.", ["agent"])
+AGENT_ERRORS = registry.counter(
+    "clearthink_agent_errors_total", "Agent runs that raised an error.", ["agent"])
+AGENT_RETRIES = registry.counter(
+    "clearthink_agent_retries_total", "Agent runs retried after a transient error, by error code.",
+    ["agent", "error_code"])
+AGENT_STRUCTURED_PARSE_FAILURES = registry.counter(
+    "clearthink_agent_structured_parse_failures_total",
+    "Structured-mode agent outputs that held no valid JSON object and were kept as text.", ["agent"])
+AGENT_CACHE_HITS = registry.counter(
+    "clearthink_agent_cache_hits_total", "Agent runs served from the response cache.", ["agent"])
+AGENT_QUEUE_WAIT = registry.histogram(
+    "clearthink_agent_queue_wait_seconds", "Time an agent's LLM call waited for a scheduler slot.", ["agent"])
+AGENT_TIME_TO_FIRST_TOKEN = registry.histogram(
+    "clearthink_agent_time_to_first_token_seconds", "Time from LLM call start to the first streamed token.", ["agent"])
+AGENT_LLM_LATENCY = registry.histogram(
+    "clearthink_agent_llm_latency_seconds", "Total LLM call latency per agent.", ["agent"])
+AGENT_PROMPT_TOKENS = registry.counter(
+    "clearthink_agent_prompt_tokens_total", "Estimated prompt tokens sent per agent.", ["agent"])
+AGENT_COMPLETION_TOKENS = registry.counter(
+    "clearthink_agent_completion_tokens_total", "Estimated completion tokens received per agent.", ["agent"])
+SPECULATIVE_RUNS = registry.counter(
+    "clearthink_speculative_runs_total",
+    "Speculative early starts by outcome (started, accepted, restarted).", ["agent", "outcome"])
+SPECULATIVE_WASTED_TOKENS = registry.counter(
+    "clearthink_speculative_wasted_tokens_total",
+    "Estimated prompt and completion tokens spent on cancelled speculative runs.", ["agent"])
+
+# Model routing metrics
+ROUTE_CALLS = registry.counter(
+    "clearthink_llm_route_calls_total", "LLM calls per route by outcome (success, error, slo_breach).",
+    ["route", "outcome"])
+ROUTE_FAILOVERS = registry.counter(
+    "clearthink_llm_route_failovers_total", "Calls failed over away from a route.", ["route"])
+ROUTE_HEDGES = registry.counter(
+    "clearthink_llm_route_hedges_total", "Backup requests sent to a route for slow calls.", ["route"])
+ROUTE_CIRCUIT_OPENED = registry.counter(
+    "clearthink_llm_route_circuit_opened_total", "Times a route's circuit breaker opened.", ["route"])
+
+# Per-request metrics
+ANALYSIS_DURATION = registry.histogram(
+    "clearthink_analysis_duration_seconds", "End-to-end orchestrator run time.", ["mode"])
+ADMISSION_REJECTED = registry.counter(
+    "clearthink_admission_rejected_total", "Requests rejected by admission control.")
+TENANT_REJECTED = registry.counter(
+    "clearthink_tenant_rejected_total", "Requests rejected by per-tenant rate limits and daily quotas, by limit.",
+    ["limit"])
+RESPONSE_BYTES = registry.counter(
+    "clearthink_response_bytes_total", "Compressed response bytes sent, by encoding.", ["encoding"])
+RESPONSE_UNCOMPRESSED_BYTES = registry.counter(
+    "clearthink_response_uncompressed_bytes_total",
+    "Size before compression of the compressed responses, by encoding.", ["encoding"])
+ANALYSES_COALESCED = registry.counter(
+    "clearthink_analyses_coalesced_total",
+    "Requests attached to an identical analysis already in flight.", ["endpoint"])
+STREAMS_ABANDONED = registry.counter(
+    "clearthink_streams_abandoned_total", "Running analyses cancelled because no client was following them.")
@@ -0,0 +1,351 @@
+"""Model routing with failover, circuit breaking and hedged requests.
+
+A ``RoutedChatModel`` is a LangChain chat model that sends each call to
+the first healthy route in an ordered list of provider/model routes:
+
+- A route whose calls keep failing, or keep breaching the latency SLO,
+  has its circuit opened and is skipped until a cooldown has passed; one
+  trial call is then let through to probe it.
+- A call that fails before producing output is retried on the next route.
+- Once a route has enough latency samples, a call still outstanding after
+  the route's p95 latency (time to first token when streaming) is hedged
+  with a backup request to the next route; whichever answers first wins
+  and the other is cancelled.
+
+Routes are shared by every agent configured with the same route, so
+their health and latency history are too.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+
+from app.config import settings
+from app.llm import route_outcome
+from app.metrics import ROUTE_CALLS, ROUTE_CIRCUIT_OPENED, ROUTE_FAILOVERS, ROUTE_HEDGES
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open probe after a cooldown."""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        """Whether a call may be sent; in half-open state only one probe at a time."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def begin(self) -> None:
+        """Mark a call as sent; in half-open state it is the probe."""
+        if self.state == "half_open":
+            self._probing = True
+
+    def abandon(self) -> None:
+        """Forget a call that was cancelled before its outcome was known."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True when this opens the circuit."""
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None:
+            # A failed probe restarts the cooldown.
+            self.opened_at = time.monotonic()
+            return False
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+
+class Route:
+    """One provider/model a call can be sent to, with its health and latency history."""
+
+    def __init__(self, name: str, model: BaseChatModel):
+        self.name = name
+        self.model = model
+        self.breaker = CircuitBreaker(settings.ROUTER_FAILURE_THRESHOLD, settings.ROUTER_COOLDOWN)
+        self.latencies: Deque[float] = deque(maxlen=settings.ROUTER_LATENCY_WINDOW)
+        self.first_token_latencies: Deque[float] = deque(maxlen=settings.ROUTER_LATENCY_WINDOW)
+
+    @staticmethod
+    def _p95(samples: Deque[float]) -> Optional[float]:
+        if len(samples) < settings.ROUTER_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def hedge_after(self, streaming: bool) -> Optional[float]:
+        """Seconds after which a call to this route is hedged, if hedging applies."""
+        if not settings.ROUTER_HEDGING:
+            return None
+        return self._p95(self.first_token_latencies if streaming else self.latencies)
+
+    def record(self, started: float, error: bool) -> None:
+        latency = time.monotonic() - started
+        slo = settings.ROUTER_LATENCY_SLO
+        if error:
+            outcome = "error"
+        elif slo and latency > slo:
+            outcome = "slo_breach"
+        else:
+            outcome = "success"
+        ROUTE_CALLS.inc(route=self.name, outcome=outcome)
+        if not error:
+            self.latencies.append(latency)
+        if outcome == "success":
+            self.breaker.record_success()
+        elif self.breaker.record_failure():
+            ROUTE_CIRCUIT_OPENED.inc(route=self.name)
+            logger.warning("Circuit opened for %s after %d failures", self.name, self.breaker.failures)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "route": self.name,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+            "p95_latency": self._p95(self.latencies),
+            "p95_time_to_first_token": self._p95(self.first_token_latencies),
+        }
+
+
+async def _cancel(task: Optional[asyncio.Task]) -> None:
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model that fails over and hedges across an ordered list of routes."""
+
+    _routes: List[Route] = PrivateAttr(default_factory=list)
+
+    def __init__(self, routes: List[Route], **kwargs: Any):
+        super().__init__(**kwargs)
+        self._routes = routes
+
+    @property
+    def _llm_type(self) -> str:
+        return "clearthink-router"
+
+    @property
+    def routes(self) -> List[Route]:
+        return self._routes
+
+    def _answered(self, route: Route) -> None:
+        outcome = route_outcome.get()
+        if outcome is not None:
+            outcome["route"] = route.name
+            outcome["fallback"] = route is not self._routes[0]
+
+    def _candidates(self) -> List[Route]:
+        """Routes to try in order: those whose circuit admits a call, else all of them."""
+        healthy = [route for route in self._routes if route.breaker.allow()]
+        return healthy or list(self._routes)
+
+    # ---- non-streaming ---------------------------------------------------
+
+    async def _call(self, route: Route, messages, stop, kwargs) -> AIMessage:
+        started = time.monotonic()
+        route.breaker.begin()
+        try:
+            message = await route.model.ainvoke(messages, stop=stop, **kwargs)
+        except asyncio.CancelledError:
+            route.breaker.abandon()
+            raise
+        except Exception:
+            route.record(started, error=True)
+            raise
+        route.record(started, error=False)
+        return message
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        candidates = self._candidates()
+        last_error: Optional[Exception] = None
+        while candidates:
+            route = candidates.pop(0)
+            backup = candidates[0] if candidates else route
+            primary = asyncio.create_task(self._call(route, messages, stop, kwargs))
+            pending = {primary}
+            routes = {primary: route}
+            hedge_after = route.hedge_after(streaming=False)
+            try:
+                if hedge_after is not None:
+                    done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                    if not done:
+                        ROUTE_HEDGES.inc(route=backup.name)
+                        if backup is not route:
+                            candidates.pop(0)
+                        hedge = asyncio.create_task(self._call(backup, messages, stop, kwargs))
+                        pending.add(hedge)
+                        routes[hedge] = backup
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            self._answered(routes[task])
+                            return ChatResult(generations=[ChatGeneration(message=task.result())])
+                        last_error = task.exception()
+            finally:
+                for task in pending:
+                    await _cancel(task)
+            if candidates:
+                ROUTE_FAILOVERS.inc(route=route.name)
+                logger.warning("Failing over from %s: %s", route.name, last_error)
+        raise last_error
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        last_error: Optional[Exception] = None
+        for route in self._candidates():
+            started = time.monotonic()
+            route.breaker.begin()
+            try:
+                message = route.model.invoke(messages, stop=stop, **kwargs)
+            except Exception as e:
+                route.record(started, error=True)
+                last_error = e
+                continue
+            route.record(started, error=False)
+            self._answered(route)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        raise last_error
+
+    # ---- streaming -------------------------------------------------------
+
+    async def _open(self, route: Route, messages, stop, kwargs):
+        """Start a stream on ``route`` and wait for its first chunk."""
+        started = time.monotonic()
+        route.breaker.begin()
+        stream = route.model.astream(messages, stop=stop, **kwargs).__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        except asyncio.CancelledError:
+            route.breaker.abandon()
+            await stream.aclose()
+            raise
+        except Exception:
+            route.record(started, error=True)
+            raise
+        route.first_token_latencies.append(time.monotonic() - started)
+        return route, started, stream, first
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        candidates = self._candidates()
+        last_error: Optional[Exception] = None
+        winner = None
+        while candidates and winner is None:
+            route = candidates.pop(0)
+            backup = candidates[0] if candidates else route
+            pending = {asyncio.create_task(self._open(route, messages, stop, kwargs))}
+            hedge_after = route.hedge_after(streaming=True)
+            try:
+                if hedge_after is not None:
+                    done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                    if not done:
+                        ROUTE_HEDGES.inc(route=backup.name)
+                        if backup is not route:
+                            candidates.pop(0)
+                        pending.add(asyncio.create_task(self._open(backup, messages, stop, kwargs)))
+                while pending and winner is None:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None and winner is None:
+                            winner = task.result()
+                        elif task.exception() is not None:
+                            last_error = task.exception()
+                        else:
+                            # Lost a photo finish: close the slower stream.
+                            loser = task.result()
+                            loser[0].breaker.abandon()
+                            await loser[2].aclose()
+            finally:
+                for task in pending:
+                    await _cancel(task)
+            if winner is None and candidates:
+                ROUTE_FAILOVERS.inc(route=route.name)
+                logger.warning("Failing over from %s: %s", route.name, last_error)
+        if winner is None:
+            raise last_error
+
+        route, started, stream, chunk = winner
+        self._answered(route)
+        # Output has been emitted from here on, so errors are not failed over.
+        finished = False
+        try:
+            while chunk is not None:
+                generation = ChatGenerationChunk(message=AIMessageChunk(content=chunk.content))
+                if run_manager:
+                    await run_manager.on_llm_new_token(str(chunk.content), chunk=generation)
+                yield generation
+                try:
+                    chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    chunk = None
+            finished = True
+        except Exception:
+            route.record(started, error=True)
+            finished = True
+            raise
+        finally:
+            await stream.aclose()
+            if not finished:
+                route.breaker.abandon()
+        route.record(started, error=False)
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        result = self._generate(messages, stop, run_manager, **kwargs)
+        yield ChatGenerationChunk(message=AIMessageChunk(content=result.generations[0].message.content))
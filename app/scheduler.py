@@ -0,0 +1,294 @@
+"""Admission control and concurrency limiting for outbound LLM calls.
+
+Two layers protect the LLM provider from bursts:
+
+* Admission - each client may have a bounded number of analyses queued or
+  running, with a global bound on top. Beyond that, requests fail fast with
+  ``QueueFullError`` (served as 503 + Retry-After) instead of piling up and
+  turning into provider 429s.
+* Call scheduling - admitted LLM calls share a global in-flight cap and a
+  tokens-per-minute budget. Waiting calls are queued per client and served
+  round-robin, so one busy client cannot starve the others.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+
+from app.config import settings
+from app.metrics import ADMISSION_REJECTED, registry
+
+
+# Client the current request is running on behalf of; set by the API layer
+# and inherited by the agent tasks the orchestrator spawns.
+current_client: ContextVar[str] = ContextVar("current_client", default="default")
+
+
+class QueueFullError(Exception):
+    """Raised when a client's admission queue (or the global one) is full."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Continuously refilled token bucket; ``rate`` tokens per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self, amount: float) -> bool:
+        """Take ``amount`` tokens if available right now."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens will be available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate > 0 else math.inf
+
+    async def take(self, amount: float) -> float:
+        """Wait until ``amount`` tokens can be taken; returns the seconds waited."""
+        started = time.monotonic()
+        while not self.try_take(amount):
+            await asyncio.sleep(self.time_until(amount))
+        return time.monotonic() - started
+
+    def refund(self, amount: float) -> None:
+        """Return over-reserved tokens to the bucket."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class Admission:
+    """An admitted analysis; release exactly once when the analysis ends."""
+
+    def __init__(self, scheduler: "LLMScheduler", client_id: str):
+        self.scheduler = scheduler
+        self.client_id = client_id
+        self.released = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.scheduler._release_admission(self.client_id)
+
+    def __enter__(self) -> "Admission":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+class LLMScheduler:
+    """Global limiter and per-client fair queue in front of the LLM."""
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        tokens_per_minute: int,
+        max_queue_per_client: int,
+        max_queue_total: int,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_queue_per_client = max_queue_per_client
+        self.max_queue_total = max_queue_total
+        self.token_bucket: Optional[TokenBucket] = None
+        if tokens_per_minute > 0:
+            self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute)
+
+        self.in_flight = 0
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {}
+        self._rotation: Deque[str] = deque()
+        self._admitted: Dict[str, int] = {}
+
+        # Counters for stats()
+        self.calls_started = 0
+        self.calls_completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_call_time = 0.0
+
+    # ---- admission -------------------------------------------------------
+
+    def admit(self, client_id: str) -> Admission:
+        """Admit one analysis for ``client_id`` or raise ``QueueFullError``."""
+        admitted_total = sum(self._admitted.values())
+        if self._admitted.get(client_id, 0) >= self.max_queue_per_client:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc()
+            raise QueueFullError(
+                f"Too many analyses in progress for client '{client_id}'",
+                self.retry_after(),
+            )
+        if admitted_total >= self.max_queue_total:
+            self.rejected += 1
+            ADMISSION_REJECTED.inc()
+            raise QueueFullError("Server is at capacity", self.retry_after())
+        self._admitted[client_id] = self._admitted.get(client_id, 0) + 1
+        return Admission(self, client_id)
+
+    def _release_admission(self, client_id: str) -> None:
+        remaining = self._admitted.get(client_id, 0) - 1
+        if remaining > 0:
+            self._admitted[client_id] = remaining
+        else:
+            self._admitted.pop(client_id, None)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait, estimated from recent call times."""
+        avg_call = self.total_call_time / self.calls_completed if self.calls_completed else 5.0
+        backlog = self.queued / max(1, self.max_in_flight)
+        return max(1, math.ceil(avg_call * (backlog + 1)))
+
+    # ---- call scheduling -------------------------------------------------
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._waiters.values())
+
+    async def _acquire(self, client_id: str) -> None:
+        if self.in_flight < self.max_in_flight and not self._rotation:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._waiters.get(client_id)
+        if queue is None:
+            queue = self._waiters[client_id] = deque()
+            self._rotation.append(client_id)
+        queue.append(future)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just as we were cancelled; hand it on.
+                self._release()
+            else:
+                self._discard(client_id, future)
+            raise
+
+    def _discard(self, client_id: str, future: asyncio.Future) -> None:
+        queue = self._waiters.get(client_id)
+        if queue is None:
+            return
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiters[client_id]
+            try:
+                self._rotation.remove(client_id)
+            except ValueError:
+                pass
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        while self.in_flight < self.max_in_flight and self._rotation:
+            client_id = self._rotation.popleft()
+            queue = self._waiters[client_id]
+            future = queue.popleft()
+            if queue:
+                self._rotation.append(client_id)
+            else:
+                del self._waiters[client_id]
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: int = 0):
+        """
+        Hold one in-flight LLM call slot for the current client.
+
+        Yields a dict that receives the ``queue_wait`` in seconds; callers may
+        set ``actual_tokens`` before exiting to refund over-estimated tokens.
+        """
+        client_id = current_client.get()
+        started = time.monotonic()
+        # Wait for token budget before taking a slot, so a call throttled by
+        # the bucket never holds a slot another client's call could use.
+        charged = self.token_bucket is not None and estimated_tokens
+        if charged:
+            await self.token_bucket.take(estimated_tokens)
+        try:
+            await self._acquire(client_id)
+        except BaseException:
+            if charged:
+                self.token_bucket.refund(estimated_tokens)
+            raise
+        try:
+            waited = time.monotonic() - started
+            self.calls_started += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+            ticket: Dict[str, Any] = {"queue_wait": waited}
+            call_started = time.monotonic()
+            yield ticket
+
+            self.total_call_time += time.monotonic() - call_started
+            self.calls_completed += 1
+            actual = ticket.get("actual_tokens")
+            if self.token_bucket is not None and actual is not None and actual < estimated_tokens:
+                self.token_bucket.refund(estimated_tokens - actual)
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, wait time and throughput counters."""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "queued_calls": self.queued,
+            "queued_by_client": {c: len(q) for c, q in self._waiters.items()},
+            "admitted_analyses": sum(self._admitted.values()),
+            "admitted_by_client": dict(self._admitted),
+            "rejected": self.rejected,
+            "calls_completed": self.calls_completed,
+            "avg_queue_wait": self.total_wait / self.calls_started if self.calls_started else 0.0,
+            "max_queue_wait": self.max_wait,
+            "tokens_available": (
+                int(self.token_bucket.tokens) if self.token_bucket is not None else None
+            ),
+        }
+
+
+scheduler = LLMScheduler(
+    max_in_flight=settings.LLM_MAX_IN_FLIGHT,
+    tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    max_queue_per_client=settings.SCHEDULER_MAX_QUEUE_PER_CLIENT,
+    max_queue_total=settings.SCHEDULER_MAX_QUEUE_TOTAL,
+)
+
+registry.gauge(
+    "clearthink_llm_calls_in_flight", "LLM calls currently holding a scheduler slot.",
+    lambda: scheduler.in_flight)
+registry.gauge(
+    "clearthink_llm_calls_queued", "LLM calls waiting for a scheduler slot.",
+    lambda: scheduler.queued)
+registry.gauge(
+    "clearthink_admitted_analyses", "Analyses admitted and not yet finished.",
+    lambda: sum(scheduler._admitted.values()))
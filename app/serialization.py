@@ -0,0 +1,43 @@
+"""JSON encoding - orjson when it is installed, the standard library otherwise.
+
+Both produce compact output (no spaces after separators) and keep
+non-ASCII text as-is, so payloads are the same either way.
+"""
+
+import json
+from typing import Any, Union
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(value: Any) -> str:
+    """Serialize ``value`` as compact JSON text."""
+    if orjson is not None:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_bytes(value: Any) -> bytes:
+    """Serialize ``value`` as compact UTF-8 encoded JSON."""
+    if orjson is not None:
+        return orjson.dumps(value)
+    return dumps(value).encode("utf-8")
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse JSON text; raises ``ValueError`` on invalid input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response encoded with ``dumps_bytes`` (orjson when available)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
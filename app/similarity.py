@@ -0,0 +1,113 @@
+"""Near-duplicate decision lookup.
+
+Decisions are embedded with a hashed bag of character n-grams and words
+(no model download, no fitted vocabulary) and compared by cosine
+similarity against a fixed-size ring buffer of recent analyses. Adding a
+decision is O(dimensions) and the index never grows beyond ``capacity``
+rows, so memory use is known up front.
+
+NumPy is only needed when the index is enabled.
+"""
+
+import logging
+import re
+import zlib
+from typing import List, Optional, Tuple
+
+from app.config import settings
+
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+class HashedNgramVectorizer:
+    """Embed text as an L2-normalised vector of hashed n-gram counts."""
+
+    def __init__(self, dimensions: int = 1024, ngram: int = 3):
+        import numpy as np
+
+        self._np = np
+        self.dimensions = dimensions
+        self.ngram = ngram
+
+    def _features(self, text: str) -> List[str]:
+        words = _WORD.findall(text.lower())
+        features = [f"w:{word}" for word in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+        for word in words:
+            padded = f" {word} "
+            features += [padded[i:i + self.ngram] for i in range(len(padded) - self.ngram + 1)]
+        return features
+
+    def transform(self, text: str):
+        np = self._np
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for feature in self._features(text):
+            digest = zlib.crc32(feature.encode("utf-8"))
+            # The top bit picks a sign so colliding features tend to cancel out.
+            vector[digest % self.dimensions] += 1.0 if digest & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SimilarityIndex:
+    """
+    Bounded cosine-similarity index over decision texts.
+
+    Each entry may have an ``owner``; a search for an owner only matches
+    that owner's entries.
+    """
+
+    def __init__(self, capacity: int = 5000, dimensions: int = 1024):
+        import numpy as np
+
+        self._np = np
+        self.capacity = capacity
+        self.vectorizer = HashedNgramVectorizer(dimensions)
+        self._vectors = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._ids: List[Optional[str]] = [None] * capacity
+        self._owners = np.empty(capacity, dtype=object)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, analysis_id: str, text: str, owner: Optional[str] = None) -> None:
+        """Index ``text`` for ``owner``, evicting the oldest entry once full."""
+        self._vectors[self._next] = self.vectorizer.transform(text)
+        self._ids[self._next] = analysis_id
+        self._owners[self._next] = owner
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def search(
+        self, text: str, min_score: float = 0.0, owner: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """
+        Closest indexed analysis id and its cosine similarity, if any reaches
+        ``min_score``; only among ``owner``'s entries when given.
+        """
+        if not self._size:
+            return None
+        scores = self._vectors[: self._size] @ self.vectorizer.transform(text)
+        if owner is not None:
+            scores[self._owners[: self._size] != owner] = -self._np.inf
+        best = int(scores.argmax())
+        score = float(scores[best])
+        if score < min_score:
+            return None
+        return self._ids[best], score
+
+
+def create_similarity_index() -> Optional[SimilarityIndex]:
+    """Build the similarity index, or None when disabled or NumPy is missing."""
+    if not settings.SIMILARITY_ENABLED:
+        return None
+    try:
+        return SimilarityIndex(settings.SIMILARITY_CAPACITY, settings.SIMILARITY_DIMENSIONS)
+    except ImportError:
+        logger.warning("SIMILARITY_ENABLED is set but NumPy is not installed; near-duplicate lookup is off")
+        return None
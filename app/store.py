@@ -0,0 +1,308 @@
+"""Persistent analysis store.
+
+Every orchestrator run is recorded in SQLite - input, per-agent outputs,
+timings and model configuration - indexed by content fingerprint and
+creation time. Writes are buffered and flushed in batches by a background
+task, so persistence never sits on a request's critical path; records
+waiting to be flushed are still visible to readers.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+
+
+class AnalysisStore:
+    """SQLite-backed history of analyses with batched asynchronous writes."""
+
+    _COLUMNS = "id, fingerprint, config, input, model, created_at, success, agents, timings, overridden, client_id"
+
+    def __init__(self, path: str, batch_size: int = 50, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS analyses (
+                    id TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    config TEXT NOT NULL DEFAULT '',
+                    input TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    success INTEGER NOT NULL,
+                    agents TEXT NOT NULL,
+                    timings TEXT,
+                    overridden INTEGER NOT NULL DEFAULT 0,
+                    client_id TEXT NOT NULL DEFAULT ''
+                )"""
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(analyses)")}
+            if "config" not in columns:
+                self._conn.execute("ALTER TABLE analyses ADD COLUMN config TEXT NOT NULL DEFAULT ''")
+            if "overridden" not in columns:
+                self._conn.execute("ALTER TABLE analyses ADD COLUMN overridden INTEGER NOT NULL DEFAULT 0")
+            if "client_id" not in columns:
+                self._conn.execute("ALTER TABLE analyses ADD COLUMN client_id TEXT NOT NULL DEFAULT ''")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_client "
+                "ON analyses (client_id, created_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_config "
+                "ON analyses (config, created_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_fingerprint "
+                "ON analyses (fingerprint, created_at)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS analyses_created_at ON analyses (created_at)"
+            )
+            self._conn.commit()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer: Optional[asyncio.Task] = None
+
+    # ---- writes ----------------------------------------------------------
+
+    def record(
+        self,
+        analysis: Dict[str, Any],
+        fingerprint: str,
+        config: str,
+        model: Dict[str, Any],
+        client_id: str = "",
+    ) -> str:
+        """
+        Queue an orchestrator result for storage and return its new id.
+
+        ``fingerprint`` identifies the input under ``config``, the hash of
+        the orchestrator configuration that produced the result. Analyses
+        with user-supplied agent output (``overridden``) are kept for
+        history but never reused for another request. ``client_id`` is the
+        tenant that owns the analysis; reads given a client id only see
+        that client's analyses.
+        """
+        record = {
+            "id": uuid.uuid4().hex,
+            "fingerprint": fingerprint,
+            "config": config,
+            "input": analysis["input"],
+            "model": model,
+            "created_at": time.time(),
+            "success": bool(analysis["success"]),
+            "agents": [
+                {k: v for k, v in agent.items() if k != "timings"}
+                for agent in analysis["agents"]
+            ],
+            "timings": analysis.get("timings"),
+            "overridden": any(agent.get("overridden") for agent in analysis["agents"]),
+            "client_id": client_id,
+        }
+        self._pending[record["id"]] = record
+        self._queue.put_nowait(record)
+        return record["id"]
+
+    def _write_batch(self, records: List[Dict[str, Any]]) -> None:
+        rows = [
+            (r["id"], r["fingerprint"], r["config"], r["input"], json.dumps(r["model"]), r["created_at"],
+             int(r["success"]), json.dumps(r["agents"]),
+             json.dumps(r["timings"]) if r["timings"] is not None else None, int(r["overridden"]),
+             r["client_id"])
+            for r in records
+        ]
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO analyses ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        await asyncio.to_thread(self._write_batch, batch)
+        for record in batch:
+            self._pending.pop(record["id"], None)
+
+    async def _write_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self._queue.get()
+            if record is None:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if record is None:
+                    stopping = True
+                    break
+                batch.append(record)
+            await self._flush(batch)
+
+    async def start(self) -> None:
+        """Start the background writer."""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        """Stop the writer and flush everything still buffered."""
+        if self._writer is not None:
+            # A sentinel rather than cancellation: wait_for can swallow a
+            # cancel that lands as the queue hands over a record.
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = None
+        await self._flush(list(self._pending.values()))
+
+    # ---- reads -----------------------------------------------------------
+
+    def _row_to_record(self, row) -> Dict[str, Any]:
+        return {
+            "id": row[0],
+            "fingerprint": row[1],
+            "config": row[2],
+            "input": row[3],
+            "model": json.loads(row[4]),
+            "created_at": row[5],
+            "success": bool(row[6]),
+            "agents": json.loads(row[7]),
+            "timings": json.loads(row[8]) if row[8] else None,
+            "overridden": bool(row[9]),
+            "client_id": row[10],
+        }
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    async def get(self, analysis_id: str, client_id: str = None) -> Optional[Dict[str, Any]]:
+        """Full stored analysis by id (None if another client than ``client_id`` owns it)."""
+        record = self._pending.get(analysis_id)
+        if record is None:
+            rows = await asyncio.to_thread(
+                self._query, f"SELECT {self._COLUMNS} FROM analyses WHERE id = ?", (analysis_id,)
+            )
+            record = self._row_to_record(rows[0]) if rows else None
+        if record is None or (client_id is not None and record["client_id"] != client_id):
+            return None
+        return record
+
+    async def find(
+        self, fingerprint: str, max_age: float, client_id: str = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Most recent successful analysis with ``fingerprint`` no older than
+        ``max_age`` seconds, leaving out analyses with overridden agents
+        and, given a ``client_id``, those of other clients.
+        """
+        cutoff = time.time() - max_age
+        candidates = [
+            r for r in self._pending.values()
+            if r["fingerprint"] == fingerprint and r["success"] and not r["overridden"]
+            and r["created_at"] >= cutoff and client_id in (None, r["client_id"])
+        ]
+        if candidates:
+            return max(candidates, key=lambda r: r["created_at"])
+        sql = (
+            f"SELECT {self._COLUMNS} FROM analyses "
+            "WHERE fingerprint = ? AND success = 1 AND overridden = 0 AND created_at >= ? "
+        )
+        params: tuple = (fingerprint, cutoff)
+        if client_id is not None:
+            sql += "AND client_id = ? "
+            params += (client_id,)
+        rows = await asyncio.to_thread(self._query, sql + "ORDER BY created_at DESC LIMIT 1", params)
+        return self._row_to_record(rows[0]) if rows else None
+
+    async def recent(self, config: str, limit: int) -> List[Tuple[str, str, str]]:
+        """
+        ``(id, input, client_id)`` of the latest successful analyses under
+        ``config`` without overridden agents, oldest first.
+        """
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT id, input, client_id FROM analyses WHERE config = ? AND success = 1 AND overridden = 0 "
+            "ORDER BY created_at DESC LIMIT ?",
+            (config, limit),
+        )
+        return [(row[0], row[1], row[2]) for row in reversed(rows)]
+
+    async def history(
+        self, limit: int = 20, before: float = None, client_id: str = None, before_id: str = ""
+    ) -> Dict[str, Any]:
+        """
+        Newest-first page of analysis summaries, only ``client_id``'s if given.
+
+        Pages are keyed on ``(created_at, id)``, so analyses created in the
+        same instant are neither skipped nor repeated: pass the returned
+        ``next_before`` and ``next_before_id`` as ``before`` and
+        ``before_id`` to fetch the next page.
+        """
+        before = before if before is not None else time.time() + 1
+        before_id = before_id or ""
+        keyset = "(created_at < ? OR (created_at = ? AND id < ?))"
+        if client_id is None:
+            rows = await asyncio.to_thread(
+                self._query,
+                "SELECT id, input, model, created_at, success FROM analyses "
+                f"WHERE {keyset} ORDER BY created_at DESC, id DESC LIMIT ?",
+                (before, before, before_id, limit),
+            )
+        else:
+            rows = await asyncio.to_thread(
+                self._query,
+                "SELECT id, input, model, created_at, success FROM analyses "
+                f"WHERE client_id = ? AND {keyset} ORDER BY created_at DESC, id DESC LIMIT ?",
+                (client_id, before, before, before_id, limit),
+            )
+        items = [
+            {"id": r[0], "input": r[1], "model": json.loads(r[2]), "created_at": r[3], "success": bool(r[4])}
+            for r in rows
+        ]
+        pending = (
+            r for r in self._pending.values()
+            if (r["created_at"], r["id"]) < (before, before_id) and client_id in (None, r["client_id"])
+        )
+        seen = {item["id"] for item in items}
+        items.extend(
+            {k: r[k] for k in ("id", "input", "model", "created_at", "success")}
+            for r in pending if r["id"] not in seen
+        )
+        items = sorted(items, key=lambda item: (item["created_at"], item["id"]), reverse=True)[:limit]
+        more = len(items) == limit
+        return {
+            "items": items,
+            "next_before": items[-1]["created_at"] if more else None,
+            "next_before_id": items[-1]["id"] if more else None,
+        }
+
+
+def create_store() -> Optional[AnalysisStore]:
+    """Build the analysis store, or None when ``STORE_ENABLED`` is off."""
+    if not settings.STORE_ENABLED:
+        return None
+    return AnalysisStore(settings.STORE_PATH, settings.STORE_BATCH_SIZE, settings.STORE_FLUSH_INTERVAL)
@@ -0,0 +1,251 @@
+"""Event channels - append-only event logs that many subscribers can follow."""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.metrics import STREAMS_ABANDONED
+
+
+logger = logging.getLogger(__name__)
+
+
+class StreamExpiredError(LookupError):
+    """Raised when following a stream that was never started or has been evicted."""
+
+
+class EventChannel:
+    """
+    Append-only log of events from one analysis run.
+
+    Producers ``publish`` events and ``close`` the channel when done.
+    Subscribers get every event from a starting index onwards, including
+    the ones published before they subscribed, so late or reconnecting
+    clients see the full run. Once an agent has finished, its
+    ``agent_delta`` events are dropped from the log: the ``agent_complete``
+    or ``agent_error`` event that follows carries the whole result. Dropped
+    events keep their index, so event ids stay stable.
+    """
+
+    def __init__(self):
+        # Published events; None where an event has been dropped
+        self.events: List[Optional[Dict[str, Any]]] = []
+        # Indexes of the kept deltas of each running agent, by (agent, option)
+        self._deltas: Dict[Tuple[Any, Any], List[int]] = {}
+        # Clients allowed to follow the channel by id
+        self.owners: Set[str] = set()
+        self.closed = False
+        self.closed_at: Optional[float] = None
+        self._changed = asyncio.Condition()
+
+    async def publish(self, event: Dict[str, Any]) -> None:
+        async with self._changed:
+            status = event.get("status")
+            if status == "agent_delta":
+                self._deltas.setdefault((event.get("agent"), event.get("option")), []).append(len(self.events))
+            elif status in ("agent_complete", "agent_error"):
+                for index in self._deltas.pop((event.get("agent"), event.get("option")), []):
+                    self.events[index] = None
+            self.events.append(event)
+            self._changed.notify_all()
+
+    async def close(self) -> None:
+        async with self._changed:
+            self.closed = True
+            self.closed_at = time.monotonic()
+            self._changed.notify_all()
+
+    async def entries(self, start: int = 0) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Yield ``(index, event)`` from index ``start`` until the channel is closed."""
+        position = start
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(
+                    lambda: position < len(self.events) or self.closed
+                )
+                pending = self.events[position:]
+                closed = self.closed
+            for offset, event in enumerate(pending):
+                if event is not None:
+                    yield position + offset, event
+            position += len(pending)
+            if closed and position >= len(self.events):
+                return
+
+    async def subscribe(self, start: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events from index ``start`` until the channel is closed."""
+        async for _, event in self.entries(start):
+            yield event
+
+
+class StreamHub:
+    """
+    Runs event streams in the background and keeps them for replay.
+
+    A stream's producer runs as its own task, independent of the clients
+    following it: a client that disconnects can come back with the id of
+    the last event it saw and resume from the next one, and any number of
+    clients can follow one stream. A stream started with a ``key`` is
+    found by that key while it runs, so identical work can attach to it
+    instead of starting again. Only its ``owner`` and the clients it is
+    ``share``d with may follow a stream by id.
+
+    A running stream that nobody has followed for ``abandon_after``
+    seconds is cancelled (0 = always run to completion). Finished streams
+    are kept for ``ttl`` seconds, and at most ``max_streams`` finished
+    streams are kept at all, oldest evicted first.
+    """
+
+    def __init__(self, ttl: float = 300.0, max_streams: int = 256, abandon_after: float = 0.0):
+        self.ttl = ttl
+        self.max_streams = max_streams
+        self.abandon_after = abandon_after
+        self._channels: "OrderedDict[str, EventChannel]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._keys: Dict[str, str] = {}
+        self._subscribers: Dict[str, int] = {}
+        self._abandon_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._abandoned: Set[str] = set()
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        finished = [sid for sid, channel in self._channels.items() if channel.closed]
+        expired = [sid for sid in finished if now - self._channels[sid].closed_at >= self.ttl]
+        excess = len(finished) - len(expired) - self.max_streams
+        if excess > 0:
+            expired += [sid for sid in finished if sid not in expired][:excess]
+        for sid in expired:
+            del self._channels[sid]
+
+    def start(
+        self,
+        events: AsyncIterator[Dict[str, Any]],
+        on_done: Optional[Callable[[], None]] = None,
+        key: Optional[str] = None,
+        owner: Optional[str] = None,
+    ) -> str:
+        """Run ``events`` into a new stream and return its id."""
+        self._prune()
+        stream_id = uuid.uuid4().hex
+        channel = self._channels[stream_id] = EventChannel()
+        if owner is not None:
+            channel.owners.add(owner)
+        if key is not None:
+            self._keys[key] = stream_id
+        self._tasks[stream_id] = asyncio.create_task(self._pump(stream_id, channel, events, on_done, key))
+        self._subscribers[stream_id] = 0
+        self._watch(stream_id)
+        return stream_id
+
+    def find(self, key: str) -> Optional[str]:
+        """Id of the running stream started with ``key``, if any."""
+        return self._keys.get(key)
+
+    def share(self, stream_id: str, client_id: str) -> None:
+        """Let ``client_id`` follow the stream too."""
+        channel = self._channels.get(stream_id)
+        if channel is not None:
+            channel.owners.add(client_id)
+
+    def get_for(self, stream_id: str, client_id: str) -> Optional[EventChannel]:
+        """The stream, if it is still held and ``client_id`` may follow it."""
+        channel = self.get(stream_id)
+        return channel if channel is not None and client_id in channel.owners else None
+
+    async def _pump(self, stream_id, channel, events, on_done, key) -> None:
+        try:
+            async for event in events:
+                await channel.publish(event)
+        except asyncio.CancelledError:
+            if stream_id in self._abandoned:
+                reason = "Cancelled because no client was following the analysis"
+            else:
+                reason = "Interrupted by server shutdown"
+            await channel.publish({"status": "error", "error": reason})
+            raise
+        except Exception as e:
+            logger.exception("Stream %s failed", stream_id)
+            await channel.publish({"status": "error", "error": str(e)})
+        finally:
+            self._tasks.pop(stream_id, None)
+            if key is not None and self._keys.get(key) == stream_id:
+                del self._keys[key]
+            timer = self._abandon_timers.pop(stream_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._subscribers.pop(stream_id, None)
+            self._abandoned.discard(stream_id)
+            if on_done is not None:
+                on_done()
+            await channel.close()
+
+    def _watch(self, stream_id: str) -> None:
+        """Start the abandonment clock for a running stream nobody follows."""
+        if (self.abandon_after <= 0 or self._subscribers.get(stream_id)
+                or stream_id not in self._tasks or stream_id in self._abandon_timers):
+            return
+        self._abandon_timers[stream_id] = asyncio.get_running_loop().call_later(
+            self.abandon_after, self._abandon, stream_id
+        )
+
+    def _abandon(self, stream_id: str) -> None:
+        self._abandon_timers.pop(stream_id, None)
+        task = self._tasks.get(stream_id)
+        if task is not None and not self._subscribers.get(stream_id):
+            logger.info("Cancelling stream %s: no client for %.0fs", stream_id, self.abandon_after)
+            STREAMS_ABANDONED.inc()
+            self._abandoned.add(stream_id)
+            task.cancel()
+
+    def get(self, stream_id: str) -> Optional[EventChannel]:
+        self._prune()
+        return self._channels.get(stream_id)
+
+    async def subscribe(self, stream_id: str, after: int = -1) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yield ``(event id, event)`` for the stream's events after index ``after``.
+
+        Event ids are ``"<stream id>:<index>"``; see ``parse_event_id``.
+        Raises ``StreamExpiredError`` if the stream is no longer kept.
+        """
+        channel = self._channels.get(stream_id)
+        if channel is None:
+            raise StreamExpiredError(f"Stream {stream_id} not found or expired")
+        if stream_id in self._subscribers:
+            self._subscribers[stream_id] += 1
+            timer = self._abandon_timers.pop(stream_id, None)
+            if timer is not None:
+                timer.cancel()
+        try:
+            async for index, event in channel.entries(after + 1):
+                yield f"{stream_id}:{index}", event
+        finally:
+            if stream_id in self._subscribers:
+                self._subscribers[stream_id] -= 1
+                self._watch(stream_id)
+
+    @staticmethod
+    def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+        """Split an event id into ``(stream id, index)``, or None if it is not one of ours."""
+        if not event_id:
+            return None
+        stream_id, _, index = event_id.strip().rpartition(":")
+        if not stream_id or not index.isdigit():
+            return None
+        return stream_id, int(index)
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks)
+
+    async def stop(self, timeout: float = 0) -> None:
+        """Give running streams up to ``timeout`` seconds to finish, then cancel them."""
+        tasks = list(self._tasks.values())
+        if tasks and timeout > 0:
+            await asyncio.wait(tasks, timeout=timeout)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,439 @@
+"""Tenants - identification, rate limits, daily quotas and usage accounting.
+
+A tenant is the owner of an API key listed in ``TENANT_API_KEYS`` or,
+for requests without a key, the client the scheduler already queues by
+(``X-Client-ID`` or address). Each tenant has two token buckets, one for
+analysis requests and one for estimated LLM tokens, plus daily request
+and token quotas. Limits are checked once admission control has let an
+analysis in and before any agent runs, so rejected requests never reach
+an agent and requests turned away as overload are never charged; they
+fail with ``RateLimitError`` (served as 429 + Retry-After).
+
+Usage is recorded in SQLite per tenant and UTC day: requests and the
+tokens estimated for them, and each agent's runs, cache hits and tokens.
+Writes are buffered and flushed in the background. Daily quotas count
+the usage recorded by every process sharing ``USAGE_DB_PATH``, and are
+checked and charged in one transaction so concurrent requests cannot
+overshoot them; a request is charged its estimated tokens up front, and
+a day's token usage is the larger of those estimates and the tokens
+agents actually used. The token buckets are per process, like the
+scheduler's.
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.metrics import TENANT_REJECTED
+from app.scheduler import TokenBucket
+
+
+LIMITS = ("requests_per_minute", "tokens_per_minute", "daily_requests", "daily_tokens")
+
+# Buckets kept before full (idle) ones are forgotten
+_MAX_BUCKETS = 10000
+
+
+class RateLimitError(Exception):
+    """Raised when a tenant is over one of its rate limits or daily quotas."""
+
+    def __init__(self, message: str, retry_after: float, limit: str):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.limit = limit
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime())
+
+
+def seconds_until_tomorrow() -> float:
+    """Seconds until the daily quotas reset at midnight UTC."""
+    return 86400 - time.time() % 86400
+
+
+class UsageLedger:
+    """Per-tenant, per-day usage in SQLite, with buffered writes."""
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # Unwritten usage: (tenant, day) -> [requests, estimated tokens], (tenant, day, agent) -> counters
+        self._requests: Dict[Tuple[str, str], List[int]] = {}
+        self._agents: Dict[Tuple[str, str, str], Dict[str, int]] = {}
+        # Usage being written, still counted by readers
+        self._flushing: Tuple[Dict, Dict] = ({}, {})
+        self._writer: Optional[asyncio.Task] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use (under the lock), so importing the agents creates no database.
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS usage_requests (
+                    tenant TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    requests INTEGER NOT NULL,
+                    tokens INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (tenant, day)
+                )"""
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(usage_requests)")}
+            if "tokens" not in columns:
+                conn.execute("ALTER TABLE usage_requests ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS usage_agents (
+                    tenant TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    agent TEXT NOT NULL,
+                    runs INTEGER NOT NULL,
+                    cache_hits INTEGER NOT NULL,
+                    prompt_tokens INTEGER NOT NULL,
+                    completion_tokens INTEGER NOT NULL,
+                    PRIMARY KEY (tenant, day, agent)
+                )"""
+            )
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    # ---- writes ----------------------------------------------------------
+
+    def record_request(self, tenant: str, requests: int = 1, tokens: int = 0) -> None:
+        """Count ``requests`` analyses admitted for ``tenant`` today, estimated at ``tokens``."""
+        counts = self._requests.setdefault((tenant, today()), [0, 0])
+        counts[0] += requests
+        counts[1] += tokens
+
+    def _charge(
+        self, tenant: str, day: str, requests: int, tokens: int, limits: Dict[str, float],
+        buffered: Tuple[int, int, int],
+    ) -> Optional[str]:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT requests, tokens FROM usage_requests WHERE tenant = ? AND day = ?", (tenant, day)
+                ).fetchone() or (0, 0)
+                (used_tokens,) = conn.execute(
+                    "SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0) "
+                    "FROM usage_agents WHERE tenant = ? AND day = ?",
+                    (tenant, day),
+                ).fetchone()
+                used_requests = row[0] + buffered[0]
+                estimated_tokens = row[1] + buffered[1]
+                used_tokens += buffered[2]
+                exceeded = None
+                if limits["daily_requests"] and used_requests + requests > limits["daily_requests"]:
+                    exceeded = "daily_requests"
+                elif limits["daily_tokens"] and max(used_tokens, estimated_tokens + tokens) > limits["daily_tokens"]:
+                    exceeded = "daily_tokens"
+                else:
+                    conn.execute(
+                        "INSERT INTO usage_requests (tenant, day, requests, tokens) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (tenant, day) DO UPDATE SET "
+                        "requests = requests + excluded.requests, tokens = tokens + excluded.tokens",
+                        (tenant, day, requests, tokens),
+                    )
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return exceeded
+
+    async def charge(
+        self, tenant: str, requests: int, tokens: int, limits: Dict[str, float]
+    ) -> Optional[str]:
+        """
+        Record ``requests`` analyses estimated at ``tokens`` for ``tenant``
+        today if they fit its daily quotas in ``limits``, in one transaction
+        with the check, and return None; else charge nothing and return the
+        quota (``daily_requests`` or ``daily_tokens``) they would exceed.
+        """
+        day = today()
+        buffered_requests, buffered_agents = self._buffered(tenant, day)
+        buffered = (
+            sum(count for _, count, _ in buffered_requests),
+            sum(estimate for _, _, estimate in buffered_requests),
+            sum(prompt + completion for _, _, _, _, prompt, completion in buffered_agents),
+        )
+        return await asyncio.to_thread(self._charge, tenant, day, requests, tokens, limits, buffered)
+
+    def record_agent(self, tenant: str, agent: str, timings: Dict[str, Any]) -> None:
+        """Count one agent run for ``tenant`` with the tokens in its ``timings``."""
+        counters = self._agents.setdefault(
+            (tenant, today(), agent),
+            {"runs": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0},
+        )
+        counters["runs"] += 1
+        counters["cache_hits"] += int(bool(timings.get("cached")))
+        counters["prompt_tokens"] += timings.get("prompt_tokens", 0)
+        counters["completion_tokens"] += timings.get("completion_tokens", 0)
+
+    def _write(self, requests: Dict, agents: Dict) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                "INSERT INTO usage_requests (tenant, day, requests, tokens) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (tenant, day) DO UPDATE SET "
+                "requests = requests + excluded.requests, tokens = tokens + excluded.tokens",
+                [(tenant, day, count, estimate) for (tenant, day), (count, estimate) in requests.items()],
+            )
+            conn.executemany(
+                "INSERT INTO usage_agents "
+                "(tenant, day, agent, runs, cache_hits, prompt_tokens, completion_tokens) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (tenant, day, agent) DO UPDATE SET "
+                "runs = runs + excluded.runs, cache_hits = cache_hits + excluded.cache_hits, "
+                "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+                "completion_tokens = completion_tokens + excluded.completion_tokens",
+                [
+                    (tenant, day, agent, c["runs"], c["cache_hits"], c["prompt_tokens"], c["completion_tokens"])
+                    for (tenant, day, agent), c in agents.items()
+                ],
+            )
+            conn.commit()
+
+    async def flush(self) -> None:
+        """Write the buffered usage."""
+        if not self._requests and not self._agents:
+            return
+        self._flushing = (self._requests, self._agents)
+        self._requests, self._agents = {}, {}
+        try:
+            await asyncio.to_thread(self._write, *self._flushing)
+        finally:
+            self._flushing = ({}, {})
+
+    async def _write_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        """Start the background writer."""
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write_loop())
+
+    async def stop(self) -> None:
+        """Stop the writer and flush everything still buffered."""
+        if self._writer is not None:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        await self.flush()
+
+    # ---- reads -----------------------------------------------------------
+
+    def _query(self, sql: str, params: tuple) -> List[tuple]:
+        with self._lock:
+            return self._connect().execute(sql, params).fetchall()
+
+    def _buffered(self, tenant: str, since: str) -> Tuple[List[tuple], List[tuple]]:
+        """Buffered usage of ``tenant`` from day ``since`` on, as rows like the tables'."""
+        requests, agents = [], []
+        for pending_requests, pending_agents in (self._flushing, (self._requests, self._agents)):
+            requests.extend(
+                (day, count, estimate) for (name, day), (count, estimate) in pending_requests.items()
+                if name == tenant and day >= since
+            )
+            agents.extend(
+                (day, agent, c["runs"], c["cache_hits"], c["prompt_tokens"], c["completion_tokens"])
+                for (name, day, agent), c in pending_agents.items()
+                if name == tenant and day >= since
+            )
+        return requests, agents
+
+    async def usage(self, tenant: str, days: int = 1) -> List[Dict[str, Any]]:
+        """``tenant``'s usage over the last ``days`` UTC days, newest first, with a breakdown per agent."""
+        since = time.strftime("%Y-%m-%d", time.gmtime(time.time() - (days - 1) * 86400))
+        request_rows = await asyncio.to_thread(
+            self._query, "SELECT day, requests, tokens FROM usage_requests WHERE tenant = ? AND day >= ?",
+            (tenant, since),
+        )
+        agent_rows = await asyncio.to_thread(
+            self._query,
+            "SELECT day, agent, runs, cache_hits, prompt_tokens, completion_tokens "
+            "FROM usage_agents WHERE tenant = ? AND day >= ?",
+            (tenant, since),
+        )
+        buffered_requests, buffered_agents = self._buffered(tenant, since)
+
+        by_day: Dict[str, Dict[str, Any]] = {}
+
+        def day_entry(day: str) -> Dict[str, Any]:
+            return by_day.setdefault(
+                day, {"day": day, "requests": 0, "estimated_tokens": 0, "tokens": 0, "agents": {}}
+            )
+
+        for day, count, estimate in request_rows + buffered_requests:
+            entry = day_entry(day)
+            entry["requests"] += count
+            entry["estimated_tokens"] += estimate
+        for day, agent, runs, cache_hits, prompt_tokens, completion_tokens in agent_rows + buffered_agents:
+            entry = day_entry(day)
+            counters = entry["agents"].setdefault(
+                agent, {"runs": 0, "cache_hits": 0, "prompt_tokens": 0, "completion_tokens": 0}
+            )
+            counters["runs"] += runs
+            counters["cache_hits"] += cache_hits
+            counters["prompt_tokens"] += prompt_tokens
+            counters["completion_tokens"] += completion_tokens
+            entry["tokens"] += prompt_tokens + completion_tokens
+        return sorted(by_day.values(), key=lambda entry: entry["day"], reverse=True)
+
+
+class TenantLimiter:
+    """Per-tenant request and token buckets and daily quotas, checked ahead of admission."""
+
+    def __init__(self, api_keys: Dict[str, Any], defaults: Dict[str, float], ledger: UsageLedger):
+        self.defaults = defaults
+        self.ledger = ledger
+        # An entry is a tenant name, or {"tenant": name, plus limits overriding the defaults}
+        self._keys = {
+            key: entry if isinstance(entry, dict) else {"tenant": entry}
+            for key, entry in api_keys.items()
+        }
+        self._limits = {
+            entry["tenant"]: {name: entry.get(name, defaults[name]) for name in LIMITS}
+            for entry in self._keys.values()
+        }
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.rejected = 0
+
+    def tenant_for_key(self, api_key: str) -> Optional[str]:
+        """The tenant owning ``api_key``, or None for an unknown key."""
+        entry = self._keys.get(api_key)
+        return entry["tenant"] if entry is not None else None
+
+    def limits(self, tenant: str) -> Dict[str, float]:
+        """``tenant``'s limits (0 = unlimited)."""
+        return self._limits.get(tenant, self.defaults)
+
+    def _bucket(self, tenant: str, kind: str, per_minute: float) -> TokenBucket:
+        bucket = self._buckets.get((tenant, kind))
+        if bucket is None:
+            if len(self._buckets) >= _MAX_BUCKETS:
+                # A full bucket is no different from a new one, so forgetting it loses nothing.
+                for key, idle in list(self._buckets.items()):
+                    if idle.time_until(idle.capacity) == 0:
+                        del self._buckets[key]
+            bucket = self._buckets[(tenant, kind)] = TokenBucket(per_minute / 60.0, per_minute)
+        return bucket
+
+    def _reject(self, limit: str, message: str, retry_after: float) -> None:
+        self.rejected += 1
+        TENANT_REJECTED.inc(limit=limit)
+        raise RateLimitError(message, retry_after, limit)
+
+    async def check(self, tenant: str, tokens: int = 0, requests: int = 1) -> None:
+        """
+        Charge ``requests`` analyses and ``tokens`` estimated LLM tokens to
+        ``tenant``, or raise ``RateLimitError`` without charging anything.
+        """
+        limits = self.limits(tenant)
+        charges = [
+            (self._bucket(tenant, kind, limits[limit]), amount, limit)
+            for kind, limit, amount in (
+                ("requests", "requests_per_minute", requests),
+                ("tokens", "tokens_per_minute", tokens),
+            )
+            if limits[limit] > 0 and amount > 0
+        ]
+        for bucket, amount, limit in charges:
+            wait = bucket.time_until(amount)
+            if wait > 0:
+                self._reject(
+                    limit,
+                    f"Rate limit of {limits[limit]:g} {limit.replace('_', ' ')} exceeded for tenant '{tenant}'",
+                    wait,
+                )
+        for bucket, amount, _ in charges:
+            bucket.try_take(amount)
+
+        if not (limits["daily_requests"] or limits["daily_tokens"]):
+            self.ledger.record_request(tenant, requests, tokens)
+            return
+        try:
+            exceeded = await self.ledger.charge(tenant, requests, tokens, limits)
+        except BaseException:
+            self._refund_buckets(tenant, limits, tokens, requests)
+            raise
+        if exceeded is not None:
+            self._refund_buckets(tenant, limits, tokens, requests)
+            unit = "requests" if exceeded == "daily_requests" else "tokens"
+            self._reject(
+                exceeded,
+                f"Daily quota of {limits[exceeded]} {unit} reached for tenant '{tenant}'",
+                seconds_until_tomorrow(),
+            )
+
+    def _refund_buckets(self, tenant: str, limits: Dict[str, float], tokens: int, requests: int) -> None:
+        for kind, limit, amount in (
+            ("requests", "requests_per_minute", requests),
+            ("tokens", "tokens_per_minute", tokens),
+        ):
+            bucket = self._buckets.get((tenant, kind))
+            if bucket is not None and limits[limit] > 0 and amount > 0:
+                bucket.refund(amount)
+
+    def refund(self, tenant: str, tokens: int = 0, requests: int = 1) -> None:
+        """Undo a ``check`` for a request that was not served after all."""
+        self._refund_buckets(tenant, self.limits(tenant), tokens, requests)
+        self.ledger.record_request(tenant, -requests, -tokens)
+
+    async def usage(self, tenant: str, days: int = 1) -> Dict[str, Any]:
+        """``tenant``'s limits, what is left of them, and its usage per day and agent."""
+        limits = self.limits(tenant)
+        history = await self.ledger.usage(tenant, days)
+        used = history[0] if history and history[0]["day"] == today() else {
+            "requests": 0, "estimated_tokens": 0, "tokens": 0,
+        }
+        used_tokens = max(used["tokens"], used["estimated_tokens"])
+        remaining: Dict[str, Optional[float]] = {
+            "daily_requests": max(0, limits["daily_requests"] - used["requests"]) if limits["daily_requests"] else None,
+            "daily_tokens": max(0, limits["daily_tokens"] - used_tokens) if limits["daily_tokens"] else None,
+        }
+        for kind, limit in (("requests", "requests_per_minute"), ("tokens", "tokens_per_minute")):
+            if not limits[limit]:
+                remaining[limit] = None
+            else:
+                bucket = self._buckets.get((tenant, kind))
+                remaining[limit] = limits[limit] if bucket is None else int(
+                    bucket.capacity - bucket.time_until(bucket.capacity) * bucket.rate
+                )
+        return {
+            "tenant": tenant,
+            "limits": limits,
+            "remaining": remaining,
+            "resets_in": int(seconds_until_tomorrow()),
+            "days": history,
+        }
+
+
+usage_ledger = UsageLedger(settings.USAGE_DB_PATH, settings.USAGE_FLUSH_INTERVAL)
+tenant_limiter = TenantLimiter(
+    settings.TENANT_API_KEYS,
+    {
+        "requests_per_minute": settings.TENANT_REQUESTS_PER_MINUTE,
+        "tokens_per_minute": settings.TENANT_TOKENS_PER_MINUTE,
+        "daily_requests": settings.TENANT_DAILY_REQUESTS,
+        "daily_tokens": settings.TENANT_DAILY_TOKENS,
+    },
+    usage_ledger,
+)
@@ -0,0 +1,16 @@
+"""Local token count estimates for prompts and completions."""
+
+import re
+
+
+# Word runs, single punctuation marks and whitespace-separated symbols each
+# count as roughly one token for the Llama-family BPE vocabularies we use;
+# long words are split every 4 characters to approximate sub-word pieces.
+_TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of LLM tokens in ``text`` without a remote tokenizer."""
+    if not text:
+        return 0
+    return len(_TOKEN_PATTERN.findall(text))
@@ -0,0 +1,73 @@
+"""Batch entry point - analyze a JSONL file of decisions.
+
+Usage:
+    python batch.py decisions.jsonl results.jsonl --parallelism 8 --rate 60
+
+Each input line is {"id": "...", "decision": "..."}. Results are appended
+to the output file as each analysis finishes; re-running the command skips
+ids that already have a successful result, so an interrupted run resumes.
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.agents import ClearThinkOrchestrator
+from app.batch import completed_ids, parse_decisions, run_batch
+from app.config import settings
+from app.scheduler import current_client
+from app.tenants import usage_ledger
+
+
+async def run(args: argparse.Namespace) -> int:
+    with open(args.input, encoding="utf-8") as f:
+        items = parse_decisions(f)
+
+    done = completed_ids(args.output)
+    todo = [item for item in items if item["id"] not in done]
+    print(f"📥 {len(items)} decisions, {len(items) - len(todo)} already done, {len(todo)} to analyze")
+    if not todo:
+        return 0
+
+    current_client.set("batch")
+    orchestrator = ClearThinkOrchestrator()
+    started = time.monotonic()
+    failures = 0
+
+    await usage_ledger.start()
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            count = 0
+            async for record in run_batch(orchestrator, todo, args.parallelism, args.rate):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                count += 1
+                if not record["success"]:
+                    failures += 1
+                status = "✅" if record["success"] else "❌"
+                print(f"{status} [{count}/{len(todo)}] {record['id']} ({record['elapsed']}s)")
+    finally:
+        await usage_ledger.stop()
+
+    print(f"🏁 Finished in {time.monotonic() - started:.1f}s with {failures} failures")
+    return 1 if failures else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Analyze a JSONL file of decisions with CLEARTHINK")
+    parser.add_argument("input", help="JSONL file with one {\"id\", \"decision\"} object per line")
+    parser.add_argument("output", help="JSONL file results are appended to")
+    parser.add_argument("--parallelism", type=int, default=settings.BATCH_PARALLELISM,
+                        help="Analyses to run at once")
+    parser.add_argument("--rate", type=float, default=settings.BATCH_RATE_LIMIT,
+                        help="Maximum analyses started per minute (0 = unlimited)")
+    args = parser.parse_args()
+
+    settings.validate()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,484 @@
+"""Benchmark harness - measures CLEARTHINK's own overhead offline.
+
+Runs against the deterministic fake LLM backend (``LLM_PROVIDER=fake``),
+driving the orchestrator directly and the FastAPI app in-process through
+ASGI, so no network or API key is needed.
+
+Usage:
+    python benchmark.py --concurrency 8 --requests 64
+    python benchmark.py --modes stream analyze --latency-mean 0.2 --save bench.json
+    python benchmark.py --baseline bench.json --max-regression 0.15
+    python benchmark.py --import-only --import-budget-ms 600
+
+Modes:
+    orchestrator         ClearThinkOrchestrator.analyze
+    orchestrator-stream  ClearThinkOrchestrator.analyze_streaming
+    analyze              POST /api/analyze
+    stream               GET /api/analyze/stream
+
+Reported per mode: throughput, p50/p95/p99 latency, time to first event
+(TTFE), time to first token delta (TTFT) and traced memory per request.
+With ``--baseline`` the run fails (exit code 1) when p95 latency or
+throughput regress by more than ``--max-regression``.
+
+Cold-start cost is measured too: the import time of ``app.main`` in a
+fresh interpreter (``python -X importtime``, best of ``--import-runs``),
+with the slowest top-level imports. The run fails when it exceeds
+``--import-budget-ms``, regresses against the baseline, or when a module
+that should load lazily (LangChain, provider SDKs, NumPy) is imported.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlencode
+
+
+MODES = ("orchestrator", "orchestrator-stream", "analyze", "stream")
+
+# Modules that importing the app must not pull in; they load on first use.
+LAZY_MODULES = ("langchain_core", "langchain_groq", "groq", "numpy")
+
+
+def configure_environment(args: argparse.Namespace) -> None:
+    """Point the app at the fake backend; must run before ``app`` is imported."""
+    os.environ["LLM_PROVIDER"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_DISTRIBUTION"] = args.latency_distribution
+    os.environ["FAKE_LLM_LATENCY_MEAN"] = str(args.latency_mean)
+    os.environ["FAKE_LLM_LATENCY_STDDEV"] = str(args.latency_stddev)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    os.environ["FAKE_LLM_COMPLETION_TOKENS"] = str(args.completion_tokens)
+    os.environ["FAKE_LLM_ERROR_RATE"] = str(args.error_rate)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    if not args.cache:
+        os.environ["CACHE_BACKEND"] = "none"
+        os.environ["STORE_REUSE_RESULTS"] = "false"
+    # Keep the store's and usage ledger's write paths in the measurement, but out of
+    # the real history and usage.
+    data_dir = tempfile.mkdtemp(prefix="clearthink-bench-")
+    os.environ["STORE_PATH"] = os.path.join(data_dir, "analyses.sqlite3")
+    os.environ["USAGE_DB_PATH"] = os.path.join(data_dir, "usage.sqlite3")
+    # Every virtual user is its own client; make sure admission control does
+    # not reject the benchmark's own concurrency.
+    os.environ.setdefault("SCHEDULER_MAX_QUEUE_TOTAL", str(max(64, args.concurrency * 2)))
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Sample:
+    """Timings of one benchmarked request, in seconds from its start."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.first_event: Optional[float] = None
+        self.first_token: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def mark_event(self) -> None:
+        if self.first_event is None:
+            self.first_event = time.perf_counter() - self.started
+
+    def mark_token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter() - self.started
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self.finished = time.perf_counter() - self.started
+        self.error = error
+
+
+class ASGIClient:
+    """Minimal in-process ASGI client that timestamps streamed body chunks."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def request(
+        self,
+        sample: Sample,
+        method: str,
+        path: str,
+        query: Dict[str, str] = None,
+        body: bytes = b"",
+        headers: Dict[str, str] = None,
+    ) -> None:
+        done = asyncio.Event()
+        sent_body = False
+        status: Dict[str, int] = {}
+        raw_headers = [(b"host", b"benchmark")] + [
+            (k.lower().encode(), v.encode()) for k, v in (headers or {}).items()
+        ]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": urlencode(query or {}).encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("benchmark", 80),
+        }
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk:
+                    sample.mark_event()
+                    if b"agent_delta" in chunk:
+                        sample.mark_token()
+                if not message.get("more_body", False):
+                    done.set()
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            done.set()
+        code = status.get("code", 0)
+        sample.finish(None if code == 200 else f"HTTP {code}")
+
+
+def make_runner(mode: str, orchestrator, client: ASGIClient) -> Callable:
+    """Return ``async run(sample, index)`` for one request in ``mode``."""
+
+    def decision(index: int) -> str:
+        return (
+            f"Benchmark decision #{index}: should I leave my engineering job to "
+            "start a company, or move into product management first?"
+        )
+
+    async def run_orchestrator(sample: Sample, index: int) -> None:
+        result = await orchestrator.analyze(decision(index))
+        sample.finish(None if result["success"] else "agent error")
+
+    async def run_orchestrator_stream(sample: Sample, index: int) -> None:
+        error = None
+        async for event in orchestrator.analyze_streaming(decision(index)):
+            sample.mark_event()
+            if event["status"] == "agent_delta":
+                sample.mark_token()
+            elif event["status"] == "agent_error":
+                error = "agent error"
+        sample.finish(error)
+
+    async def run_analyze(sample: Sample, index: int) -> None:
+        await client.request(
+            sample, "POST", "/api/analyze",
+            body=json.dumps({"decision": decision(index)}).encode(),
+            headers={"content-type": "application/json", "x-client-id": f"bench-{index}"},
+        )
+
+    async def run_stream(sample: Sample, index: int) -> None:
+        await client.request(
+            sample, "GET", "/api/analyze/stream",
+            query={"decision": decision(index)},
+            headers={"x-client-id": f"bench-{index}"},
+        )
+
+    return {
+        "orchestrator": run_orchestrator,
+        "orchestrator-stream": run_orchestrator_stream,
+        "analyze": run_analyze,
+        "stream": run_stream,
+    }[mode]
+
+
+async def drive(run: Callable, requests: int, concurrency: int, offset: int = 0) -> List[Sample]:
+    """Run ``requests`` calls of ``run`` with ``concurrency`` virtual users."""
+    samples: List[Sample] = []
+    counter = iter(range(offset, offset + requests))
+
+    async def user():
+        for index in counter:
+            sample = Sample()
+            samples.append(sample)
+            try:
+                await run(sample, index)
+            except Exception as e:
+                sample.finish(f"{type(e).__name__}: {e}")
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return samples
+
+
+async def measure_memory(run: Callable, concurrency: int) -> float:
+    """Peak traced memory per request (KiB) for one wave of concurrent requests."""
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await drive(run, concurrency, concurrency, offset=1_000_000)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - baseline) / concurrency / 1024
+
+
+def summarize(mode: str, samples: List[Sample], elapsed: float, concurrency: int) -> Dict[str, Any]:
+    ok = [s for s in samples if s.error is None]
+    latencies = [s.finished for s in ok]
+    first_events = [s.first_event for s in ok if s.first_event is not None]
+    first_tokens = [s.first_token for s in ok if s.first_token is not None]
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    return {
+        "mode": mode,
+        "requests": len(samples),
+        "concurrency": concurrency,
+        "errors": len(samples) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 3) if elapsed else 0.0,
+        "latency_mean_ms": ms(statistics.mean(latencies)) if latencies else None,
+        "latency_p50_ms": ms(percentile(latencies, 50)),
+        "latency_p95_ms": ms(percentile(latencies, 95)),
+        "latency_p99_ms": ms(percentile(latencies, 99)),
+        "ttfe_p50_ms": ms(percentile(first_events, 50)),
+        "ttfe_p95_ms": ms(percentile(first_events, 95)),
+        "ttft_p50_ms": ms(percentile(first_tokens, 50)),
+        "ttft_p95_ms": ms(percentile(first_tokens, 95)),
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.agents import ClearThinkOrchestrator
+    from app.main import app
+
+    orchestrator = ClearThinkOrchestrator()
+    client = ASGIClient(app)
+    results: Dict[str, Any] = {}
+
+    async with app.router.lifespan_context(app):
+        for mode in args.modes:
+            run = make_runner(mode, orchestrator, client)
+            if args.warmup:
+                await drive(run, args.warmup, min(args.warmup, args.concurrency), offset=2_000_000)
+            started = time.perf_counter()
+            samples = await drive(run, args.requests, args.concurrency)
+            elapsed = time.perf_counter() - started
+            summary = summarize(mode, samples, elapsed, args.concurrency)
+            if args.memory:
+                summary["memory_per_request_kb"] = round(await measure_memory(run, args.concurrency), 1)
+            results[mode] = summary
+
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "latency_distribution": args.latency_distribution,
+            "latency_mean": args.latency_mean,
+            "latency_stddev": args.latency_stddev,
+            "tokens_per_second": args.tokens_per_second,
+            "completion_tokens": args.completion_tokens,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def measure_import_time(module: str = "app.main", runs: int = 3) -> Dict[str, Any]:
+    """Cold import time of ``module``, best of ``runs`` fresh interpreters."""
+    best: Optional[List[tuple]] = None
+    root_best = 0
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        # (nesting depth, name, cumulative microseconds), children listed before their parent
+        rows = []
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            rows.append((len(name) - len(name.lstrip()), name.strip(), int(cumulative)))
+        root = max(i for i, row in enumerate(rows) if row[1] == module)
+        if best is None or rows[root][2] < best[root_best][2]:
+            best, root_best = rows, root
+
+    depth, _, total = best[root_best]
+    subtree = []
+    for row in reversed(best[:root_best]):
+        if row[0] <= depth:
+            break
+        subtree.append(row)
+    children = [(name, us) for level, name, us in subtree if level == depth + 2]
+    loaded = {name for _, name, _ in subtree}
+    return {
+        "module": module,
+        "total_ms": round(total / 1000, 1),
+        "slowest": [
+            {"module": name, "ms": round(us / 1000, 1)}
+            for name, us in sorted(children, key=lambda row: row[1], reverse=True)[:8]
+        ],
+        "eager_imports": [
+            name for name in LAZY_MODULES
+            if any(m == name or m.startswith(name + ".") for m in loaded)
+        ],
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    columns = [
+        ("mode", "mode"), ("ok/err", None), ("rps", "throughput_rps"),
+        ("p50 ms", "latency_p50_ms"), ("p95 ms", "latency_p95_ms"), ("p99 ms", "latency_p99_ms"),
+        ("ttfe p50", "ttfe_p50_ms"), ("ttft p50", "ttft_p50_ms"), ("KiB/req", "memory_per_request_kb"),
+    ]
+    imports = report.get("import")
+    if imports:
+        slowest = ", ".join(f"{row['module']} {row['ms']}" for row in imports["slowest"][:5])
+        print(f"⏱️  import {imports['module']}: {imports['total_ms']} ms ({slowest})")
+    if not report["results"]:
+        return
+    print("  ".join(f"{title:>20}" if i == 0 else f"{title:>9}" for i, (title, _) in enumerate(columns)))
+    for summary in report["results"].values():
+        cells = []
+        for i, (title, key) in enumerate(columns):
+            if key is None:
+                value = f"{summary['requests'] - summary['errors']}/{summary['errors']}"
+            else:
+                value = summary.get(key)
+                value = "-" if value is None else value
+            cells.append(f"{value:>20}" if i == 0 else f"{value:>9}")
+        print("  ".join(cells))
+
+
+def check_imports(imports: Dict[str, Any], budget_ms: float) -> List[str]:
+    """Check cold import time against its budget and for eagerly loaded heavy modules."""
+    problems = []
+    if budget_ms and imports["total_ms"] > budget_ms:
+        problems.append(
+            f"import {imports['module']}: {imports['total_ms']}ms exceeds the {budget_ms:g}ms budget"
+        )
+    for name in imports["eager_imports"]:
+        problems.append(f"import {imports['module']}: {name} is imported eagerly")
+    return problems
+
+
+def check_regressions(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Compare p95 latency, throughput and import time with a saved baseline report."""
+    problems = []
+    imports, base_imports = report.get("import"), baseline.get("import")
+    if imports and base_imports:
+        limit = base_imports["total_ms"] * (1 + tolerance)
+        if imports["total_ms"] > limit:
+            problems.append(
+                f"import {imports['module']}: {imports['total_ms']}ms exceeds "
+                f"baseline {base_imports['total_ms']}ms by more than {tolerance:.0%}"
+            )
+    for mode, summary in report["results"].items():
+        base = baseline.get("results", {}).get(mode)
+        if not base:
+            continue
+        if base.get("latency_p95_ms") and summary.get("latency_p95_ms"):
+            limit = base["latency_p95_ms"] * (1 + tolerance)
+            if summary["latency_p95_ms"] > limit:
+                problems.append(
+                    f"{mode}: p95 latency {summary['latency_p95_ms']}ms exceeds "
+                    f"baseline {base['latency_p95_ms']}ms by more than {tolerance:.0%}"
+                )
+        if base.get("throughput_rps"):
+            floor = base["throughput_rps"] * (1 - tolerance)
+            if summary["throughput_rps"] < floor:
+                problems.append(
+                    f"{mode}: throughput {summary['throughput_rps']} rps is below "
+                    f"baseline {base['throughput_rps']} rps by more than {tolerance:.0%}"
+                )
+    return problems
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark CLEARTHINK against the fake LLM backend")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--requests", type=int, default=32, help="Requests per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent virtual users")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured requests per mode")
+    parser.add_argument("--latency-distribution", default="lognormal",
+                        choices=("fixed", "uniform", "normal", "lognormal", "exponential"))
+    parser.add_argument("--latency-mean", type=float, default=0.3, help="Seconds to first token")
+    parser.add_argument("--latency-stddev", type=float, default=0.1)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--completion-tokens", type=int, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache and stored-result reuse enabled")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="Skip the traced-memory pass")
+    parser.add_argument("--save", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="Baseline report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed relative regression against the baseline")
+    parser.add_argument("--import-runs", type=int, default=3,
+                        help="Fresh interpreters to time the app import in (0 = skip)")
+    parser.add_argument("--import-budget-ms", type=float, default=0,
+                        help="Fail when importing the app takes longer (0 = no budget)")
+    parser.add_argument("--import-only", action="store_true",
+                        help="Only measure import time, no load modes")
+    return parser.parse_args(argv)
+
+
+def main() -> None:
+    args = parse_args()
+    configure_environment(args)
+
+    if args.import_only:
+        report: Dict[str, Any] = {"config": {}, "results": {}}
+    else:
+        report = asyncio.run(benchmark(args))
+    problems: List[str] = []
+    if args.import_runs > 0 or args.import_only:
+        report["import"] = measure_import_time(runs=max(1, args.import_runs))
+        problems += check_imports(report["import"], args.import_budget_ms)
+    print_report(report)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Saved report to {args.save}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems += check_regressions(report, baseline, args.max_regression)
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if problems:
+        sys.exit(1)
+    if args.baseline:
+        print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
 """Entry point for CLEARTHINK application."""
 
+import argparse
+
 import uvicorn
 from app.main import app
 from app.config import settings
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="CLEARTHINK server")
+    parser.add_argument(
+        "--production",
+        action="store_true",
+        default=settings.SERVER_MODE == "production",
+        help="worker processes and graceful shutdown instead of auto-reload",
+    )
+    parser.add_argument("--workers", type=int, default=settings.WEB_WORKERS)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     print("""
     ╔═══════════════════════════════════════════════════════════════╗
     ║                                                               ║
@@ -21,14 +36,29 @@ if __name__ == "__main__":
     ╚═══════════════════════════════════════════════════════════════╝
     """)
     
-    print(f"🚀 Starting CLEARTHINK on http://{settings.HOST}:{settings.PORT}")
+    mode = f"production, {args.workers} worker(s)" if args.production else "development"
+    print(f"🚀 Starting CLEARTHINK ({mode}) on http://{settings.HOST}:{settings.PORT}")
     print("📚 API Docs: http://localhost:8000/docs")
     print("🌐 UI: http://localhost:8000")
     print()
     
-    uvicorn.run(
-        "app.main:app",
-        host=settings.HOST,
-        port=settings.PORT,
-        reload=True
-    )
+    if args.production:
+        uvicorn.run(
+            "app.main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            workers=args.workers,
+            loop=settings.SERVER_LOOP,
+            http=settings.SERVER_HTTP,
+            limit_concurrency=settings.SERVER_LIMIT_CONCURRENCY or None,
+            backlog=settings.SERVER_BACKLOG,
+            timeout_keep_alive=settings.SERVER_KEEPALIVE_TIMEOUT,
+            timeout_graceful_shutdown=settings.SHUTDOWN_TIMEOUT or None,
+        )
+    else:
+        uvicorn.run(
+            "app.main:app",
+            host=settings.HOST,
+            port=settings.PORT,
+            reload=True
+        )